@@ -1,25 +1,22 @@
+import os
 import csv
 import requests
+import SrcPath
+import HighlightAPI
+import Settings
 
-# Define the API URL
-api_url = "https://rpa.casthighlight.com/WS2/domains/22072/applications"
+# Read the Highlight server, token and company from config.properties
+settings = Settings.load_settings('config.properties')
 
-# Define your bearer token
-bearer_token = "xxxxxxxxxx"
+api_url = settings.api_url
+bearer_token = settings.bearer_token
+CompanyID = settings.company_id
+output_directory = settings.output_directory
+cache_dir = settings.cache_dir or os.path.join(output_directory, 'HighlightCache')
+cache_ttl = settings.cache_ttl or HighlightAPI.DEFAULT_CACHE_TTL
 
-# Define headers
-headers = {
-    "Authorization": f"Bearer {bearer_token}",
-    "Content-Type": "application/json"
-}
-
-# Make a GET request to the API
-response = requests.get(api_url, headers=headers)
-
-# Check if the request was successful (status code 200)
-if response.status_code == 200:
-    # Parse JSON response
-    data = response.json()
+try:
+    records = HighlightAPI.get_app_loc_records(api_url, bearer_token, CompanyID, cache_dir, cache_ttl)
 
     # Create and open a CSV file in write mode
     with open('applications.csv', 'w', newline='') as csvfile:
@@ -30,14 +27,9 @@ if response.status_code == 200:
         csv_writer.writerow(['ID', 'Name', 'Total Lines of Code'])
 
         # Write data to CSV file
-        for app in data:
-            try:
-                # Assuming we use the first set of metrics
-                csv_writer.writerow([app['id'], app['name'], app['metrics'][0]['totalLinesOfCode']])
-            except (KeyError, IndexError):
-                print(f"No 'metrics' or 'totalLinesOfCode' data found for application {app['name']}.")
+        csv_writer.writerows(records)
 
     print("Data has been written to applications.csv file.")
 
-else:
-    print("Failed to retrieve data from the API.")
+except requests.RequestException as e:
+    print(f"Failed to retrieve data from the API: {e}")
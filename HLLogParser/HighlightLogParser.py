@@ -1,12 +1,19 @@
 import os
 import requests
-import csv
-import json
 import openpyxl
 import pandas as pd
 from datetime import datetime
 import re
-import configparser
+import LogIndex
+import SrcPath
+import HighlightAPI
+import Settings
+import Profiling
+from concurrent.futures import ProcessPoolExecutor
+from argparse import ArgumentParser
+
+# Number of log files handed to a worker process at a time
+PARSE_CHUNK_SIZE = 32
 
 # Function to parse datetime from log line
 def parse_datetime(log_line):
@@ -17,166 +24,192 @@ def calculate_time_difference(start_time, end_time):
     time_difference_seconds = (end_time - start_time).total_seconds()
     return time_difference_seconds / 60
 
+# Columns of the consolidated report, and their header
+REPORT_COLUMNS = {
+    'Application Name': 'Application Name',
+    'Application ID': 'Application ID',
+    'Log File': 'Log File',
+    'Start Time': 'Start Time',
+    'End Time': 'End Time',
+    'Total Time (minutes)': 'Total Time (minutes)',
+    'Total Lines of Code': 'LOC',
+}
+
+# Markers searched for in every Highlight automation log
+START_MARKER = "INFO  console: Command Line version"
+END_MARKER = "INFO  console: Highlight automation completed successfully!"
+APPLICATION_PATTERN = re.compile(r"application \[name='(.*?)',id=(\d+)\]")
+
 # Function to read log file and extract application name and ID
 def read_log_file(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        lines = file.readlines()
-        start_time = None
-        end_time = None
-        application_name = None
-        application_id = None
-
-        for line in lines:
-            if "INFO  console: Command Line version" in line:
+    start_time = None
+    end_time = None
+    application_name = None
+    application_id = None
+
+    # Stream the file line by line, it is closed as soon as the end marker is seen
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+        for line in file:
+            if START_MARKER in line:
                 start_time = parse_datetime(line)
-            elif "INFO  console: Highlight automation completed successfully!" in line:
+            elif END_MARKER in line:
                 end_time = parse_datetime(line)
                 break
 
-            # Extracting application name and ID from the log line
-            match = re.search(r"application \[name='(.*?)',id=(\d+)\]", line)
-            if match:
-                application_name = match.group(1)
-                application_id = match.group(2)
-
-        if start_time and end_time:
-            total_time_minutes = calculate_time_difference(start_time, end_time)
-            return start_time, end_time, total_time_minutes, application_name, application_id
-        else:
-            return start_time, "Error", "Error", None, None
+            # Extracting application name and ID from the log line, until it has been found
+            if application_name is None:
+                match = APPLICATION_PATTERN.search(line)
+                if match:
+                    application_name = match.group(1)
+                    application_id = match.group(2)
+
+    if start_time and end_time:
+        total_time_minutes = calculate_time_difference(start_time, end_time)
+        return start_time, end_time, total_time_minutes, application_name, application_id
+    else:
+        return start_time, "Error", "Error", None, None
+
+# Worker entry point, a log that cannot be read is reported and skipped
+def parse_log_file(file_path):
+    try:
+        return file_path, read_log_file(file_path)
+    except (OSError, ValueError) as e:
+        print(f"Error reading log file {file_path}: {e}")
+        return file_path, None
 
 # Function to recursively search for log files in a directory
-def find_log_files(root_dir):
-    log_files = []
-    for root, dirs, files in os.walk(root_dir):
-        for file in files:
-            if file.endswith(".log"):
-                log_files.append(os.path.join(root, file))
-    return log_files
-
-def retrieve_HLAppName_and_LOC(api_url, bearer_token, CompanyID):
-    # Define headers
-    headers = {
-        "Authorization": f"Bearer {bearer_token}",
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-    RESTURL = "{}/WS2/domains/{}/applications".format(api_url, CompanyID)
-    
-    # Make a GET request to the API
+def scan_log_files(root_dir):
+    # Generator of (path, size, mtime_ns), so parsing can start before the whole tree has been walked
     try:
-        response = requests.get(RESTURL, headers=headers)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-
-        # Check if the request was successful (status code 200)
-        if response.status_code == 200:
-            # Parse JSON response
-            data = response.json()
-
-            # # Save API response to output.json
-            # with open('output.json', 'w') as json_file:
-            #     json.dump(data, json_file, indent=4)
-            #     print("API response saved to output.json.")
-            # if not data:
-            #     print("No data found in the API response.")
-            #     return
-            
-            # Create and open a CSV file in write mode
-            with open('HLAppsandLOC.csv', 'w', newline='') as csvfile:
-                # Create a CSV writer object
-                csv_writer = csv.writer(csvfile)
-
-                # Write headers
-                csv_writer.writerow(['ID', 'Name', 'Total Lines of Code'])
-                
-                # Write data to CSV file
-                for app in data:
-                    try:
-                        # Assuming we use the first set of metrics
-                        csv_writer.writerow([app['id'], app['name'], app['metrics'][0]['totalLinesOfCode']])
-                        #print(f"Results Found for application {app['name']}, {app['metrics'][0]['totalLinesOfCode']}.")
-                    except (KeyError, IndexError):
-                        print(f"No results found for application {app['name']}.")
-
-            print("API call output is written to HLAppsandLOC.csv.")
+        entries = os.scandir(root_dir)
+    except OSError as e:
+        print(f"Error reading directory {root_dir}: {e}")
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_log_files(entry.path)
+            elif entry.name.endswith(".log"):
+                stat = entry.stat()
+                yield entry.path, stat.st_size, stat.st_mtime_ns
+
+# Function to parse log files in parallel over a process pool
+def parse_log_files(log_files, workers=None):
+    if workers == 1:
+        yield from map(parse_log_file, log_files)
+        return
+    # When the run is profiled, each worker process writes its own profile
+    initializer = Profiling.start_worker if Profiling.active_dir() else None
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=('parse-worker',)) as executor:
+        yield from executor.map(parse_log_file, log_files, chunksize=PARSE_CHUNK_SIZE)
 
-        else:
-            print("Failed to retrieve data from the API.")
+def retrieve_HLAppName_and_LOC(api_url, bearer_token, CompanyID, cache_dir=None, cache_ttl=HighlightAPI.DEFAULT_CACHE_TTL):
+    # Returns [ID, Name, Total Lines of Code] records for every application in the company
+    try:
+        records = HighlightAPI.get_app_loc_records(api_url, bearer_token, CompanyID, cache_dir, cache_ttl)
+        print(f"Retrieved Lines of Code for {len(records)} applications.")
+        return records
     except requests.RequestException as e:
         print(f"Error occurred while making API request: {e}")
-
-# Main function
-def main():
-    config = configparser.ConfigParser()
-    config.read('config.properties')
-
-    root_directory = config.get('parameters', 'root_directory')
-    output_directory = config.get('parameters', 'output_directory')
-    bearer_token = config.get('parameters', 'bearer_token')
-    api_url = config.get('parameters', 'api_url')
-    CompanyID = config.get('parameters', 'CompanyID')
+        return []
+
+# Function to write the consolidated report in each requested format
+def write_reports(merged_df, output_directory, report_formats):
+    report_df = merged_df[list(REPORT_COLUMNS)].rename(columns=REPORT_COLUMNS)
+    for report_format in report_formats:
+        if report_format == 'xlsx':
+            output_file_path = os.path.join(output_directory, 'HLLogSummaryReport.xlsx')
+            # Write-only workbook streams rows to disk instead of keeping every cell in memory
+            workbook = openpyxl.Workbook(write_only=True)
+            sheet = workbook.create_sheet()
+            sheet.append(list(report_df.columns))
+            for row in report_df.astype(object).where(report_df.notna(), None).itertuples(index=False, name=None):
+                sheet.append(row)
+            workbook.save(output_file_path)
+        elif report_format == 'csv':
+            output_file_path = os.path.join(output_directory, 'HLLogSummaryReport.csv')
+            report_df.to_csv(output_file_path, index=False)
+        elif report_format == 'parquet':
+            output_file_path = os.path.join(output_directory, 'HLLogSummaryReport.parquet')
+            # Parquet columns are typed, "Error" placeholders become nulls
+            typed_df = report_df.assign(**{
+                'End Time': pd.to_datetime(report_df['End Time'].where(report_df['End Time'] != 'Error')),
+                'Total Time (minutes)': pd.to_numeric(report_df['Total Time (minutes)'].where(report_df['Total Time (minutes)'] != 'Error')),
+                'Application ID': report_df['Application ID'].astype(str),
+            })
+            try:
+                typed_df.to_parquet(output_file_path, index=False)
+            except ImportError as e:
+                print(f"Skipping Parquet report, install pyarrow to enable it: {e}")
+                continue
+        else:
+            print(f"Unknown report format '{report_format}', expected xlsx, csv or parquet.")
+            continue
+        print(f"Consolidated data has been written to {output_file_path}.")
+
+# Main function, with profile the cProfile and tracemalloc output goes to output_directory
+def main(profile=False):
+    settings = Settings.load_settings('config.properties')
+    if profile and settings.output_directory:
+        with Profiling.profiling(settings.output_directory, 'HighlightLogParser'):
+            return build_report(settings)
+    return build_report(settings)
+
+def build_report(settings):
+
+    root_directory = settings.root_directory
+    output_directory = settings.output_directory
+    bearer_token = settings.bearer_token
+    api_url = settings.api_url
+    CompanyID = settings.company_id
 
     if not all([root_directory, output_directory, bearer_token, api_url, CompanyID]):
         print("Please provide all inputs in config.properties.")
         return
 
-    log_files = find_log_files(root_directory)
-    if not log_files:
-        print("No log files found in the specified directory.")
-        return
+    # Optional, Highlight API responses are cached on disk for cache_ttl seconds
+    cache_dir = settings.cache_dir or os.path.join(output_directory, 'HighlightCache')
+    cache_ttl = settings.cache_ttl or HighlightAPI.DEFAULT_CACHE_TTL
+
+    # Optional, comma separated list of xlsx, csv and parquet
+    report_formats = [f.lower() for f in settings.report_formats]
 
-    data = []
-    for log_file in log_files:
-        start_time, end_time, total_time, application_name, application_id = read_log_file(log_file)
-        if start_time:
-            # Extracting application name from the log file path
-            data.append([application_name, application_id, log_file, start_time, end_time, total_time])
+    # Optional, number of parser processes (default is one per CPU)
+    workers = settings.workers
+
+    # Only new or changed logs are parsed, everything else comes from the index
+    index_file = settings.index_file or os.path.join(output_directory, 'HLLogIndex.db')
+    index = LogIndex.open_index(index_file)
+    try:
+        log_files = list(scan_log_files(root_directory))
+        if not log_files:
+            print("No log files found in the specified directory.")
+            return
+
+        changed_files = LogIndex.find_changed_files(index, log_files)
+        print(f"Parsing {len(changed_files)} new or changed log files out of {len(log_files)}.")
+        results = parse_log_files([path for path, size, mtime_ns in changed_files], workers)
+        LogIndex.store_results(index, changed_files, results)
+        removed = LogIndex.remove_missing_files(index, log_files)
+        if removed:
+            print(f"Removed {removed} deleted log files from the index.")
+
+        data = LogIndex.load_report_rows(index)
+    finally:
+        index.close()
 
-    output_file_path = os.path.join(output_directory, "HLLogReport.xlsx")
     df = pd.DataFrame(data, columns=['Application Name', 'Application ID', 'Log File', 'Start Time', 'End Time', 'Total Time (minutes)'])
-    df.to_excel(output_file_path, index=False)
-    print("Output written to Excel file:", output_file_path)
 
     # Call retrieve_HLAppName_and_LOC function
-    retrieve_HLAppName_and_LOC(api_url, bearer_token, CompanyID)
-
-    # Read HLAppsandLOC.csv and HighlightLogSummary.csv
-    hl_apps_loc_df = pd.read_csv('HLAppsandLOC.csv')
+    hl_apps_loc_df = pd.DataFrame(retrieve_HLAppName_and_LOC(api_url, bearer_token, CompanyID, cache_dir, cache_ttl), columns=['ID', 'Name', 'Total Lines of Code'])
 
     # Merge data from both dataframes
     merged_df = pd.merge(df, hl_apps_loc_df, left_on='Application Name', right_on='Name', how='left')
 
-    # Create a new Excel workbook for consolidated data
-    consolidated_workbook = openpyxl.Workbook()
-    consolidated_sheet = consolidated_workbook.active
-
-    # Write headers to the consolidated sheet
-    consolidated_sheet['A1'] = 'Application Name'
-    consolidated_sheet['B1'] = 'Application ID'
-    consolidated_sheet['C1'] = 'Log File'
-    consolidated_sheet['D1'] = 'Start Time'
-    consolidated_sheet['E1'] = 'End Time'
-    consolidated_sheet['F1'] = 'Total Time (minutes)'
-    consolidated_sheet['G1'] = 'LOC'
-    #consolidated_sheet['H1'] = 'App ID'
-
-    # Write data to the consolidated sheet
-    for index, row in merged_df.iterrows():
-        consolidated_sheet[f'A{index + 2}'] = row['Application Name']
-        consolidated_sheet[f'B{index + 2}'] = row['Application ID']
-        consolidated_sheet[f'C{index + 2}'] = row['Log File']
-        consolidated_sheet[f'D{index + 2}'] = row['Start Time']
-        consolidated_sheet[f'E{index + 2}'] = row['End Time']
-        consolidated_sheet[f'F{index + 2}'] = row['Total Time (minutes)']
-        consolidated_sheet[f'G{index + 2}'] = row['Total Lines of Code']
-        #consolidated_sheet[f'H{index + 2}'] = row['ID']
-
-    # Save the consolidated workbook
-    consolidated_workbook.save(os.path.join(output_directory, 'HLLogSummaryReport.xlsx'))
-    print("Consolidated data has been written to HLLogSummaryReport.xlsx.")
-    # Delete HLAppsandLOC.csv and HLLogReport.xlsx
-    os.remove('HLAppsandLOC.csv')
-    os.remove(output_file_path)
+    write_reports(merged_df, output_directory, report_formats)
+
 # Run the main function
 if __name__ == "__main__":
-    main()
+    parser = ArgumentParser(description="Consolidates the Highlight automation logs into a report.")
+    parser.add_argument('-profile', '--profile', action='store_true', help='Write cProfile and tracemalloc output of the run to output_directory')
+    main(profile=parser.parse_args().profile)
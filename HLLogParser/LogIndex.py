@@ -0,0 +1,103 @@
+import sqlite3
+from datetime import datetime
+
+# Parsed result of every log seen so far, keyed on path and invalidated by size/mtime
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_index (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+    total_minutes REAL,
+    application_name TEXT,
+    application_id TEXT
+)
+"""
+
+
+def open_index(index_path):
+    """
+    Opens (and creates if needed) the SQLite log index.
+    Parameters:
+        index_path (str): The path to the index database file.
+    Returns:
+        sqlite3.Connection: The open connection.
+    """
+    conn = sqlite3.connect(index_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(SCHEMA)
+    conn.commit()
+    return conn
+
+
+def find_changed_files(conn, log_files):
+    """
+    Returns the log files that are new, or whose size or mtime changed since they were indexed.
+    Parameters:
+        conn (sqlite3.Connection): The index connection.
+        log_files (list): (path, size, mtime_ns) tuples of every log on disk.
+    Returns:
+        list: The (path, size, mtime_ns) tuples that need parsing.
+    """
+    indexed = {path: (size, mtime_ns) for path, size, mtime_ns in conn.execute("SELECT path, size, mtime_ns FROM log_index")}
+    return [(path, size, mtime_ns) for path, size, mtime_ns in log_files if indexed.get(path) != (size, mtime_ns)]
+
+
+def store_results(conn, changed_files, results):
+    """
+    Stores parsed results in the index.
+    Parameters:
+        conn (sqlite3.Connection): The index connection.
+        changed_files (list): (path, size, mtime_ns) tuples that were parsed.
+        results (iterable): (path, (start_time, end_time, total_time, application_name, application_id)) pairs,
+            (path, None) for a log that could not be read.
+    Returns:
+        int: The number of logs stored.
+    """
+    stats = {path: (size, mtime_ns) for path, size, mtime_ns in changed_files}
+    rows = []
+    for path, result in results:
+        # A log that could not be read is not indexed, so the next run parses it again
+        if result is None:
+            continue
+        start_time, end_time, total_time, application_name, application_id = result
+        size, mtime_ns = stats[path]
+        # Incomplete logs are stored too, so they are not parsed again until they change
+        completed = isinstance(end_time, datetime)
+        rows.append((path, size, mtime_ns,
+                     start_time.isoformat() if start_time else None,
+                     end_time.isoformat() if completed else None,
+                     total_time if completed else None,
+                     application_name, application_id))
+    conn.executemany("INSERT OR REPLACE INTO log_index VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    return len(rows)
+
+
+def remove_missing_files(conn, log_files):
+    # Drop index entries for logs that are no longer on disk
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen_paths (path TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM seen_paths")
+    conn.executemany("INSERT OR IGNORE INTO seen_paths VALUES (?)", ((path,) for path, _, _ in log_files))
+    removed = conn.execute("DELETE FROM log_index WHERE path NOT IN (SELECT path FROM seen_paths)").rowcount
+    conn.commit()
+    return removed
+
+
+def load_report_rows(conn):
+    """
+    Loads the report rows for every indexed log that has a start time.
+    Parameters:
+        conn (sqlite3.Connection): The index connection.
+    Returns:
+        list: [Application Name, Application ID, Log File, Start Time, End Time, Total Time (minutes)] rows.
+    """
+    data = []
+    query = ("SELECT application_name, application_id, path, start_time, end_time, total_minutes "
+             "FROM log_index WHERE start_time IS NOT NULL ORDER BY path")
+    for application_name, application_id, path, start_time, end_time, total_minutes in conn.execute(query):
+        end_time = datetime.fromisoformat(end_time) if end_time else "Error"
+        total_minutes = total_minutes if total_minutes is not None else "Error"
+        data.append([application_name, application_id, path, datetime.fromisoformat(start_time), end_time, total_minutes])
+    return data
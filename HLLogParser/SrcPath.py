@@ -0,0 +1,8 @@
+# The HLLogParser scripts share modules with the automation scripts in src, such as the Highlight
+# REST client, importing this module makes them importable
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
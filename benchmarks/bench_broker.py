@@ -0,0 +1,130 @@
+"""
+Runs the coordinator/worker scan mode (src/ScanBroker.py) with several worker processes
+on one machine, against the stub Highlight executable. One worker can be killed while it
+holds leases, to check that its applications are leased again once the lease expires.
+
+    python bench_broker.py --apps 40 --workers 4 --threads 2 --kill-one
+"""
+import os
+import sys
+import time
+import shutil
+import socket
+import signal
+import tempfile
+import threading
+import subprocess
+from argparse import ArgumentParser
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+import ScanBroker
+import Settings
+
+STUB_HIGHLIGHT = os.path.join(BENCH_DIR, 'stub_highlight.py')
+
+
+def make_workspace(root, app_count, kb_per_app):
+    # Application folders, applications.txt and a config.properties for the workers
+    paths = {name: os.path.join(root, name) for name in ('analyze', 'results', 'logs')}
+    for path in paths.values():
+        os.makedirs(path)
+    applications_file = os.path.join(root, 'applications.txt')
+    with open(applications_file, 'w') as file:
+        file.write("Application;ID\n")
+        for i in range(app_count):
+            app_name = f"App-{i:04d}"
+            os.makedirs(os.path.join(paths['analyze'], app_name, 'repo'))
+            with open(os.path.join(paths['analyze'], app_name, 'repo', 'main.py'), 'w') as source:
+                source.write('x = 1\n' * (kb_per_app * 1024 // 6))
+            file.write(f"{app_name};{1000 + i}\n")
+    config_file = os.path.join(root, 'config.properties')
+    with open(config_file, 'w') as file:
+        file.write(f"""[Directories]
+logs_dir={paths['logs']}
+src_dir_analyze={paths['analyze']}
+RESULTS={paths['results']}
+highlight_perl_dir=
+highlight_analyzer_dir=
+[HIGHLIGHT-ONBOARDING]
+highlight_application_mapping={applications_file}
+highlight_base_url=http://localhost
+highlight_executable={STUB_HIGHLIGHT}
+highlight_company_id=1
+highlight_token=token
+IGNORED_DIR=
+IGNORED_PATHS=
+IGNORED_FILES=
+""")
+    return config_file
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark the distributed scan mode with local worker processes.')
+    parser.add_argument('--apps', type=int, default=20)
+    parser.add_argument('--kb-per-app', type=int, default=256)
+    parser.add_argument('--workers', type=int, default=3, help='Worker processes')
+    parser.add_argument('--threads', type=int, default=2, help='Threads per worker process')
+    parser.add_argument('--seconds-per-mb', type=float, default=2.0, help='Stub Highlight time per MB of source')
+    parser.add_argument('--lease-seconds', type=int, default=6)
+    parser.add_argument('--kill-one', action='store_true', help='Kill a worker while it holds leases')
+    parser.add_argument('--keep', action='store_true', help='Keep the working directory')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='hl_broker_')
+    try:
+        config_file = make_workspace(root, args.apps, args.kb_per_app)
+        queue_file = os.path.join(root, 'ScanQueue.db')
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            broker = f"127.0.0.1:{probe.getsockname()[1]}"
+        # The coordinator serves the queue until it is drained, as on the coordinator host
+        coordinator = threading.Thread(target=ScanBroker.run_coordinator,
+                                       args=(Settings.load_settings(config_file), queue_file, False, broker, args.lease_seconds))
+        coordinator.start()
+
+        env = dict(os.environ, STUB_HL_SECONDS_PER_MB=str(args.seconds_per_mb))
+        worker_code = (f"import ScanBroker, Settings; "
+                       f"ScanBroker.run_worker(Settings.load_settings({config_file!r}), {broker!r}, {args.threads})")
+        start = time.perf_counter()
+        workers = [subprocess.Popen([sys.executable, '-c', worker_code], cwd=SRC_DIR, env=env, stdout=subprocess.DEVNULL)
+                   for i in range(args.workers)]
+
+        if args.kill_one:
+            # Wait until the first worker holds a lease, then kill it without any cleanup
+            conn = ScanBroker.connect(queue_file)
+            while not conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'leased' AND worker LIKE ?", (f"%-{workers[0].pid}-%",)).fetchone()[0]:
+                time.sleep(0.05)
+            conn.close()
+            workers[0].send_signal(signal.SIGKILL)
+            print(f"Killed worker {workers[0].pid} while it held leases")
+
+        for worker in workers:
+            worker.wait()
+        seconds = time.perf_counter() - start
+        coordinator.join()
+
+        conn = ScanBroker.connect(queue_file)
+        counts = ScanBroker.progress(conn)
+        retried = conn.execute("SELECT COUNT(*) FROM jobs WHERE attempts > 1").fetchone()[0]
+        per_worker = conn.execute("SELECT worker, COUNT(*) FROM jobs WHERE state = 'done' GROUP BY worker").fetchall()
+        conn.close()
+
+        print(f"\n{counts['done']} of {args.apps} applications done, {counts['failed']} failed, {retried} leased more than once")
+        print(f"{seconds:.2f} s wall with {args.workers} workers x {args.threads} threads, {counts['done'] / seconds:.2f} applications/s")
+        for worker, done in per_worker:
+            print(f"  {worker}: {done}")
+        summary_file = os.path.join(root, 'logs', 'summary_broker.csv')
+        ScanBroker.write_summary(queue_file, summary_file)
+        print(f"Summary: {summary_file}")
+    finally:
+        if args.keep:
+            print(f"Working directory kept: {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
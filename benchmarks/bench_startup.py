@@ -0,0 +1,93 @@
+"""
+Cold start-up time of CASTHL_Automation.py for each option: a fresh interpreter imports
+the entry point and the modules that option imports, as main() does. Exits with status 1
+when the median import time of any option exceeds its budget, or when the entry point
+alone loads a heavy module.
+
+    python bench_startup.py --runs 5
+    python bench_startup.py --budget-ms 300 --pandas-budget-ms 1500
+"""
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+from argparse import ArgumentParser
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', 'src')
+
+# Modules imported by each option of CASTHL_Automation.main(), keep in line with it
+STEP_MODULES = {
+    'entry': [],
+    '0': ['requests', 'AppRepoMapping', 'HLProvisioning'],
+    '1': ['requests', 'pandas'],
+    '2': ['requests', 'BatchPlanner', 'CloneRepo'],
+    '3': ['UnzipFile'],
+    '4': ['AppRepoMapping', 'pandas'],
+    '5': ['HLScanAndOnboard'],
+}
+# Reported when loaded, the entry point alone must not load any of them
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl', 'requests', 'urllib3', 'validators', 'multiprocessing']
+# Options that read spreadsheets or CSV files through pandas get the larger budget
+PANDAS_STEPS = {'0', '1', '4'}
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import CASTHL_Automation
+for module in {modules!r}:
+    __import__(module)
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(step, runs):
+    """
+    Returns:
+        tuple: (median process wall seconds, median import seconds, heavy modules loaded).
+    """
+    code = PROBE.format(modules=STEP_MODULES[step], heavy=HEAVY_MODULES)
+    wall = []
+    imports = []
+    for run in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code], cwd=SRC_DIR, capture_output=True, text=True, check=True)
+        wall.append(time.perf_counter() - start)
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        imports.append(probe['seconds'])
+    return statistics.median(wall), statistics.median(imports), probe['loaded']
+
+
+def main():
+    parser = ArgumentParser(description='Cold start-up time of CASTHL_Automation.py per option, with a budget.')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per option, the median is kept')
+    parser.add_argument('--budget-ms', type=float, default=400, help='Import budget of the options without pandas')
+    parser.add_argument('--pandas-budget-ms', type=float, default=2000, help='Import budget of the options reading files through pandas')
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    failed = []
+    print(f"{'option':>8} | {'import_ms':>10} | {'process_ms':>10} | {'budget_ms':>10} | heavy modules loaded")
+    for step in STEP_MODULES:
+        wall, imports, loaded = measure(step, args.runs)
+        budget = args.pandas_budget_ms if step in PANDAS_STEPS else args.budget_ms
+        over = imports * 1000 > budget or (step == 'entry' and loaded)
+        if over:
+            failed.append(step)
+        results.append({'option': step, 'import_ms': round(imports * 1000, 1), 'process_ms': round(wall * 1000, 1), 'budget_ms': budget, 'loaded': loaded})
+        print(f"{step:>8} | {imports * 1000:>10.1f} | {wall * 1000:>10.1f} | {budget:>10.0f} | {', '.join(loaded) or '-'}{'  OVER BUDGET' if over else ''}")
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+    if failed:
+        print(f"Start-up over budget for: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Compares the zipball transport of option 2 followed by the extraction of option 3 with the tarball
+transport, which extracts each archive while it downloads. Both read the same repositories from the
+mock GitHub. --bandwidth-kbps throttles each archive download, where overlapping extraction with the
+transfer matters most.
+
+    python bench_tarball.py --repos 20 --max-kb 4096 --workers 4 --bandwidth-kbps 2048
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+sys.path.insert(0, BENCH_DIR)
+
+import CASTHL_Automation
+import UnzipFile
+import TarballStream
+import RepoCatalog
+from mock_github import MockGitHub
+
+
+def tree_stats(root):
+    files, size = 0, 0
+    for folder, dirs, names in os.walk(root):
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(folder, name))
+    return files, size
+
+
+def summary_record(repo, metadata):
+    # The summary CSV row option 1 would write for the repository
+    download_url = metadata['archive_url'].replace('{archive_format}', 'zipball/').replace('{/ref}', repo['default_branch'])
+    return RepoCatalog.RepoRecord(repo['name'], size=repo['size'], default_branch=repo['default_branch'],
+                                  archive_url=metadata['archive_url'], download_url=download_url)
+
+
+def main():
+    parser = ArgumentParser(description='Compare download-then-unzip with one pass tarball extraction.')
+    parser.add_argument('--repos', type=int, default=10)
+    parser.add_argument('--min-kb', type=int, default=256)
+    parser.add_argument('--max-kb', type=int, default=4096)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--bandwidth-kbps', type=int, default=0, help='Download speed of each archive, 0 for unlimited')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='hl_tarball_')
+    mock = MockGitHub('bench-org', args.repos, (args.min_kb, args.max_kb), bandwidth_kbps=args.bandwidth_kbps)
+    mock.start()
+    try:
+        repositories = []
+        for repo in mock.repos:
+            metadata = mock.repo_json(repo)
+            repositories.append(summary_record(repo, metadata))
+            # Archives are generated up front, so neither transport pays for it
+            mock.archive(repo, 'zipball')
+            mock.archive(repo, 'tarball')
+
+        logs = os.path.join(root, 'logs')
+        os.makedirs(logs)
+        transfer_log = os.path.join(logs, 'Transfer.csv')
+        with open(transfer_log, 'w') as file:
+            file.write("Repository,Transport,Bytes,Seconds\n")
+        start_end_log = os.path.join(logs, 'Time.txt')
+        status_log = os.path.join(logs, 'Status.txt')
+
+        # Option 2 with transport=zipball, then option 3
+        src_dir = os.path.join(root, 'src')
+        zip_unzip_dir = os.path.join(root, 'unzip_zipball')
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(lambda r: CASTHL_Automation.download_and_save_code(r.name, r.download_url, src_dir, '', start_end_log, status_log, transfer_log), repositories))
+        download_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        UnzipFile.unzip_code(src_dir, zip_unzip_dir, os.path.join(logs, 'Unzip_Execution.log'), os.path.join(logs, 'Unzip_Time.log'))
+        unzip_seconds = time.perf_counter() - start
+        archives_bytes = tree_stats(src_dir)[1]
+
+        # Option 2 with transport=tarball
+        tar_unzip_dir = os.path.join(root, 'unzip_tarball')
+        start = time.perf_counter()
+        TarballStream.extract_repositories(repositories, tar_unzip_dir, '', None, start_end_log, status_log, transfer_log, args.workers)
+        tarball_seconds = time.perf_counter() - start
+
+        zip_files, zip_bytes = tree_stats(zip_unzip_dir)
+        tar_files, tar_bytes = tree_stats(tar_unzip_dir)
+        print(f"\nzipball + unzip: {download_seconds + unzip_seconds:.2f} s wall ({download_seconds:.2f} s download, {unzip_seconds:.2f} s unzip), "
+              f"{zip_files} files {zip_bytes / (1024 * 1024):.1f} MB, peak disk {(archives_bytes + zip_bytes) / (1024 * 1024):.1f} MB")
+        print(f"tarball stream:  {tarball_seconds:.2f} s wall, {tar_files} files {tar_bytes / (1024 * 1024):.1f} MB, "
+              f"peak disk {tar_bytes / (1024 * 1024):.1f} MB")
+        if (zip_files, zip_bytes) != (tar_files, tar_bytes):
+            print("Warning: the two transports did not extract the same trees.")
+        CASTHL_Automation.summarize_transfers(transfer_log)
+    finally:
+        mock.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
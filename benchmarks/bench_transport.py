@@ -0,0 +1,102 @@
+"""
+Compares the zipball and git transports of option 2 on the same repositories.
+The mock GitHub serves the zipballs, and local bare repositories built from the same
+contents serve the shallow clones. Run twice with --rerun to also time the
+fetch-and-reset update path.
+
+    python bench_transport.py --repos 20 --max-kb 4096 --workers 4
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import zipfile
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+sys.path.insert(0, BENCH_DIR)
+
+import CASTHL_Automation
+import CloneRepo
+import RepoCatalog
+from mock_github import MockGitHub
+
+
+def make_bare_repository(mock, repo, root):
+    # Working tree from the mock zipball, committed once and exposed as a bare repository
+    work_tree = os.path.join(root, 'work', repo['name'])
+    with zipfile.ZipFile(io.BytesIO(mock.archive(repo, 'zipball'))) as archive:
+        archive.extractall(work_tree)
+    inner = os.path.join(work_tree, os.listdir(work_tree)[0])
+    git = lambda *args, cwd=inner: subprocess.run(['git'] + list(args), cwd=cwd, check=True, capture_output=True)
+    git('init', '-q', '-b', repo['default_branch'])
+    git('add', '-A')
+    git('-c', 'user.name=bench', '-c', 'user.email=bench@localhost', 'commit', '-q', '-m', 'import')
+    bare = os.path.join(root, 'bare', f"{repo['name']}.git")
+    git('clone', '-q', '--bare', inner, bare, cwd=root)
+    return 'file://' + bare.replace(os.sep, '/')
+
+
+def main():
+    parser = ArgumentParser(description='Compare zipball downloads with shallow git clones.')
+    parser.add_argument('--repos', type=int, default=10)
+    parser.add_argument('--min-kb', type=int, default=256)
+    parser.add_argument('--max-kb', type=int, default=4096)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rerun', action='store_true', help='Clone a second time to time the fetch-and-reset path')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='hl_transport_')
+    mock = MockGitHub('bench-org', args.repos, (args.min_kb, args.max_kb))
+    mock.start()
+    try:
+        print("Building bare repositories ...")
+        repositories = []
+        for repo in mock.repos:
+            clone_url = make_bare_repository(mock, repo, root)
+            download_url = f"{mock.base_url}/repos/{mock.org_name}/{repo['name']}/zipball/{repo['default_branch']}"
+            repositories.append(RepoCatalog.RepoRecord(repo['name'], size=repo['size'], default_branch=repo['default_branch'],
+                                                       clone_url=clone_url, download_url=download_url))
+
+        logs = os.path.join(root, 'logs')
+        os.makedirs(logs)
+        transfer_log = os.path.join(logs, 'Transfer.csv')
+        with open(transfer_log, 'w') as file:
+            file.write("Repository,Transport,Bytes,Seconds\n")
+        start_end_log = os.path.join(logs, 'Time.txt')
+        status_log = os.path.join(logs, 'Status.txt')
+
+        src_dir = os.path.join(root, 'src')
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(lambda r: CASTHL_Automation.download_and_save_code(r.name, r.download_url, src_dir, '', start_end_log, status_log, transfer_log), repositories))
+        zipball_seconds = time.perf_counter() - start
+
+        clone_dir = os.path.join(root, 'clones')
+        start = time.perf_counter()
+        CloneRepo.clone_repositories(repositories, clone_dir, '', start_end_log, status_log, transfer_log, args.workers)
+        git_seconds = time.perf_counter() - start
+
+        rerun_seconds = None
+        if args.rerun:
+            start = time.perf_counter()
+            CloneRepo.clone_repositories(repositories, clone_dir, '', start_end_log, status_log, transfer_log, args.workers)
+            rerun_seconds = time.perf_counter() - start
+
+        print(f"\nzipball: {zipball_seconds:.2f} s wall for {len(repositories)} repositories (extraction in option 3 not included)")
+        print(f"git:     {git_seconds:.2f} s wall for {len(repositories)} repositories (checked out, ready for option 4)")
+        if rerun_seconds is not None:
+            print(f"git re-run (fetch and reset): {rerun_seconds:.2f} s wall")
+        CASTHL_Automation.summarize_transfers(transfer_log)
+    finally:
+        mock.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Compares uploading Highlight result zips one application at a time with the upload stage
+(src/ResultUpload.py) running several command line uploads at once. Both send the same zips through
+stub_highlight.py --uploadZipFile to the mock Highlight server, --latency and --connect-latency stand
+for a distant server. A last run checks that zips already uploaded are not sent again.
+
+    python bench_upload.py --apps 40 --files 2000 --workers 8 --latency 0.2 --connect-latency 0.3
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+from argparse import ArgumentParser
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+sys.path.insert(0, BENCH_DIR)
+
+import ResultUpload
+import Settings
+import stub_highlight
+from mock_highlight import MockHighlight
+
+
+def make_workspace(root, app_count, files, base_url, workers):
+    # Result zips as the stub command line saves them, and a config.properties for ResultUpload that keeps
+    # the zips once uploaded (deferred mode), so every run sends the same zips
+    paths = {name: os.path.join(root, name) for name in ('results', 'logs', 'output')}
+    for path in paths.values():
+        os.makedirs(path, exist_ok=True)
+    applications = []
+    for i in range(app_count):
+        app_name, app_id = f"App-{i:04d}", str(1000 + i)
+        zip_file = ResultUpload.result_zip(paths['results'], app_name)
+        if not os.path.exists(zip_file):
+            # Applications differ in size, as they do in a portfolio
+            stub_highlight.save_results(zip_file, app_name, app_id, files // 2 + (files * i) // app_count, 0)
+        applications.append([app_name, app_id])
+    config_file = os.path.join(root, f"config_{workers}.properties")
+    with open(config_file, 'w') as file:
+        file.write(f"""[GitHub]
+github_org_name=bench-org
+[Directories]
+logs_dir={paths['logs']}
+output_dir={paths['output']}
+RESULTS={paths['results']}
+[HIGHLIGHT-ONBOARDING]
+highlight_base_url={base_url}
+highlight_executable={os.path.join(BENCH_DIR, 'stub_highlight.py')}
+highlight_company_id=1
+highlight_token=token
+UPLOAD_MODE=deferred
+UPLOAD_WORKERS={workers}
+""")
+    return Settings.load_settings(config_file), applications
+
+
+def measure(mock, label, upload):
+    before = dict(mock.stats)
+    start = time.perf_counter()
+    results = upload()
+    seconds = time.perf_counter() - start
+    uploaded = [result for result in results if result['status'] == 'Uploaded']
+    latencies = [result['seconds'] for result in uploaded]
+    print(f"{label:<28} {seconds:>7.2f} s wall, {len(uploaded):>4} uploaded, "
+          f"{(mock.stats['bytes_received'] - before['bytes_received']) / (1024 * 1024):>7.2f} MB sent, "
+          f"{mock.stats['connections'] - before['connections']:>4} connections, "
+          f"p50 {ResultUpload.percentile(latencies, 50):.2f} s p90 {ResultUpload.percentile(latencies, 90):.2f} s")
+    return seconds
+
+
+def main():
+    parser = ArgumentParser(description='Compare one at a time result uploads with the pooled upload stage.')
+    parser.add_argument('--apps', type=int, default=20)
+    parser.add_argument('--files', type=int, default=1000, help='Analyzed files of the average application, sets the result zip size')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.1, help='Seconds added to every response')
+    parser.add_argument('--connect-latency', type=float, default=0.2, help='Seconds added to every new connection')
+    parser.add_argument('--bandwidth-kbps', type=int, default=0, help='Upload speed of each connection, 0 for unlimited')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='hl_upload_')
+    mock = MockHighlight(args.latency, args.connect_latency, args.bandwidth_kbps)
+    base_url = mock.start()
+    try:
+        serial_settings, applications = make_workspace(root, args.apps, args.files, base_url, 1)
+        pooled_settings, applications = make_workspace(root, args.apps, args.files, base_url, args.workers)
+        zip_bytes = sum(os.path.getsize(ResultUpload.result_zip(serial_settings.results_dir, app_name)) for app_name, app_id in applications)
+        print(f"{len(applications)} result zips, {zip_bytes / (1024 * 1024):.2f} MB\n")
+
+        serial = measure(mock, 'one at a time', lambda: ResultUpload.upload_applications(serial_settings, applications, force=True))
+        pooled = measure(mock, f'{args.workers} at a time', lambda: ResultUpload.upload_applications(pooled_settings, applications, force=True))
+        measure(mock, 'resumed, nothing changed', lambda: ResultUpload.upload_applications(pooled_settings, applications))
+        print(f"\nPooled upload stage {serial / pooled:.1f}x faster, {mock.stats['uploads']} zips received intact.")
+    finally:
+        mock.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
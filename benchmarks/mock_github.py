@@ -0,0 +1,212 @@
+import io
+import json
+import time
+import random
+import hashlib
+import tarfile
+import zipfile
+import threading
+from argparse import ArgumentParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Source files put in the generated archives, by extension
+FILE_TYPES = ['.java', '.js', '.ts', '.py', '.cs', '.xml', '.json', '.md']
+
+
+class MockGitHub:
+    """
+    Local stand-in for the GitHub organisation, commit and archive (zipball and tarball) endpoints used by steps 1 and 2.
+    Parameters:
+        org_name (str): The organisation served.
+        repo_count (int): Number of repositories in the organisation.
+        archive_kb (tuple): (min, max) uncompressed archive size in KB, drawn per repository.
+        latency (float): Seconds added to every response.
+        rate_limit (int): Requests allowed per rate_window seconds, 0 for unlimited.
+        rate_window (float): Length of the rate limit window in seconds.
+        bandwidth_kbps (int): Archive download speed in KB/s, 0 for unlimited.
+        seed (int): Seed of the generated repositories and archive contents.
+        extra_orgs (tuple): Further organisations serving the same repositories, for multi organisation runs.
+    """
+    def __init__(self, org_name='bench-org', repo_count=50, archive_kb=(64, 2048), latency=0.0,
+                 rate_limit=0, rate_window=60.0, bandwidth_kbps=0, seed=1, extra_orgs=()):
+        self.org_name = org_name
+        self.org_names = (org_name,) + tuple(extra_orgs)
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.bandwidth_kbps = bandwidth_kbps
+        self.base_url = None
+        self.server = None
+        self.stats = {'requests': 0, 'rate_limited': 0, 'archive_bytes': 0}
+        self.lock = threading.Lock()
+        self.window_start = time.time()
+        self.window_count = 0
+        self.archives = {}
+
+        generator = random.Random(seed)
+        self.repos = []
+        for i in range(repo_count):
+            name = f"repo-{i:05d}"
+            size_kb = generator.randint(*archive_kb)
+            sha = hashlib.sha1(f"{seed}:{name}".encode()).hexdigest()
+            self.repos.append({'id': 1000 + i, 'name': name, 'default_branch': 'main', 'size': size_kb,
+                               'updated_at': '2024-01-01T00:00:00Z', 'sha': sha})
+
+    def start(self, port=0):
+        handler = type('Handler', (_Handler,), {'mock': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def repo_json(self, repo, org_name=None):
+        org_name = org_name or self.org_name
+        base = f"{self.base_url}/repos/{org_name}/{repo['name']}"
+        return {
+            'id': repo['id'], 'name': repo['name'], 'full_name': f"{org_name}/{repo['name']}",
+            'default_branch': repo['default_branch'], 'size': repo['size'], 'updated_at': repo['updated_at'],
+            'clone_url': f"{self.base_url}/{org_name}/{repo['name']}.git",
+            'archive_url': base + "/{archive_format}{/ref}",
+        }
+
+    def archive(self, repo, archive_format):
+        # Archives are generated once, with roughly size KB of uncompressible-ish source text
+        key = (repo['name'], archive_format)
+        with self.lock:
+            if key in self.archives:
+                return self.archives[key]
+        generator = random.Random(repo['sha'])
+        top = f"{self.org_name}-{repo['name']}-{repo['sha'][:7]}"
+        files = []
+        remaining = repo['size'] * 1024
+        index = 0
+        while remaining > 0:
+            size = min(remaining, generator.randint(2, 64) * 1024)
+            words = ' '.join(generator.choice(('int', 'return', 'value', 'class', 'if', 'for', str(index))) for _ in range(size // 6))
+            path = f"{top}/src/module{index % 10}/File{index}{FILE_TYPES[index % len(FILE_TYPES)]}"
+            files.append((path, words[:size].encode()))
+            remaining -= size
+            index += 1
+
+        buffer = io.BytesIO()
+        if archive_format == 'tarball':
+            # Same contents as the zipball, as a gzipped tar stream
+            with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+                for path, content in files:
+                    info = tarfile.TarInfo(path)
+                    info.size = len(content)
+                    info.mtime = 1704067200
+                    archive.addfile(info, io.BytesIO(content))
+        else:
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for path, content in files:
+                    archive.writestr(path, content)
+        data = buffer.getvalue()
+        with self.lock:
+            self.archives[key] = data
+        return data
+
+    def admit(self):
+        # Fixed window rate limit, answered like GitHub's primary rate limit
+        with self.lock:
+            self.stats['requests'] += 1
+            if not self.rate_limit:
+                return True, None
+            now = time.time()
+            if now - self.window_start >= self.rate_window:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            remaining = max(self.rate_limit - self.window_count, 0)
+            headers = {'X-RateLimit-Limit': str(self.rate_limit), 'X-RateLimit-Remaining': str(remaining),
+                       'X-RateLimit-Reset': str(int(self.window_start + self.rate_window))}
+            if self.window_count > self.rate_limit:
+                self.stats['rate_limited'] += 1
+                return False, headers
+            return True, headers
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type='application/json', headers=None, throttle=False):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if throttle and self.mock.bandwidth_kbps:
+            chunk = self.mock.bandwidth_kbps * 1024 // 10
+            for start in range(0, len(body), chunk):
+                self.wfile.write(body[start:start + chunk])
+                time.sleep(0.1)
+        else:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        mock = self.mock
+        if mock.latency:
+            time.sleep(mock.latency)
+        allowed, headers = mock.admit()
+        if not allowed:
+            self.send_body(403, b'{"message": "API rate limit exceeded"}', headers=headers)
+            return
+
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        query = parse_qs(url.query)
+        repos = {repo['name']: repo for repo in mock.repos}
+
+        if len(parts) == 3 and parts[0] == 'orgs' and parts[2] == 'repos':
+            if parts[1] not in mock.org_names:
+                self.send_body(404, b'{"message": "Not Found"}', headers=headers)
+                return
+            per_page = min(int(query.get('per_page', ['30'])[0]), 100)
+            page = int(query.get('page', ['1'])[0])
+            page_repos = mock.repos[(page - 1) * per_page:page * per_page]
+            self.send_body(200, json.dumps([mock.repo_json(repo, parts[1]) for repo in page_repos]).encode(), headers=headers)
+        elif len(parts) >= 4 and parts[0] == 'repos' and parts[3] in ('zipball', 'tarball') and parts[2] in repos:
+            # The ref is optional, as on GitHub it defaults to the default branch
+            data = mock.archive(repos[parts[2]], parts[3])
+            with mock.lock:
+                mock.stats['archive_bytes'] += len(data)
+            content_type = 'application/x-gzip' if parts[3] == 'tarball' else 'application/zip'
+            self.send_body(200, data, content_type, headers, throttle=True)
+        elif len(parts) == 5 and parts[0] == 'repos' and parts[3] == 'commits' and parts[2] in repos:
+            self.send_body(200, repos[parts[2]]['sha'].encode(), 'application/vnd.github.sha', headers)
+        else:
+            self.send_body(404, b'{"message": "Not Found"}', headers=headers)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Serve a mock GitHub organisation on localhost.')
+    parser.add_argument('--org', default='bench-org', help='Organisation, several separated by commas')
+    parser.add_argument('--repos', type=int, default=50)
+    parser.add_argument('--min-kb', type=int, default=64)
+    parser.add_argument('--max-kb', type=int, default=2048)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=0)
+    parser.add_argument('--bandwidth-kbps', type=int, default=0)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    org_names = [org_name.strip() for org_name in args.org.split(',') if org_name.strip()]
+    mock = MockGitHub(org_names[0], args.repos, (args.min_kb, args.max_kb), args.latency, args.rate_limit,
+                      bandwidth_kbps=args.bandwidth_kbps, extra_orgs=org_names[1:])
+    print(f"Mock GitHub for '{args.org}' listening on {mock.start(args.port)} (set github_api_url to this URL)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        mock.stop()
@@ -0,0 +1,134 @@
+import io
+import re
+import time
+import zipfile
+import threading
+from argparse import ArgumentParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+UPLOAD_PATH = re.compile(r'^/WS2/domains/(?P<company_id>[^/]+)/applications/(?P<app_id>[^/]+)/results$')
+
+
+class MockHighlight:
+    """
+    Local stand-in for the Highlight server receiving the result zips that stub_highlight.py --uploadZipFile
+    sends, as the command line does for src/ResultUpload.py.
+    Parameters:
+        latency (float): Seconds added to every response, the round trip of a distant server.
+        connect_latency (float): Seconds added to every new connection, its TCP and TLS handshakes.
+        bandwidth_kbps (int): Upload speed in KB/s of each connection, 0 for unlimited.
+        fail_first (int): Uploads answered 503 before the server accepts any, to exercise retries.
+    """
+    def __init__(self, latency=0.0, connect_latency=0.0, bandwidth_kbps=0, fail_first=0):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.bandwidth_kbps = bandwidth_kbps
+        self.fail_first = fail_first
+        self.base_url = None
+        self.server = None
+        self.stats = {'connections': 0, 'requests': 0, 'uploads': 0, 'failed': 0, 'bytes_received': 0}
+        # Application ID -> zip bytes of its last upload
+        self.uploads = {}
+        self.lock = threading.Lock()
+
+    def start(self, port=0):
+        handler = type('Handler', (_Handler,), {'mock': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock = None
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.mock.lock:
+            self.mock.stats['connections'] += 1
+        if self.mock.connect_latency:
+            time.sleep(self.mock.connect_latency)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self, length):
+        if not self.mock.bandwidth_kbps:
+            return self.rfile.read(length)
+        chunks = []
+        chunk = self.mock.bandwidth_kbps * 1024 // 10
+        while length > 0:
+            data = self.rfile.read(min(chunk, length))
+            if not data:
+                break
+            chunks.append(data)
+            length -= len(data)
+            time.sleep(0.1)
+        return b''.join(chunks)
+
+    def do_POST(self):
+        mock = self.mock
+        match = UPLOAD_PATH.match(self.path)
+        if 'Content-Length' not in self.headers:
+            self.send_body(411, b'{"message": "Length Required"}')
+            return
+        body = self.read_body(int(self.headers['Content-Length']))
+        if mock.latency:
+            time.sleep(mock.latency)
+        with mock.lock:
+            mock.stats['requests'] += 1
+            mock.stats['bytes_received'] += len(body)
+            failing = mock.stats['requests'] <= mock.fail_first
+            if failing:
+                mock.stats['failed'] += 1
+        if not match:
+            self.send_body(404, b'{"message": "Not Found"}')
+            return
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self.send_body(401, b'{"message": "Unauthorized"}')
+            return
+        if failing:
+            self.send_body(503, b'{"message": "Service Unavailable"}')
+            return
+        try:
+            with zipfile.ZipFile(io.BytesIO(body)) as archive:
+                archive.testzip()
+        except (OSError, EOFError, zipfile.BadZipFile):
+            self.send_body(400, b'{"message": "Not a result zip"}')
+            return
+        with mock.lock:
+            mock.stats['uploads'] += 1
+            mock.uploads[match.group('app_id')] = body
+        self.send_body(200, b'{"status": "Uploaded"}')
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Serve a mock Highlight results upload endpoint on localhost.')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--connect-latency', type=float, default=0.0)
+    parser.add_argument('--bandwidth-kbps', type=int, default=0)
+    parser.add_argument('--fail-first', type=int, default=0)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    mock = MockHighlight(args.latency, args.connect_latency, args.bandwidth_kbps, args.fail_first)
+    print(f"Mock Highlight listening on {mock.start(args.port)} (set highlight_base_url to this URL, highlight_executable to stub_highlight.py)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        mock.stop()
+        print(mock.stats)
@@ -0,0 +1,232 @@
+"""
+Offline benchmark of pipeline steps 1-5 against the mock GitHub server and the stub
+Highlight executable. Reports throughput, latency percentiles and peak memory per stage.
+
+    python run_benchmarks.py --repos 200 --apps 20 --threads 4 --json results.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+sys.path.insert(0, BENCH_DIR)
+
+import pandas as pd
+import CASTHL_Automation
+import UnzipFile
+import AppRepoMapping
+import HLScanAndOnboard
+import RepoCatalog
+from mock_github import MockGitHub
+
+STUB_HIGHLIGHT = os.path.join(BENCH_DIR, 'stub_highlight.py')
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS, and not available on Windows
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def run_stage(name, run, trace_memory):
+    """
+    Runs one stage and collects its metrics.
+    Parameters:
+        name (str): The stage name.
+        run (callable): Runs the stage and returns (item count, per item latencies in seconds).
+        trace_memory (bool): Also record the peak Python allocation with tracemalloc (slower).
+    Returns:
+        dict: The stage metrics.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    items, latencies = run()
+    seconds = time.perf_counter() - start
+    traced_peak = None
+    if trace_memory:
+        traced_peak = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        tracemalloc.stop()
+    return {
+        'stage': name,
+        'items': items,
+        'seconds': round(seconds, 3),
+        'throughput_per_s': round(items / seconds, 2) if seconds else None,
+        'p50_s': percentile(latencies, 50),
+        'p90_s': percentile(latencies, 90),
+        'p99_s': percentile(latencies, 99),
+        'traced_peak_mb': traced_peak,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def step1_metadata(mock, work):
+    json_file = os.path.join(work['output'], f"{mock.org_name}_Repositories_Metadata.json")
+    log_file = os.path.join(work['logs'], 'metadata.log')
+    elapsed = timed(CASTHL_Automation.get_all_repo_metadata, mock.org_name, 'token', json_file, log_file, mock.base_url)
+    elapsed += timed(CASTHL_Automation.json_to_csv, json_file, work['csv'])
+    elapsed += timed(CASTHL_Automation.modify_archive_urls, work['csv'])
+    # Every repository goes into batch 1, step 2 downloads all of them
+    df = pd.read_csv(work['csv'])
+    df['batch_number'] = 1
+    df.to_csv(work['csv'], index=False)
+    return len(df), [elapsed]
+
+
+def step2_download(work, threads):
+    start_end_log = os.path.join(work['logs'], 'Timetodownload.txt')
+    status_log = os.path.join(work['logs'], 'StatusLog.txt')
+    repos = [(repo.name, repo.download_url) for repo in RepoCatalog.load_catalog(work['csv']).batch(1)]
+    download = lambda repo: timed(CASTHL_Automation.download_and_save_code, repo[0], repo[1], work['src'], 'token', start_end_log, status_log)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(download, repos))
+    return len(repos), latencies
+
+
+def step3_unzip(work):
+    time_log = os.path.join(work['logs'], 'Unzip_Time.log')
+    UnzipFile.unzip_code(work['src'], work['unzip'], os.path.join(work['logs'], 'Unzip_Execution.log'), time_log)
+    # "repo | start | end | total" lines
+    latencies = []
+    with open(time_log) as file:
+        for line in file:
+            total = line.rsplit('|', 1)[-1].strip()
+            hours, minutes, seconds = total.split(':')
+            latencies.append(int(hours) * 3600 + int(minutes) * 60 + float(seconds))
+    return len(latencies), latencies
+
+
+def step4_place(work, app_count, placement_mode='move'):
+    repos = sorted(os.listdir(work['unzip']))
+    apps = [f"App-{i % app_count:04d}" for i in range(len(repos))]
+    if placement_mode == 'link':
+        # Every repository is shared by two applications, as forks and vendored copies are
+        apps, repos = apps + [f"App-{(i + 1) % app_count:04d}" for i in range(len(repos))], repos + repos
+    mapping = pd.DataFrame({'Application': apps, 'Repository': repos})
+    mapping_file = os.path.join(work['output'], 'App-Repo-Mapping.xlsx')
+    mapping.to_excel(mapping_file, index=False)
+    logger = AppRepoMapping.setup_logger(os.path.join(work['logs'], 'migration.log'))
+    logger.handlers = [h for h in logger.handlers if isinstance(h, logging.FileHandler)]
+    summary_logger = AppRepoMapping.create_summary_logger(os.path.join(work['logs'], 'summary.log'))
+    elapsed = timed(AppRepoMapping.create_application_folders, mapping_file, work['unzip'], work['analyze'], logger, summary_logger, None, placement_mode)
+    return len(repos), [elapsed]
+
+
+def step5_scan(work, threads):
+    apps = sorted(os.listdir(work['analyze']))
+    summary_csv = os.path.join(work['logs'], 'summary.csv')
+    summary_txt = os.path.join(work['logs'], 'summary.txt')
+
+    def scan(indexed_app):
+        index, app_name = indexed_app
+        log_file = os.path.join(work['results'], app_name, 'HLAutomation.log')
+        return timed(HLScanAndOnboard.process_application, app_name, str(index), log_file, summary_txt, summary_csv,
+                     work['analyze'], STUB_HIGHLIGHT, '', '', 'http://localhost', 'token', '1', '', '', '', work['results'])
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(scan, enumerate(apps, start=1)))
+    return len(apps), latencies
+
+
+def print_table(results):
+    columns = ['stage', 'items', 'seconds', 'throughput_per_s', 'p50_s', 'p90_s', 'p99_s', 'traced_peak_mb', 'peak_rss_mb']
+    print(' | '.join(f"{column:>16}" for column in columns))
+    for result in results:
+        cells = []
+        for column in columns:
+            value = result[column]
+            cells.append(f"{value:>16.3f}" if isinstance(value, float) else f"{str(value):>16}")
+        print(' | '.join(cells))
+
+
+def main():
+    parser = ArgumentParser(description='Offline throughput benchmark of the CAST Highlight automation steps.')
+    parser.add_argument('--repos', type=int, default=50, help='Repositories in the mock organisation')
+    parser.add_argument('--apps', type=int, default=10, help='Applications the repositories are mapped to')
+    parser.add_argument('--min-kb', type=int, default=64, help='Smallest repository archive, uncompressed KB')
+    parser.add_argument('--max-kb', type=int, default=1024, help='Largest repository archive, uncompressed KB')
+    parser.add_argument('--latency', type=float, default=0.0, help='Mock GitHub latency per request, seconds')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Mock GitHub requests per minute, 0 for unlimited')
+    parser.add_argument('--bandwidth-kbps', type=int, default=0, help='Mock GitHub archive bandwidth, 0 for unlimited')
+    parser.add_argument('--placement', default='move', choices=['move', 'link'], help='Step 4 placement mode, link maps each repository to two applications')
+    parser.add_argument('--threads', type=int, default=4, help='Concurrent downloads and scans')
+    parser.add_argument('--seconds-per-mb', type=float, default=0.2, help='Stub Highlight time per MB of source')
+    parser.add_argument('--steps', default='1,2,3,4,5', help='Comma separated steps to run, later steps need earlier ones')
+    parser.add_argument('--tracemalloc', action='store_true', help='Record the peak Python allocation per stage')
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    parser.add_argument('--keep', action='store_true', help='Keep the working directory')
+    args = parser.parse_args()
+
+    os.environ['STUB_HL_SECONDS_PER_MB'] = str(args.seconds_per_mb)
+    steps = {int(step) for step in args.steps.split(',')}
+
+    root = tempfile.mkdtemp(prefix='hl_bench_')
+    work = {name: os.path.join(root, name) for name in ['src', 'unzip', 'analyze', 'logs', 'output', 'results']}
+    for path in work.values():
+        os.makedirs(path)
+    work['csv'] = os.path.join(work['output'], 'bench-org_Repositories_Summary.csv')
+
+    mock = MockGitHub('bench-org', args.repos, (args.min_kb, args.max_kb), args.latency, args.rate_limit,
+                      bandwidth_kbps=args.bandwidth_kbps)
+    mock.start()
+    # Archives are generated up front so step 2 measures the download path, not the mock
+    for repo in mock.repos:
+        mock.archive(repo, 'zipball')
+    results = []
+    try:
+        stages = [
+            (1, 'step1_metadata', lambda: step1_metadata(mock, work)),
+            (2, 'step2_download', lambda: step2_download(work, args.threads)),
+            (3, 'step3_unzip', lambda: step3_unzip(work)),
+            (4, 'step4_place', lambda: step4_place(work, args.apps, args.placement)),
+            (5, 'step5_scan', lambda: step5_scan(work, args.threads)),
+        ]
+        for step, name, run in stages:
+            if step in steps:
+                print(f"Running {name} ...")
+                results.append(run_stage(name, run, args.tracemalloc))
+    finally:
+        mock.stop()
+        if args.keep:
+            print(f"Working directory kept: {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print_table(results)
+    print(f"Mock GitHub: {mock.stats}")
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'arguments': vars(args), 'results': results, 'mock_github': mock.stats}, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
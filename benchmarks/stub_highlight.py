@@ -0,0 +1,137 @@
+"""
+Stand-in for HighlightAutomation.jar. Accepts the same --option=value arguments,
+walks --sourceDir, sleeps and burns CPU in proportion to the source size and writes
+a realistic HLAutomation.log into --workingDir. With --skipUpload the results are
+saved to the --zipResult zip instead of being uploaded. With --uploadZipFile a saved
+zip is sent to --serverUrl, benchmarks/mock_highlight.py, exit code 8 when that fails.
+
+Tuning, through environment variables:
+    STUB_HL_SECONDS_PER_MB   wall time per MB of source (default 0.5)
+    STUB_HL_CPU_FRACTION     share of that time spent burning CPU (default 0.5)
+    STUB_HL_EXIT_CODE        exit code to return, see return_code_messages (default 0)
+"""
+import os
+import sys
+import time
+import json
+import hashlib
+import logging
+import zipfile
+import urllib.error
+import urllib.request
+
+# Where mock_highlight.py receives the zips, between these two stand-ins only
+MOCK_UPLOAD_PATH = '/WS2/domains/{company_id}/applications/{app_id}/results'
+
+
+def parse_arguments(argv):
+    options = {}
+    for argument in argv:
+        if argument.startswith('--') and '=' in argument:
+            key, value = argument[2:].split('=', 1)
+            options[key] = value
+        elif argument.startswith('--'):
+            options[argument[2:]] = 'true'
+    return options
+
+
+def source_size(source_dir):
+    total_files = 0
+    total_bytes = 0
+    for root, dirs, files in os.walk(source_dir):
+        for file in files:
+            try:
+                total_bytes += os.path.getsize(os.path.join(root, file))
+                total_files += 1
+            except OSError:
+                pass
+    return total_files, total_bytes
+
+
+def save_results(zip_path, app_name, app_id, files, size):
+    # Per file metrics, about the size and redundancy of the results the real command line saves
+    results = {'application': {'name': app_name, 'id': app_id, 'files': files, 'bytes': size},
+               'files': [{'path': f"src/module{index % 10}/File{index}.java", 'technology': 'Java', 'linesOfCode': 100 + index % 900,
+                          'metrics': {'softwareHealth': 50 + index % 50, 'cloudReady': index % 7, 'openSource': index % 3}}
+                         for index in range(files)]}
+    os.makedirs(os.path.dirname(os.path.abspath(zip_path)), exist_ok=True)
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('results.json', json.dumps(results, indent=2))
+
+
+def burn_cpu(seconds):
+    deadline = time.perf_counter() + seconds
+    digest = b'highlight'
+    while time.perf_counter() < deadline:
+        for _ in range(1000):
+            digest = hashlib.sha256(digest).digest()
+
+
+def upload_zip(options):
+    zip_path = options['uploadZipFile']
+    url = options.get('serverUrl', '').rstrip('/') + MOCK_UPLOAD_PATH.format(company_id=options.get('companyId', '0'), app_id=options.get('applicationId', '0'))
+    with open(zip_path, 'rb') as file:
+        data = file.read()
+    request = urllib.request.Request(url, data=data, method='POST', headers={
+        'Content-Type': 'application/zip', 'Authorization': f"Bearer {options.get('tokenAuth', '')}"})
+    try:
+        urllib.request.urlopen(request, timeout=600).close()
+    except (urllib.error.URLError, OSError) as e:
+        print(f"Upload from zip file failed: {e}", file=sys.stderr)
+        return 8
+    return 0
+
+
+def main(argv):
+    options = parse_arguments(argv)
+    if 'uploadZipFile' in options:
+        return upload_zip(options)
+    working_dir = options.get('workingDir', '.')
+    source_dir = options.get('sourceDir', '.')
+    app_id = options.get('applicationId', '0')
+    app_name = os.path.basename(os.path.normpath(source_dir))
+    os.makedirs(working_dir, exist_ok=True)
+
+    seconds_per_mb = float(os.environ.get('STUB_HL_SECONDS_PER_MB', '0.5'))
+    cpu_fraction = float(os.environ.get('STUB_HL_CPU_FRACTION', '0.5'))
+    exit_code = int(os.environ.get('STUB_HL_EXIT_CODE', '0'))
+
+    # Same layout as the real log: "YYYY-mm-dd HH:MM:SS,fff LEVEL  logger: message"
+    log = logging.getLogger('console')
+    handler = logging.FileHandler(os.path.join(working_dir, 'HLAutomation.log'), mode='w', encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-5s %(name)s: %(message)s'))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+
+    log.info("Command Line version 0.0.0-stub")
+    log.info(f"Found application [name='{app_name}',id={app_id}]")
+    log.info("Starting technology discovery")
+    files, size = source_size(source_dir)
+    log.info(f"Technology discovery done, {files} files, {size} bytes")
+
+    busy = size / (1024 * 1024) * seconds_per_mb
+    log.info("Starting analysis")
+    burn_cpu(busy * cpu_fraction)
+    time.sleep(busy * (1 - cpu_fraction))
+    for index in range(min(files, 200)):
+        log.info(f"Analyzed file {index + 1}/{files}")
+    log.info("Analysis done")
+
+    if exit_code:
+        log.error(f"Highlight automation failed with code {exit_code}")
+        return exit_code
+
+    if 'skipUpload' in options:
+        save_results(options.get('zipResult', os.path.join(working_dir, 'results.zip')), app_name, app_id, files, size)
+        log.info(f"Results saved to {options.get('zipResult')}")
+        log.info("Highlight automation completed successfully!")
+        return 0
+
+    log.info("Starting results upload")
+    log.info("Results upload done")
+    log.info("Highlight automation completed successfully!")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
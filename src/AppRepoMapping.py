@@ -1,15 +1,17 @@
 import os
-import pandas as pd
+import math
 import shutil
 import logging
 import configparser
 import sys
+import FilePlacement
+import FailureQueue
 from datetime import datetime
 
-def setup_logger(log_file):
+def setup_logger(log_file, name='migration_logger'):
 
     # Setup logger for migration process
-    logger = logging.getLogger('migration_logger')
+    logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
 
     # Create file handler for migration log
@@ -88,17 +90,31 @@ def move_and_delete_folders(root_dir, logger):
                 logger.error(f"Failed to move directory '{source_dir}': {e}")
 
 
-def create_application_folders(mapping_sheet, repo_folder, output_folder, logger, summary_logger):
-    # Read the mapping sheet
+def is_missing(value):
+    # Empty spreadsheet cells are read as NaN
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+def read_mapping_rows(mapping_sheet):
+    # (Application, Repository) pairs of the mapping sheet
+    import pandas as pd
     mapping_df = pd.read_excel(mapping_sheet)
+    return list(zip(mapping_df['Application'], mapping_df['Repository']))
+
+def create_application_folders(mapping_sheet, repo_folder, output_folder, logger, summary_logger, mapping_rows=None, placement_mode='move', queue=None):
+    # Read the mapping sheet, unless the caller already has its rows (see RepoCatalog)
+    # Rows that could not be placed go to the failure queue as <app>;<repo>, when there is one
+    if mapping_rows is None:
+        mapping_rows = read_mapping_rows(mapping_sheet)
+
+    # In link mode a repository can be placed in several applications, identical files share their bytes
+    placement = FilePlacement.Placement() if placement_mode == 'link' else None
+    placed_repos = set()
     
     # Loop through each row in the mapping sheet
-    for index, row in mapping_df.iterrows():
-        repo_name = row['Repository']
-        app_name = row['Application']
+    for index, (app_name, repo_name) in enumerate(mapping_rows):
 
         # Check if app_name is NaN
-        if pd.isna(app_name):
+        if is_missing(app_name):
             logger.warning(f"Skipping row {index + 1}: Application Name is missing.")
             continue
 
@@ -114,20 +130,41 @@ def create_application_folders(mapping_sheet, repo_folder, output_folder, logger
             os.makedirs(app_folder_path)
             logger.info(f"Application folder '{app_name}' created.")
             
-        if os.path.exists(app_folder_path+'\\'+repo_name): 
-            dir_to_delete = app_folder_path+'\\'+repo_name
-            command = f'rmdir /s /q "{dir_to_delete}"'
-            os.system(command)
+        if os.path.exists(os.path.join(app_folder_path, repo_name)):
+            shutil.rmtree(os.path.join(app_folder_path, repo_name), ignore_errors=True)
         
         # Move entire directory from repo to application folder
         repo_folder_path = os.path.join(repo_folder, repo_name)
         
         if os.path.exists(repo_folder_path) and os.path.isdir(repo_folder_path):
-            shutil.move(repo_folder_path, app_folder_path)
-            logger.info(f"Repository '{repo_name}' moved to application folder '{app_name}' with its contents.")
+            if placement:
+                placement.place_tree(repo_folder_path, os.path.join(app_folder_path, repo_name))
+                placed_repos.add(repo_folder_path)
+                logger.info(f"Repository '{repo_name}' linked into application folder '{app_name}' with its contents.")
+            else:
+                # <org>/<repo> repositories of a multi organization run go to <app>/<org>/<repo>
+                os.makedirs(os.path.dirname(os.path.join(app_folder_path, repo_name)), exist_ok=True)
+                shutil.move(repo_folder_path, os.path.join(app_folder_path, repo_name))
+                placed_repos.add(repo_folder_path)
+                logger.info(f"Repository '{repo_name}' moved to application folder '{app_name}' with its contents.")
             summary_logger.info(f"{app_name};{repo_name};Passed")
+            if queue:
+                queue.resolve('place', f"{app_name};{repo_name}")
             # Call the function to move and delete folders in the app folder
             move_and_delete_folders(app_folder_path, logger)
+        elif repo_folder_path in placed_repos:
+            logger.warning(f"Repository '{repo_name}' was already moved to another application, set placement_mode=link to place it in '{app_name}' too.")
+            summary_logger.info(f"{app_name};{repo_name};Failed")
+            if queue:
+                queue.record('place', f"{app_name};{repo_name}", "Already moved to another application", FailureQueue.PERMANENT)
         else:
             logger.warning(f"Repository '{repo_name}' does not exist for application '{app_name}'.")
-            summary_logger.info(f"{app_name};{repo_name};Failed")
\ No newline at end of file
+            summary_logger.info(f"{app_name};{repo_name};Failed")
+            if queue:
+                queue.record('place', f"{app_name};{repo_name}", f"Repository not found in {repo_folder}", FailureQueue.PERMANENT)
+
+    if placement:
+        # As in move mode the repositories leave repo_folder, the application folders hold the only links to their files
+        for repo_folder_path in placed_repos:
+            shutil.rmtree(repo_folder_path, ignore_errors=True)
+        logger.info(placement.summary())
@@ -0,0 +1,155 @@
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    key TEXT PRIMARY KEY,
+    repo TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    format TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS archives_last_access ON archives (last_access);
+"""
+
+
+def commit_sha_url(archive_download_url):
+    # .../repos/{org}/{repo}/zipball/{ref} -> .../repos/{org}/{repo}/commits/{ref}
+    base, archive_format, ref = archive_download_url.rstrip('/').rsplit('/', 2)
+    return f"{base}/commits/{ref}"
+
+
+def pinned_archive_url(archive_download_url, sha):
+    # Same archive, for the resolved commit instead of the moving branch
+    base, ref = archive_download_url.rstrip('/').rsplit('/', 1)
+    return f"{base}/{sha}"
+
+
+def resolve_commit_sha(archive_download_url, token):
+    """
+    Resolves the branch of an archive URL to its current commit SHA, a 40 byte response.
+    Returns:
+        str: The commit SHA, or None when it cannot be resolved.
+    """
+    import requests
+    headers = {'Authorization': f'token {token}', 'Accept': 'application/vnd.github.sha'}
+    try:
+        response = requests.get(commit_sha_url(archive_download_url), headers=headers, timeout=(10, 60))
+    except requests.RequestException:
+        return None
+    sha = response.text.strip()
+    if response.status_code != 200 or len(sha) != 40:
+        return None
+    return sha
+
+
+def link_or_copy(source_path, destination_path):
+    # A hardlink costs no space or time, a copy is the fallback across volumes
+    try:
+        os.link(source_path, destination_path)
+    except OSError:
+        shutil.copyfile(source_path, destination_path)
+
+
+class ArchiveCache:
+    """
+    Content-addressed store of downloaded archives, keyed by repository, commit SHA and format.
+    Entries are evicted least recently used first once the total size exceeds budget_bytes.
+    Parameters:
+        cache_dir (str): The cache folder, holding the archives and index.db.
+        budget_bytes (int): The disk budget of the cache.
+    """
+    def __init__(self, cache_dir, budget_bytes):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0, 'hit_bytes': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(cache_dir, 'index.db'), timeout=30, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _key(self, repo, sha, archive_format):
+        return f"{repo}@{sha}.{archive_format}"
+
+    def _path(self, key, archive_format):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.{archive_format}")
+
+    def lookup(self, repo, sha, archive_format='zip'):
+        """
+        Returns the cached archive path for the repository at sha, or None on a miss.
+        """
+        key = self._key(repo, sha, archive_format)
+        with self.lock:
+            row = self.conn.execute("SELECT path, size FROM archives WHERE key = ?", (key,)).fetchone()
+            if row and os.path.exists(row[0]):
+                self.conn.execute("UPDATE archives SET last_access = ? WHERE key = ?", (time.time(), key))
+                self.conn.commit()
+                self.stats['hits'] += 1
+                self.stats['hit_bytes'] += row[1]
+                return row[0]
+            if row:
+                # Removed from disk behind our back
+                self.conn.execute("DELETE FROM archives WHERE key = ?", (key,))
+                self.conn.commit()
+            self.stats['misses'] += 1
+            return None
+
+    def store(self, repo, sha, archive_path, archive_format='zip'):
+        """
+        Adds a downloaded archive to the cache (hardlinked when possible) and evicts to the budget.
+        Returns:
+            str: The cached archive path.
+        """
+        key = self._key(repo, sha, archive_format)
+        cached_path = self._path(key, archive_format)
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        temp_path = f"{cached_path}.{threading.get_ident()}.tmp"
+        link_or_copy(archive_path, temp_path)
+        os.replace(temp_path, cached_path)
+        size = os.path.getsize(cached_path)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO archives VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (key, repo, sha, archive_format, cached_path, size, time.time()))
+            self.conn.commit()
+            self.stats['stored'] += 1
+            self._evict()
+        return cached_path
+
+    def _evict(self):
+        # Least recently used first, until the cache fits in its budget
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM archives").fetchone()[0]
+        if total <= self.budget_bytes:
+            return
+        for key, path, size in self.conn.execute("SELECT key, path, size FROM archives ORDER BY last_access").fetchall():
+            if total <= self.budget_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.conn.execute("DELETE FROM archives WHERE key = ?", (key,))
+            total -= size
+            self.stats['evicted'] += 1
+        self.conn.commit()
+
+    def usage(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM archives").fetchone()
+
+    def summary(self):
+        entries, size = self.usage()
+        lookups = self.stats['hits'] + self.stats['misses']
+        hit_rate = 100 * self.stats['hits'] / lookups if lookups else 0
+        return (f"Archive cache: {self.stats['hits']} hits ({self.stats['hit_bytes'] / (1024 * 1024):.1f} MB not downloaded), "
+                f"{self.stats['misses']} misses, {hit_rate:.0f}% hit rate, {self.stats['evicted']} evicted, "
+                f"{entries} archives using {size / (1024 * 1024):.1f} of {self.budget_bytes / (1024 * 1024):.0f} MB")
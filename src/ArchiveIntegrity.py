@@ -0,0 +1,99 @@
+import os
+import struct
+import hashlib
+
+# End of central directory record, and its zip64 locator
+EOCD_SIGNATURE = b'PK\x05\x06'
+EOCD_SIZE = 22
+ZIP64_LOCATOR_SIGNATURE = b'PK\x06\x07'
+ZIP64_LOCATOR_SIZE = 20
+ZIP64_EOCD_SIGNATURE = b'PK\x06\x06'
+# The EOCD is followed by a comment of at most 64 KB
+TAIL_SIZE = EOCD_SIZE + 0xFFFF + ZIP64_LOCATOR_SIZE + 56
+
+
+def parse_end_of_central_directory(tail, total_size):
+    """
+    Validates the end of central directory record found in the last bytes of a ZIP file.
+    Parameters:
+        tail (bytes): The last TAIL_SIZE bytes (or the whole file when smaller).
+        total_size (int): The size of the whole file.
+    Returns:
+        tuple: (entries, reason), entries is None when the archive is not valid.
+    """
+    position = tail.rfind(EOCD_SIGNATURE)
+    if position < 0 or len(tail) - position < EOCD_SIZE:
+        return None, "End of central directory record not found"
+    (disk, cd_disk, disk_entries, entries, cd_size, cd_offset, comment_length) = struct.unpack('<HHHHIIH', tail[position + 4:position + EOCD_SIZE])
+    if position + EOCD_SIZE + comment_length != len(tail):
+        return None, "Truncated end of central directory record"
+    eocd_offset = total_size - len(tail) + position
+
+    if entries == 0xFFFF or cd_offset == 0xFFFFFFFF or cd_size == 0xFFFFFFFF:
+        # Zip64 archive, the real values are in the zip64 record located just before the EOCD
+        locator = position - ZIP64_LOCATOR_SIZE
+        if locator < 0 or tail[locator:locator + 4] != ZIP64_LOCATOR_SIGNATURE:
+            return None, "Zip64 end of central directory locator not found"
+        zip64_offset = struct.unpack('<Q', tail[locator + 8:locator + 16])[0]
+        record = zip64_offset - (total_size - len(tail))
+        if record < 0 or tail[record:record + 4] != ZIP64_EOCD_SIGNATURE:
+            return None, "Zip64 end of central directory record not found"
+        entries, cd_size, cd_offset = struct.unpack('<QQQ', tail[record + 32:record + 56])
+        eocd_offset = zip64_offset
+
+    if cd_offset + cd_size != eocd_offset:
+        return None, "Central directory does not end at the end of central directory record"
+    return entries, None
+
+
+class StreamVerifier:
+    """
+    Integrity checks computed while an archive is streamed to disk: running SHA-256,
+    byte count against Content-Length and the end of central directory from the tail bytes.
+    """
+    def __init__(self, expected_length=None):
+        self.expected_length = expected_length
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.tail = b''
+
+    def update(self, chunk):
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        self.tail = (self.tail + chunk)[-TAIL_SIZE:]
+
+    def verdict(self):
+        """
+        Returns:
+            dict: status ('Valid', 'Empty' or 'Invalid'), reason, sha256, size and entries.
+        """
+        result = {'sha256': self.sha256.hexdigest(), 'size': self.size, 'entries': None, 'status': 'Invalid', 'reason': None}
+        if self.expected_length is not None and self.size != self.expected_length:
+            result['reason'] = f"Received {self.size} bytes, Content-Length was {self.expected_length}"
+            return result
+        entries, reason = parse_end_of_central_directory(self.tail, self.size)
+        result['entries'] = entries
+        if entries is None:
+            result['reason'] = reason
+        elif entries == 0:
+            result['status'] = 'Empty'
+            result['reason'] = "Repo is empty"
+        else:
+            result['status'] = 'Valid'
+        return result
+
+
+def verify_zip_tail(archive_path):
+    """
+    Checks an archive already on disk from its tail bytes only, for archives that were not streamed.
+    Returns:
+        dict: The same verdict as StreamVerifier, without sha256.
+    """
+    size = os.path.getsize(archive_path)
+    with open(archive_path, 'rb') as file:
+        file.seek(max(size - TAIL_SIZE, 0))
+        tail = file.read()
+    entries, reason = parse_end_of_central_directory(tail, size)
+    status = 'Invalid' if entries is None else ('Empty' if entries == 0 else 'Valid')
+    return {'sha256': None, 'size': size, 'entries': entries, 'status': status,
+            'reason': "Repo is empty" if status == 'Empty' else reason}
@@ -0,0 +1,169 @@
+import os
+import csv
+import glob
+from argparse import ArgumentParser
+
+# Used when neither a target size nor a target duration is configured
+DEFAULT_TARGET_MB = 1024
+# Transports whose download times measure the bandwidth
+DOWNLOAD_TRANSPORTS = ('zipball', 'tarball')
+
+
+def parse_duration(value):
+    # "H:MM:SS.ffffff" as written by str(timedelta)
+    hours, minutes, seconds = value.strip().split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def read_statuses(status_log_file):
+    # "repo | status", the last status of a repository wins
+    statuses = {}
+    if os.path.exists(status_log_file):
+        with open(status_log_file, 'r') as file:
+            for line in file:
+                parts = [part.strip() for part in line.split('|', 1)]
+                if len(parts) == 2:
+                    statuses[parts[0]] = parts[1]
+    return statuses
+
+
+def read_transports(transfer_log_file):
+    # "Repository,Transport,Bytes,Seconds", None when the batch has no transfer CSV
+    if not os.path.exists(transfer_log_file):
+        return None
+    transports = {}
+    with open(transfer_log_file, 'r', newline='') as file:
+        for row in csv.reader(file):
+            if len(row) >= 2 and row[0] != 'Repository':
+                transports[row[0]] = row[1]
+    return transports
+
+
+def load_download_history(logs_dir):
+    """
+    Reads the per repository download times from the Timetodownload_*.txt logs of option 2. Only the
+    downloads the StatusLog of the same batch reports as Successful are counted, and only those made over
+    zipball or tarball when the batch has a Transfer CSV: cache reuse, clones, empty repositories,
+    invalid archives and failures would not tell the bandwidth.
+    Parameters:
+        logs_dir (str): The logs folder.
+    Returns:
+        dict: Repository name -> seconds of its most recent download.
+    """
+    history = {}
+    if not logs_dir or not os.path.isdir(logs_dir):
+        return history
+    # Oldest log first, so later downloads overwrite earlier ones
+    for log_file in sorted(glob.glob(os.path.join(logs_dir, 'Timetodownload_*.txt')), key=os.path.getmtime):
+        # Timetodownload_<batch>_<datetime>.txt, StatusLog_<batch>_<datetime>.txt and Transfer_<batch>_<datetime>.csv
+        suffix = os.path.basename(log_file)[len('Timetodownload_'):-len('.txt')]
+        statuses = read_statuses(os.path.join(logs_dir, f"StatusLog_{suffix}.txt"))
+        transports = read_transports(os.path.join(logs_dir, f"Transfer_{suffix}.csv"))
+        with open(log_file, 'r') as file:
+            for line in file:
+                # "repo | start | end | total |"
+                parts = [part.strip() for part in line.split('|')]
+                if len(parts) < 4:
+                    continue
+                if statuses.get(parts[0]) != 'Successful':
+                    continue
+                if transports is not None and transports.get(parts[0]) not in DOWNLOAD_TRANSPORTS:
+                    continue
+                try:
+                    history[parts[0]] = parse_duration(parts[3])
+                except ValueError:
+                    continue
+    return history
+
+
+def measure_bandwidth(sizes_kb, history):
+    """
+    Measures the download bandwidth from the repositories that have a download history.
+    Returns:
+        float: KB per second, or None without usable history.
+    """
+    total_kb = sum(sizes_kb[name] for name in history if name in sizes_kb)
+    total_seconds = sum(seconds for name, seconds in history.items() if name in sizes_kb)
+    if total_kb <= 0 or total_seconds <= 0:
+        return None
+    return total_kb / total_seconds
+
+
+def pack_first_fit_decreasing(weights, capacity):
+    """
+    Bin packing, heaviest item first into the first batch with room left.
+    Parameters:
+        weights (dict): Item -> weight.
+        capacity (float): Target total weight of one batch.
+    Returns:
+        list: One list of items per batch. An item heavier than capacity gets its own batch.
+    """
+    batches = []
+    loads = []
+    for item in sorted(weights, key=weights.get, reverse=True):
+        weight = weights[item]
+        for index, load in enumerate(loads):
+            if load + weight <= capacity:
+                batches[index].append(item)
+                loads[index] += weight
+                break
+        else:
+            batches.append([item])
+            loads.append(weight)
+    return batches
+
+
+def assign_batch_numbers(csv_file_path, target_mb=None, target_minutes=None, logs_dir=None):
+    """
+    Writes a size balanced 'batch_number' column into the repositories summary CSV
+    and prints the projected duration of each batch.
+    Parameters:
+        csv_file_path (str): The <org>_Repositories_Summary.csv file.
+        target_mb (float): Target total repository size of one batch, in MB.
+        target_minutes (float): Target download time of one batch, used when the bandwidth can be measured.
+        logs_dir (str): The logs folder holding previous Timetodownload_*.txt logs.
+    Returns:
+        int: The number of batches.
+    """
+    import pandas as pd
+    df = pd.read_csv(csv_file_path)
+    sizes_kb = dict(zip(df['name'].astype(str), pd.to_numeric(df['size'], errors='coerce').fillna(0)))
+    history = load_download_history(logs_dir)
+    bandwidth = measure_bandwidth(sizes_kb, history)
+
+    if target_minutes and bandwidth:
+        # Pack on expected seconds: measured time when known, size over bandwidth otherwise
+        weights = {name: history.get(name, size_kb / bandwidth) for name, size_kb in sizes_kb.items()}
+        capacity = target_minutes * 60
+        print(f"Planning batches of {target_minutes} minutes at a measured {bandwidth / 1024:.2f} MB/s.")
+    else:
+        if target_minutes:
+            print("No download history to measure the bandwidth, planning batches by size.")
+        weights = dict(sizes_kb)
+        capacity = (target_mb or DEFAULT_TARGET_MB) * 1024
+        print(f"Planning batches of {capacity / 1024:.0f} MB.")
+
+    batches = pack_first_fit_decreasing(weights, capacity)
+    batch_of = {name: number for number, names in enumerate(batches, start=1) for name in names}
+    df['batch_number'] = df['name'].astype(str).map(batch_of)
+    df.to_csv(csv_file_path, index=False)
+
+    for number, names in enumerate(batches, start=1):
+        batch_kb = sum(sizes_kb[name] for name in names)
+        if bandwidth:
+            seconds = sum(history.get(name, sizes_kb[name] / bandwidth) for name in names)
+            projection = f"{seconds / 60:.1f} minutes"
+        else:
+            projection = "unknown duration (no download history)"
+        print(f"Batch {number}: {len(names)} repositories, {batch_kb / 1024:.1f} MB, {projection}")
+    return len(batches)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Assign size balanced batch numbers to a repositories summary CSV.")
+    parser.add_argument('csv_file', help='The <org>_Repositories_Summary.csv file')
+    parser.add_argument('--target_mb', type=float, help='Target repository size of one batch, in MB')
+    parser.add_argument('--target_minutes', type=float, help='Target download time of one batch, in minutes')
+    parser.add_argument('--logs_dir', help='Logs folder with previous Timetodownload_*.txt logs')
+    args = parser.parse_args()
+    assign_batch_numbers(args.csv_file, args.target_mb, args.target_minutes, args.logs_dir)
@@ -1,20 +1,27 @@
-import threading
-import requests
 import json
 import datetime
 import csv
-import pandas as pd
 import os
+import shutil
 from argparse import ArgumentParser
-import configparser
-import zipfile
-import UnzipFile
-import AppRepoMapping
-import HLScanAndOnboard
 import logging
-
-
-def get_all_repo_metadata(org_name, access_token, output_file_path, log_file_path):
+# Standard library only, the modules of each option (pandas, requests, ...) are imported by that option
+import RepoCatalog
+import ArchiveCache
+import ArchiveIntegrity
+import DiskBudget
+import Settings
+import Profiling
+import FailureQueue
+
+
+# GitHub REST API root, overridden by github_api_url for GitHub Enterprise or a local stand-in
+GITHUB_API_URL = "https://api.github.com"
+# Archives are streamed to disk in chunks of this size
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+def get_all_repo_metadata(org_name, access_token, output_file_path, log_file_path, api_url=GITHUB_API_URL):
+    import requests
     start_time = datetime.datetime.now()
     log_messages = []
 
@@ -30,7 +37,7 @@ def get_all_repo_metadata(org_name, access_token, output_file_path, log_file_pat
         }
         page_number = 1
         while True:
-            repo_url = f"https://api.github.com/orgs/{org_name}/repos?per_page=200&page={page_number}"
+            repo_url = f"{api_url}/orgs/{org_name}/repos?per_page=200&page={page_number}"
             response = requests.get(repo_url, headers=headers)
             response.raise_for_status()  # Raise an exception for 4xx or 5xx status codes
             # print (response.raise_for_status)
@@ -97,6 +104,7 @@ def json_to_csv(json_filename, csv_filename):
         print(f"An error occurred: {e}")
 
 def modify_archive_urls(csv_file_path):
+    import pandas as pd
     # Read the CSV file
     df = pd.read_csv(csv_file_path)
 
@@ -113,47 +121,6 @@ def modify_archive_urls(csv_file_path):
     # Write the modified DataFrame back to the original CSV file
     df.to_csv(csv_file_path, index=False)
 
-def check_column_exists(file_path, column_name):
-    try:
-        # Read the CSV file
-        df = pd.read_csv(file_path)
-        
-        # Check if the column exists
-        if column_name not in df.columns:
-            print(f"Column '{column_name}' does not exist in the CSV file.")
-            return False
-        
-        # Check if the column has data
-        if df[column_name].empty:
-            print(f"Column '{column_name}' exists but has no data.")
-            return False
-        
-        return True
-    except FileNotFoundError:
-        print(f"File '{file_path}' not found.")
-        return False
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return False
-def read_csv_data(file_path):
-    """
-    Reads data from a CSV file.
-    Parameters:
-        file_path (str): The path to the CSV file.
-    Returns:
-        list: A list containing tuples of data extracted from the CSV file.
-    """
-    data = []
-    try:
-        with open(file_path, mode='r', newline='', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            next(reader)  # Skip the header row
-            for row in reader:
-                data.append((row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8]))  # Assuming 4 columns in the CSV
-    except Exception as e:
-        print(f"Error reading CSV file: {e}")
-    return data
-
 def log_start_end_time(repository_name, start_time, end_time, total_time, log_file):
     """
     Logs start and end time of a process.
@@ -182,27 +149,87 @@ def log_processing(repository_name, status, log_file):
 
 def download_zip_archive(repository_url, repository_path, token):
     """
-    Downloads a ZIP archive from a given URL.
+    Downloads a ZIP archive from a given URL, verifying it while it streams to disk.
+    The archive is streamed to <repository_path>.part and only moved to repository_path once it is
+    Valid or Empty, a download cut short leaves nothing behind.
     Parameters:
         repository_url (str): The URL of the repository.
         repository_path (str): The path to save the ZIP archive.
         token (str): The GitHub access token.
         
     Returns:
-        bool: True if download is successful, False otherwise.
+        dict: The ArchiveIntegrity verdict if download is successful, None otherwise.
+    Raises:
+        requests.HTTPError: On a 4xx or 5xx answer, its status tells whether another attempt can succeed.
     """
     #print(f"Inside **download_zip_archive**'.")
+    import requests
     headers = {'Authorization': f'token {token}'}
-    response = requests.get(repository_url, headers=headers)
-    
-    if response.status_code == 200:
-        with open(repository_path, 'wb') as f:
-            f.write(response.content)
-        return True
-    else:
+    partial_path = repository_path + '.part'
+    try:
+        with requests.get(repository_url, headers=headers, stream=True, timeout=(10, 300)) as response:
+            if response.status_code != 200:
+                response.raise_for_status()
+                return None
+            # Content-Length is the encoded size when the body is compressed in transit
+            content_length = response.headers.get('Content-Length')
+            expected_length = int(content_length) if content_length and not response.headers.get('Content-Encoding') else None
+            verifier = ArchiveIntegrity.StreamVerifier(expected_length)
+            with open(partial_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    verifier.update(chunk)
+                    f.write(chunk)
+        verdict = verifier.verdict()
+        if verdict['status'] in ('Valid', 'Empty'):
+            os.replace(partial_path, repository_path)
+        return verdict
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+def log_transfer(repository_name, transport, transferred_bytes, seconds, log_file):
+    """
+    Logs the bytes transferred and time taken to fetch a repository, for comparing transports.
+    Parameters:
+        repository_name (str): The name of the repository.
+        transport (str): zipball or git.
+        transferred_bytes (int): The bytes transferred.
+        seconds (float): The time taken.
+        log_file (str): The path to the transfer CSV file.
+    """
+    with open(log_file, "a") as f:
+        f.write(f"{repository_name},{transport},{transferred_bytes},{seconds:.3f}\n")
+
+def summarize_transfers(log_file):
+    # Total bytes, time and throughput per transport in a transfer CSV file
+    totals = {}
+    with open(log_file, "r") as f:
+        next(f, None)
+        for line in f:
+            parts = line.strip().split(',')
+            if len(parts) != 4:
+                continue
+            count, transferred_bytes, seconds = totals.get(parts[1], (0, 0, 0.0))
+            totals[parts[1]] = (count + 1, transferred_bytes + int(parts[2]), seconds + float(parts[3]))
+    for transport, (count, transferred_bytes, seconds) in totals.items():
+        rate = transferred_bytes / (1024 * 1024) / seconds if seconds else 0
+        print(f"{transport}: {count} repositories, {transferred_bytes / (1024 * 1024):.1f} MB in {seconds:.1f} s ({rate:.2f} MB/s per repository stream)")
+
+def archive_up_to_date(catalog_db, repository_name, repository_zip_path, sha):
+    """
+    Tells whether the archive already downloaded can be kept: the catalog holds a Valid verdict for
+    its current size and mtime, taken at the commit the branch resolves to now.
+    Returns:
+        bool: False when any of it cannot be confirmed.
+    """
+    if not sha or not catalog_db or not os.path.exists(repository_zip_path):
         return False
+    previous = RepoCatalog.load_archive_verdicts(catalog_db).get(repository_name)
+    stat = os.stat(repository_zip_path)
+    return (previous is not None and previous['status'] == 'Valid' and previous['commit_sha'] == sha
+            and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns)
 
-def download_and_save_code(application_name, repository_url, server_location, token, start_end_log_file, processing_log_file):
+def download_and_save_code(application_name, repository_url, server_location, token, start_end_log_file, processing_log_file, transfer_log_file=None, cache=None, catalog_db=None):
     """
     Downloads and saves code from a repository.
     Parameters:
@@ -212,70 +239,356 @@ def download_and_save_code(application_name, repository_url, server_location, to
         token (str): The GitHub access token.
         start_end_log_file (str): The path to the log file for start and end times.
         processing_log_file (str): The path to the log file for processing status.
+        transfer_log_file (str): The path to the transfer CSV file, or None.
+        cache (ArchiveCache): Archive cache reused across batches and re-runs, or None.
+        catalog_db (str): The repository catalog database the integrity verdict is stored in, or None.
+    Returns:
+        tuple: (reason, FailureQueue kind) when the download failed, None otherwise.
     """
     #print(f"Inside **Download-And-Save**'.")
     application_name_directory = os.path.join(server_location, application_name)
         # Check if the 'Output' folder exists, if not, create it
     if not os.path.exists(application_name_directory):
         os.makedirs(application_name_directory)
-    else:
-        dir_to_delete = application_name_directory
-        command = f'rmdir /s /q "{dir_to_delete}"'
-        os.system(command)
-        os.makedirs(application_name_directory)
     
-    repository_zip_path = os.path.join(application_name_directory, application_name + '.zip')
+    # <org>/<repo> names of a multi organization run give src_dir/<org>/<repo>/<repo>.zip
+    repository_zip_path = os.path.join(application_name_directory, os.path.basename(application_name) + '.zip')
     #print(f"repository_zip_path '{repository_zip_path}'.")
-    if os.path.exists(repository_zip_path):
+    # Resolve the branch to a commit, an archive of that commit may already be there or be cached
+    sha = ArchiveCache.resolve_commit_sha(repository_url, token)
+    if archive_up_to_date(catalog_db, application_name, repository_zip_path, sha):
         log_processing(application_name, "Skipped: ZIP file already exists", processing_log_file)
         print(f"Skipping repository '{application_name}'. ZIP file already exists.\n")
         
     else:
+        # Not verified at the current commit (a partial download, a moved branch, no catalog): downloaded again
+        shutil.rmtree(application_name_directory, ignore_errors=True)
+        os.makedirs(application_name_directory, exist_ok=True)
         start_time = datetime.datetime.now()
         try:
-            if download_zip_archive(repository_url, repository_zip_path, token):
-                with zipfile.ZipFile(repository_zip_path, 'r') as zip_ref:
-                    file_list = zip_ref.namelist()
-                    if not file_list:
-                        log_processing(application_name, "Repo is empty", processing_log_file)
-                        print(f"Repository '{application_name}' is empty.\n")
+            cached_path = cache.lookup(application_name, sha) if cache and sha else None
+            if cached_path:
+                ArchiveCache.link_or_copy(cached_path, repository_zip_path)
+                if catalog_db:
+                    # Only verified archives are cached, the verdict of that commit still holds
+                    previous = RepoCatalog.load_archive_verdicts(catalog_db).get(application_name)
+                    if previous and previous['commit_sha'] == sha and previous['status'] == 'Valid':
+                        verdict = {'sha256': previous['sha256'], 'size': previous['size'], 'entries': previous['entries'], 'status': 'Valid', 'reason': None}
                     else:
-                        end_time = datetime.datetime.now()
-                        total_time = end_time - start_time
-                        log_start_end_time(application_name, start_time, end_time, total_time, start_end_log_file)
-                        log_processing(application_name, "Successful", processing_log_file)
-                        print(f"Repository '{application_name}' downloaded successfully as ZIP file to '{repository_zip_path}'.\n")
+                        verdict = ArchiveIntegrity.verify_zip_tail(repository_zip_path)
+                    RepoCatalog.record_archive_verdict(catalog_db, application_name, repository_zip_path, verdict, sha)
+                end_time = datetime.datetime.now()
+                total_time = end_time - start_time
+                log_start_end_time(application_name, start_time, end_time, total_time, start_end_log_file)
+                log_processing(application_name, "Successful: reused cached archive", processing_log_file)
+                if transfer_log_file:
+                    log_transfer(application_name, 'cache', 0, total_time.total_seconds(), transfer_log_file)
+                print(f"Repository '{application_name}' reused from archive cache at commit {sha[:7]}.\n")
+                return
+            if sha:
+                repository_url = ArchiveCache.pinned_archive_url(repository_url, sha)
+
+            verdict = download_zip_archive(repository_url, repository_zip_path, token)
+            if verdict:
+                if catalog_db:
+                    RepoCatalog.record_archive_verdict(catalog_db, application_name, repository_zip_path, verdict, sha)
+                end_time = datetime.datetime.now()
+                total_time = end_time - start_time
+                if verdict['status'] == 'Empty':
+                    log_processing(application_name, "Repo is empty", processing_log_file)
+                    print(f"Repository '{application_name}' is empty.\n")
+                elif verdict['status'] == 'Invalid':
+                    # A truncated or corrupt archive is not kept, option 3 would fail on it
+                    log_start_end_time(application_name, start_time, end_time, total_time, start_end_log_file)
+                    log_processing(application_name, f"Failed: {verdict['reason']}", processing_log_file)
+                    print(f"Downloaded archive of repository '{application_name}' is not valid: {verdict['reason']}\n")
+                    # Usually a connection cut short, downloading again helps
+                    return (f"Invalid archive: {verdict['reason']}", FailureQueue.TRANSIENT)
+                else:
+                    log_start_end_time(application_name, start_time, end_time, total_time, start_end_log_file)
+                    log_processing(application_name, "Successful", processing_log_file)
+                    if transfer_log_file:
+                        log_transfer(application_name, 'zipball', verdict['size'], total_time.total_seconds(), transfer_log_file)
+                    if cache and sha:
+                        cache.store(application_name, sha, repository_zip_path)
+                    print(f"Repository '{application_name}' downloaded successfully as ZIP file to '{repository_zip_path}'.\n")
             else:
                 end_time = datetime.datetime.now()
                 total_time = end_time - start_time
                 log_start_end_time(application_name, start_time, end_time, total_time, start_end_log_file)
                 log_processing(application_name, "Failed", processing_log_file)
                 print(f"Failed to download repository '{application_name}'.\n")
+                return ("Download failed", FailureQueue.PERMANENT)
         except Exception as e:
             end_time = datetime.datetime.now()
             total_time = end_time - start_time
             log_start_end_time(application_name, start_time, end_time, total_time, start_end_log_file)
             log_processing(application_name, f"Failed: {e}", processing_log_file)
             print(f"Error downloading repository: {e}")
+            return (str(e), FailureQueue.classify_exception(e))
 
-def main():
+def download_repositories(settings, catalog_db, repositories, batch, current_datetime, queue=None):
+    """
+    Option 2 on a list of repositories, with the transport of the settings.
+    Parameters:
+        settings (Settings): The settings of the run.
+        catalog_db (str): The repository catalog database.
+        repositories (list): RepoRecord objects of the catalog.
+        batch (str): The batch number, or another label, used in the log file names.
+        current_datetime (str): The timestamp of the log file names.
+        queue (FailureQueue): Retries transient failures and keeps the ones left, or None.
+    """
+    import CloneRepo
+    transport = settings.transport
+    src_dir = settings.src_dir
+    unzip_dir = settings.unzip_dir
+    logs_dir = settings.logs_dir
+    clone_workers = settings.clone_workers or CloneRepo.DEFAULT_CLONE_WORKERS
+    disk_reserve_mb = settings.disk_reserve_mb or DiskBudget.DEFAULT_RESERVE_MB
+    compression_ratio = settings.compression_ratio or DiskBudget.DEFAULT_COMPRESSION_RATIO
+
+    #log_folder = os.path.join(os.path.dirname(__file__), '..', 'Logs')
+    start_end_log_file = os.path.join(logs_dir, f"Timetodownload_{batch}_{current_datetime}.txt")
+    processing_log_file = os.path.join(logs_dir, f"StatusLog_{batch}_{current_datetime}.txt")
+
+    # Check if the start_end_log_file exists, if not, create it
+    if not os.path.exists(start_end_log_file):
+        with open(start_end_log_file, "w") as start_end_log:
+            start_end_log.write("Start Time\tEnd Time\tTotal Time Taken\n")
     
-    current_datetime = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    # Check if the processing_log_file exists, if not, create it
+    if not os.path.exists(processing_log_file):
+        with open(processing_log_file, "w") as processing_log:
+            processing_log.write("Timestamp\tMessage\n")
+
+    # Clear log files if they already exist
+    open(start_end_log_file, 'w').close()
+    open(processing_log_file, 'w').close()
+    transfer_log_file = os.path.join(logs_dir, f"Transfer_{batch}_{current_datetime}.csv")
+    with open(transfer_log_file, "w") as transfer_log:
+        transfer_log.write("Repository,Transport,Bytes,Seconds\n")
+
+    if transport in ('git', 'tarball'):
+        # Both go straight to unzip_dir, option 3 is not needed for this batch: shallow clones, or
+        # tarballs extracted while they download. Organizations with their own token are fetched
+        # with it, <org>/<repo> into unzip_dir/<org>/<repo>
+        repositories_by_token = {}
+        for repository in repositories:
+            repositories_by_token.setdefault(settings.token_for(repository.name), []).append(repository)
+        fetched, failed = 0, 0
+        if transport == 'git':
+            for repository_token, token_repositories in repositories_by_token.items():
+                group_fetched, group_failed = CloneRepo.clone_repositories(token_repositories, unzip_dir, repository_token, start_end_log_file, processing_log_file, transfer_log_file, clone_workers, queue)
+                fetched, failed = fetched + group_fetched, failed + group_failed
+            print(f"{fetched} repositories cloned or updated in {unzip_dir}, {failed} failed. Continue with option 4.")
+        else:
+            import TarballStream
+            ratio = float(RepoCatalog.get_meta(catalog_db, 'compression_ratio', compression_ratio))
+            admission = DiskBudget.AdmissionController(disk_reserve_mb * 1024 * 1024, ratio)
+            for repository_token, token_repositories in repositories_by_token.items():
+                group_fetched, group_failed = TarballStream.extract_repositories(token_repositories, unzip_dir, repository_token, settings, start_end_log_file, processing_log_file, transfer_log_file, clone_workers, admission, queue)
+                fetched, failed = fetched + group_fetched, failed + group_failed
+            print(admission.summary())
+            if admission.observed[0]:
+                # Tarball and ZIP compression are close enough for option 2 to estimate zipball batches
+                RepoCatalog.set_meta(catalog_db, 'compression_ratio', f"{admission.compression_ratio:.3f}")
+            print(f"{fetched} repositories extracted in {unzip_dir}, {failed} failed. Continue with option 4.")
+    else:
+        cache = ArchiveCache.ArchiveCache(settings.archive_cache_dir, settings.archive_cache_budget_mb * 1024 * 1024) if settings.archive_cache_dir else None
+        # The ratio observed by option 3 on earlier batches is a better estimate than the configured one
+        ratio = float(RepoCatalog.get_meta(catalog_db, 'compression_ratio', compression_ratio))
+        admission = DiskBudget.AdmissionController(disk_reserve_mb * 1024 * 1024, ratio)
+        try:
+            for repository in repositories:
+                # GitHub sizes are in KB. The extraction stays reserved for the rest of the batch,
+                # so the archives downloaded here can all be extracted by option 3
+                archive_bytes = repository.size * 1024
+                download_need = (src_dir, archive_bytes)
+                extract_need = (unzip_dir, admission.estimate_extracted(archive_bytes))
+                if not admission.admit([download_need, extract_need]):
+                    message = admission.shortfall_message([download_need, extract_need])
+                    log_processing(repository.name, f"Skipped: not enough disk space, {message}", processing_log_file)
+                    print(f"Skipping repository '{repository.name}', not enough disk space: {message}\n")
+                    if queue:
+                        # Waiting a few seconds does not free disk space, it is left to retry-failed
+                        queue.record('download', repository.name, f"Not enough disk space, {message}", FailureQueue.TRANSIENT)
+                    continue
+                download = lambda: download_and_save_code(repository.name, repository.download_url, src_dir, settings.token_for(repository.name), start_end_log_file, processing_log_file, transfer_log_file, cache, catalog_db)
+                try:
+                    if queue:
+                        queue.attempt('download', repository.name, download)
+                    else:
+                        download()
+                finally:
+                    admission.release([download_need])
+        finally:
+            print(admission.summary())
+            if cache:
+                print(cache.summary())
+                cache.close()
+    summarize_transfers(transfer_log_file)
+    if queue:
+        queue.write_dead_letter_report('download', logs_dir, current_datetime)
+
+def unzip_archives(settings, current_datetime, queue=None, repo_names=None):
+    """
+    Option 3, extracts the downloaded archives of src_dir to unzip_dir.
+    Parameters:
+        settings (Settings): The settings of the run.
+        current_datetime (str): The timestamp of the log file names.
+        queue (FailureQueue): Retries transient failures and keeps the ones left, or None.
+        repo_names (set): Only the archives of these repositories, None for all of them.
+    """
+    import UnzipFile
+    src_dir = settings.src_dir
+    unzip_dir = settings.unzip_dir
+    logs_dir = settings.logs_dir
+    disk_reserve_mb = settings.disk_reserve_mb or DiskBudget.DEFAULT_RESERVE_MB
+    compression_ratio = settings.compression_ratio or DiskBudget.DEFAULT_COMPRESSION_RATIO
+
+    #Unzip_File.unzip_code(src_dir, unzip_dir, os.path.join(logs_dir, f"Unzip_Execution{current_datetime}.log"), os.path.join(logs_dir, f"Unzip_Time{current_datetime}.log"))
+    # Archives verified while downloading in option 2 are not checked again
+    catalog_db = RepoCatalog.org_catalog_path(settings.output_dir, settings.summary_name())
+    verdicts = RepoCatalog.load_archive_verdicts(catalog_db)
+    admission = DiskBudget.AdmissionController(disk_reserve_mb * 1024 * 1024, compression_ratio)
+    # Archives of several organizations are in src_dir/<org>, extracted to unzip_dir/<org>
+    layouts = [(src_dir, unzip_dir, verdicts, '')]
+    if settings.is_multi_org():
+        layouts = [(os.path.join(src_dir, org), os.path.join(unzip_dir, org),
+                    {name.split('/', 1)[1]: verdict for name, verdict in verdicts.items() if name.startswith(org + '/')}, org + '/')
+                   for org in settings.github_orgs if os.path.isdir(os.path.join(src_dir, org))]
+    for archives_dir, extract_dir, layout_verdicts, name_prefix in layouts:
+        try:
+            UnzipFile.unzip_code(archives_dir, extract_dir, os.path.join(logs_dir, f"Unzip_Execution_{current_datetime}.log"), os.path.join(logs_dir, f"Unzip_Time_{current_datetime}.log"), layout_verdicts, admission, queue, repo_names, name_prefix)
+        except Exception as e:
+            print(f"Error occurred during extraction: {e}")
+    print(admission.summary())
+    if admission.observed[0] and os.path.exists(catalog_db):
+        # Used by option 2 to estimate the extracted size of the next batches
+        RepoCatalog.set_meta(catalog_db, 'compression_ratio', f"{admission.compression_ratio:.3f}")
+    if queue:
+        queue.write_dead_letter_report('unzip', logs_dir, current_datetime)
+
+def place_repositories(settings, current_datetime, queue=None, repo_names=None, app_repos=None):
+    """
+    Option 4, places the repositories of unzip_dir in their application folders of src_dir_analyze.
+    Parameters:
+        settings (Settings): The settings of the run.
+        current_datetime (str): The timestamp of the log file names.
+        queue (FailureQueue): Keeps the repositories that could not be placed, or None.
+        repo_names (set): With app_repos, only the mapping rows of these repositories, None for all rows.
+        app_repos (set): With repo_names, only these (application, repository) rows.
+    Returns:
+        list: The (application, repository) rows placed or attempted.
+    """
+    import AppRepoMapping
+    logs_dir = settings.logs_dir
+    App_Repo_Mapping = settings.app_repo_mapping
+    log_file=os.path.join(logs_dir, f"migration_log_{current_datetime}.log")
+    logger = AppRepoMapping.setup_logger(log_file)
+    summary_log_file = os.path.join(logs_dir, f"summary_log_{current_datetime}.txt")
+    summary_logger = AppRepoMapping.create_summary_logger(summary_log_file)
+    # The mapping is read from the catalog, the spreadsheet is only parsed again when it changes
+    mapping_rows = None
+    output_csv_file_path = os.path.join(settings.output_dir, f"{settings.summary_name()}_Repositories_Summary.csv")
+    if os.path.exists(output_csv_file_path):
+        catalog = RepoCatalog.load_catalog(output_csv_file_path, App_Repo_Mapping)
+        mapping_rows = [(app, repo) for app, repo, domain in catalog.app_repos]
+        if settings.is_multi_org():
+            import GitHubHarvest
+            # The mapping may name repositories without their organization when the name is unique
+            mapping_rows, ambiguous = GitHubHarvest.qualify_repository_names(mapping_rows, [record.name for record in catalog.records])
+            for repo_name in ambiguous:
+                logger.warning(f"Repository '{repo_name}' exists in several organizations, name it <org>/{repo_name} in the mapping sheet.")
+    if repo_names is not None or app_repos is not None:
+        if mapping_rows is None:
+            mapping_rows = AppRepoMapping.read_mapping_rows(App_Repo_Mapping)
+        mapping_rows = [(app, repo) for app, repo in mapping_rows
+                        if repo in (repo_names or ()) or (str(app), str(repo)) in (app_repos or ())]
+    AppRepoMapping.create_application_folders(App_Repo_Mapping, settings.unzip_dir, settings.src_dir_analyze, logger, summary_logger, mapping_rows, settings.placement_mode, queue)
+    if queue:
+        queue.write_dead_letter_report('place', logs_dir, current_datetime)
+    return mapping_rows if mapping_rows is not None else AppRepoMapping.read_mapping_rows(App_Repo_Mapping)
+
+def retry_failed(settings, current_datetime):
+    """
+    Runs the items of the failure queue again, each from the stage it failed at through the stages
+    after it: a repository that could not be downloaded is downloaded, extracted, placed in its
+    applications and those are scanned, results that could not be uploaded are uploaded. Nothing
+    else is run.
+    """
+    queue = FailureQueue.open_queue(settings)
+    failures = queue.pending() if queue else []
+    if not failures:
+        print("No failure is queued.")
+        return
+    items = {stage: [failure['item'] for failure in failures if failure['stage'] == stage] for stage in FailureQueue.STAGES}
+    print("Retrying " + ", ".join(f"{len(items[stage])} {stage}" for stage in FailureQueue.STAGES) + " failures.")
+
+    output_csv_file_path = os.path.join(settings.output_dir, f"{settings.summary_name()}_Repositories_Summary.csv")
+    catalog = RepoCatalog.load_catalog(output_csv_file_path) if os.path.exists(output_csv_file_path) else None
+    repo_names = set()
+    if items['download']:
+        repositories = [catalog.get(name) for name in items['download'] if catalog and catalog.get(name)]
+        download_repositories(settings, catalog.db_path if catalog else queue.db_path, repositories, 'retry', current_datetime, queue)
+        repo_names = set(items['download']) - {failure['item'] for failure in queue.pending('download')}
+    # git and tarball already extracted what they fetched
+    if settings.transport == 'zipball' and repo_names or items['unzip']:
+        unzip_targets = (repo_names if settings.transport == 'zipball' else set()) | set(items['unzip'])
+        unzip_archives(settings, current_datetime, queue, unzip_targets)
+        repo_names |= set(items['unzip'])
+        repo_names -= {failure['item'] for failure in queue.pending('unzip')}
+    apps = {item.split(';', 1)[0] for item in items['scan']}
+    app_repos = {tuple(item.split(';', 1)) for item in items['place']}
+    if (repo_names or app_repos) and settings.app_repo_mapping and os.path.exists(settings.app_repo_mapping):
+        placed = place_repositories(settings, current_datetime, queue, repo_names, app_repos)
+        still_failed = {failure['item'] for failure in queue.pending('place')}
+        apps |= {str(app) for app, repo in placed if f"{app};{repo}" not in still_failed}
+    if apps and settings.highlight_application_mapping:
+        import HLScanAndOnboard
+        HLScanAndOnboard.main(settings, only_apps=apps)
+    if items['upload']:
+        import ResultUpload
+        # The scans saved their results, only the upload is run again
+        ResultUpload.upload_applications(settings, [item.split(';', 1) for item in items['upload']], current_datetime=current_datetime)
+    left = queue.pending()
+    print(f"{len(failures) - len(left)} failures resolved, {len(left)} still queued.")
+
+def parse_arguments():
+    # Scripted runs pass the option (and batch) on the command line instead of answering the prompts
+    parser = ArgumentParser(description="CAST Highlight automation for GitHub organizations.")
+    parser.add_argument('-option', '--option', choices=['0', '1', '2', '3', '4', '5'], help='Option to run, prompted for when omitted')
+    parser.add_argument('-batch', '--batch', help='Batch number for option 2, prompted for when omitted')
+    parser.add_argument('-profile', '--profile', action='store_true', help='Write cProfile and tracemalloc output of the run next to the logs')
+    parser.add_argument('-retry-failed', '--retry-failed', action='store_true', help='Run the failed items of the failure queue again through the stages left, instead of an option')
+    return parser.parse_args()
 
-    # Read configuration from config.properties file
-    config = configparser.ConfigParser()
-    config_file_path = os.path.join(os.path.dirname(__file__), '..', 'Config', 'config.properties')
-    config.read(config_file_path)
+def main():
+    args = parse_arguments()
+
+    # config.properties parsed once, CASTHL_CONFIG names another file (e.g. one per host)
+    settings = Settings.load_settings()
+    if args.profile:
+        with Profiling.profiling(settings.logs_dir, 'CASTHL_Automation'):
+            run_option(args, settings)
+    else:
+        run_option(args, settings)
+
+def run_option(args, settings):
+    current_datetime = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
 
     # Get values from the config file
-    org_name = config.get('GitHub', 'github_org_name')
-    token = config.get('GitHub', 'github_token')
-    src_dir = config.get('Directories', 'src_dir')
-    unzip_dir = config.get('Directories', 'unzip_dir')
-    logs_dir = config.get('Directories', 'logs_dir')
-    output_dir = config.get('Directories', 'output_dir')
-    App_Repo_Mapping = config.get('Input-File', 'App_Repo_Mapping')
-    src_dir_analyze = config.get('Directories', 'src_dir_analyze')
+    # Several organizations (github_orgs) share one summary CSV and catalog, named after the first
+    # organization otherwise
+    org_name = settings.summary_name()
+    token = settings.github_token
+    github_api_url = (settings.github_api_url or GITHUB_API_URL).rstrip('/')
+    src_dir = settings.src_dir
+    unzip_dir = settings.unzip_dir
+    logs_dir = settings.logs_dir
+    output_dir = settings.output_dir
+    App_Repo_Mapping = settings.app_repo_mapping
+    src_dir_analyze = settings.src_dir_analyze
     
     # Check if the 'Source Dir' folder exists, if not, create it
     if not os.path.exists(src_dir):
@@ -297,7 +610,11 @@ def main():
     if not os.path.exists(src_dir_analyze):
         os.makedirs(src_dir_analyze)
 
-    while True:
+    if args.retry_failed:
+        retry_failed(settings, current_datetime)
+        return
+
+    while args.option is None:
         print("Select options:")
         print("0. Create Highlight Domain and Application")
         print("1. Download Metadata for GitHub organization")
@@ -310,10 +627,55 @@ def main():
             print("Invalid choice. Please enter 0, 1, 2, 3, 4 or 5.")
             continue
         else:
-            break
-
-    output_type = int(choice)
-    if output_type == 1:
+            args.option = choice
+
+    output_type = int(args.option)
+    if output_type == 0:
+        import requests
+        import AppRepoMapping
+        import HLProvisioning
+        base_url = settings.highlight_base_url
+        highlight_token = settings.highlight_token
+        company_id = settings.highlight_company_id
+        applications_file = settings.highlight_application_mapping
+        workers = settings.provision_workers or HLProvisioning.DEFAULT_PROVISION_WORKERS
+        if not os.path.exists(App_Repo_Mapping):
+            print("Application to repository mapping information is missing, please refer README.md to create mapping spreadhseet.")
+            return
+        log_file = os.path.join(logs_dir, f"provisioning_log_{current_datetime}.log")
+        logger = AppRepoMapping.setup_logger(log_file, 'provisioning_logger')
+        try:
+            created, failed = HLProvisioning.provision_applications(App_Repo_Mapping, base_url, highlight_token, company_id, applications_file, workers, logger)
+            if failed:
+                print(f"{len(failed)} applications could not be provisioned, refer log file {log_file}.")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Highlight API error: {e}")
+
+    elif output_type == 1 and settings.is_multi_org():
+        import GitHubHarvest
+        harvest_workers = settings.harvest_workers or GitHubHarvest.DEFAULT_HARVEST_WORKERS
+        print(f"Harvesting {len(settings.github_orgs)} organizations, {harvest_workers} at a time.")
+        stats = GitHubHarvest.harvest_organizations(settings.organizations(), github_api_url, output_dir, harvest_workers, settings.github_requests_per_hour)
+        # Every organization keeps its own summary CSV, the unified one is what options 2 to 5 use
+        org_summaries = []
+        for org_stats in stats:
+            if 'json_file' not in org_stats or not org_stats['repos']:
+                continue
+            org_csv_file_path = os.path.join(output_dir, f"{org_stats['org']}_Repositories_Summary.csv")
+            json_to_csv(org_stats['json_file'], org_csv_file_path)
+            modify_archive_urls(org_csv_file_path)
+            org_summaries.append((org_stats['org'], org_csv_file_path))
+        output_csv_file_path = os.path.join(output_dir, f"{org_name}_Repositories_Summary.csv")
+        repo_count = GitHubHarvest.write_unified_summary(org_summaries, output_csv_file_path)
+        stats_file = os.path.join(logs_dir, f"Harvest_{current_datetime}.csv")
+        GitHubHarvest.write_stats(stats, stats_file)
+        failed = [org_stats['org'] for org_stats in stats if org_stats['status'] != 'Successful']
+        if failed:
+            print(f"Metadata of {len(failed)} organizations could not be downloaded: {', '.join(failed)}. Check github_orgs and github_org_tokens in config.properties.")
+        print(f"Refer {stats_file} for the throughput of each organization.")
+        print(f"CSV file generated {output_csv_file_path} with summary of {repo_count} repositories of {len(org_summaries)} organizations which can be used for downloading source code(Task-2).")
+
+    elif output_type == 1:
           
         # Save repository metadata to JSON file
         output_file_path = os.path.join(output_dir, f"{org_name}_Repositories_Metadata.json")
@@ -324,77 +686,51 @@ def main():
         # Save repository metadata to CSV file
         output_csv_file_path = os.path.join(output_dir, f"{org_name}_Repositories_Summary.csv")
         
-        get_all_repo_metadata(org_name, token, output_file_path, log_file_path)
+        get_all_repo_metadata(org_name, token, output_file_path, log_file_path, github_api_url)
         json_to_csv(output_file_path, output_csv_file_path)
         modify_archive_urls(output_csv_file_path)
         print(f"Refer Log file {log_file_path} for downloag log and time to downloaded Metadata.")
         print(f"CSV file generated {output_csv_file_path} with summary of repositories which can be used for downloading source code(Task-2).")
     elif output_type == 2:
+        import BatchPlanner
         output_csv_file_path = os.path.join(output_dir, f"{org_name}_Repositories_Summary.csv")
         if not os.path.exists(output_csv_file_path):
             print("Please run option 1 to download metadata first.")
             return
-        if not check_column_exists(output_csv_file_path, 'batch_number'):
-            print(f"Column 'batch_number' does not exist in file {output_csv_file_path}. Create new column with name 'batch_number' and enter number of batch you want to run for download.")
-            return
-        if not check_column_exists(output_csv_file_path, 'repo_archive_download_api'):
+        # Parsed once into the catalog, every check and the batch lookup below query it
+        catalog = RepoCatalog.load_catalog(output_csv_file_path)
+        if not catalog.has_column('batch_number'):
+            # Batches are planned on the repository sizes, and on past download times when there are any
+            print(f"Column 'batch_number' does not exist in file {output_csv_file_path}. Assigning size balanced batches.")
+            target_mb = settings.batch_target_mb
+            target_minutes = settings.batch_target_minutes
+            BatchPlanner.assign_batch_numbers(output_csv_file_path, target_mb, target_minutes, logs_dir)
+            catalog = RepoCatalog.load_catalog(output_csv_file_path)
+        if not catalog.has_column('repo_archive_download_api'):
             print(f"Column 'repo_archive_download_api' does not exist in file {output_csv_file_path}. Review CSV file and rerun option 1.")
             return
-        if not check_column_exists(output_csv_file_path, 'name'):
+        if not catalog.has_column('name'):
             print(f"Column 'name' does not exist in file {output_csv_file_path}. Review CSV file and rerun option 1.")
             return
         
         #src_dir = input("Directory location to download the source code: ")
-        batch = input("Enter batch number to download the source code: ")
-       
-        #log_folder = os.path.join(os.path.dirname(__file__), '..', 'Logs')
-        start_end_log_file = os.path.join(logs_dir, f"Timetodownload_{batch}_{current_datetime}.txt")
-        processing_log_file = os.path.join(logs_dir, f"StatusLog_{batch}_{current_datetime}.txt")
-
-        # Check if the start_end_log_file exists, if not, create it
-        if not os.path.exists(start_end_log_file):
-            with open(start_end_log_file, "w") as start_end_log:
-                start_end_log.write("Start Time\tEnd Time\tTotal Time Taken\n")
-        
-        # Check if the processing_log_file exists, if not, create it
-        if not os.path.exists(processing_log_file):
-            with open(processing_log_file, "w") as processing_log:
-                processing_log.write("Timestamp\tMessage\n")
-
-        # Clear log files if they already exist
-        open(start_end_log_file, 'w').close()
-        open(processing_log_file, 'w').close()
-        # Save repository metadata to CSV file
-        output_csv_file_path = os.path.join(output_dir, f"{org_name}_Repositories_Summary.csv")
-        data = read_csv_data(output_csv_file_path)  
-        for repository in data:
-            
-            # Check for equality
-            if repository[8] == str(batch):
-                download_and_save_code(repository[1], repository[7], src_dir, token, start_end_log_file, processing_log_file)
+        batch = args.batch or input("Enter batch number to download the source code: ")
+        download_repositories(settings, catalog.db_path, catalog.batch(batch), batch, current_datetime, FailureQueue.open_queue(settings))
 
     elif output_type == 3:
-
-        #Unzip_File.unzip_code(src_dir, unzip_dir, os.path.join(logs_dir, f"Unzip_Execution{current_datetime}.log"), os.path.join(logs_dir, f"Unzip_Time{current_datetime}.log"))
-        try:
-            UnzipFile.unzip_code(src_dir, unzip_dir, os.path.join(logs_dir, f"Unzip_Execution_{current_datetime}.log"), os.path.join(logs_dir, f"Unzip_Time_{current_datetime}.log"))
-        except Exception as e:
-            print(f"Error occurred during extraction: {e}")
+        unzip_archives(settings, current_datetime, FailureQueue.open_queue(settings))
 
     elif output_type == 4:
-        log_file=os.path.join(logs_dir, f"migration_log_{current_datetime}.log")
-        logger = AppRepoMapping.setup_logger(log_file)
-        summary_log_file = os.path.join(logs_dir, f"summary_log_{current_datetime}.txt")
-        summary_logger = AppRepoMapping.create_summary_logger(summary_log_file)
         if not os.path.exists(App_Repo_Mapping):
             print("Application to repository mapping information is missing, please refer README.md to create mapping spreadhseet.")
             return
-        AppRepoMapping.create_application_folders(App_Repo_Mapping, unzip_dir, src_dir_analyze, logger, summary_logger)
+        place_repositories(settings, current_datetime, FailureQueue.open_queue(settings))
     
     elif output_type == 5:
+        import HLScanAndOnboard
 
         try:
-                HLScanAndOnboard.main()
+                HLScanAndOnboard.main(settings)
                 
         except Exception as e:
                 logging.error(f'{e}')
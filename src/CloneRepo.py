@@ -1,93 +1,150 @@
-# import os
-# import datetime
-# from argparse import ArgumentParser
-# from git import Repo
-# import openpyxl
-
-# def read_excel_data(file_path):
-#     data = []
-#     try:
-#         workbook = openpyxl.load_workbook(file_path)
-#         sheet = workbook.active
-#         for row in sheet.iter_rows(min_row=2, values_only=True):
-#             server_location = row[3].replace('\\\\', '\\')
-#             data.append((row[0], row[1], row[2], server_location))
-#         workbook.close()
-#     except Exception as e:
-#         print(f"Error reading Excel file: {e}")
-#     return data
-
-# def create_directory_if_not_exists(directory_path):
-#     if not os.path.exists(directory_path):
-#         try:
-#             os.makedirs(directory_path)
-#             print(f"Directory '{directory_path}' created successfully.\n")
-#         except OSError as e:
-#             print(f"Error: {e}")
-#     else:
-#         print(f"Directory '{directory_path}' already exists.\n")
-
-# def log_start_end_time(repository_name, start_time, end_time, total_time, log_file):
-#     log_message = f"{repository_name} | {start_time} | {end_time} | {total_time} |"
-#     with open(log_file, "a") as f:
-#         f.write(log_message + "\n")
-
-# def log_processing(repository_name, status, log_file):
-#     log_message = f"{repository_name} | {status}"
-#     with open(log_file, "a") as f:
-#         f.write(log_message + "\n")
-
-# def download_and_save_code(application_name, repository_url, server_location, token, start_end_log_file, processing_log_file):
-#     application_name_directory = os.path.join(server_location, application_name)
-#     create_directory_if_not_exists(application_name_directory)
-
-#     # Extracting repository name without the ".git" extension
-#     repository_name = repository_url.split('/')[-1].replace('.git', '')
-#     repository_path = os.path.join(application_name_directory, repository_name)
-    
-#     if os.path.exists(repository_path) and os.listdir(repository_path):
-#         log_processing(repository_name, "Skipped: Directory already exists and is not empty", processing_log_file)
-#         print(f"Skipping repository '{repository_name}'. Directory already exists and is not empty.\n")
-#     else:
-#         start_time = datetime.datetime.now()
-#         try:
-#             cloned_url = repository_url.replace('https://', f'https://{token}@')
-#             Repo.clone_from(cloned_url, repository_path, depth=1)
-#             end_time = datetime.datetime.now()
-#             total_time = end_time - start_time
-#             log_start_end_time(repository_name, start_time, end_time, total_time, start_end_log_file)
-#             log_processing(repository_name, "Successful", processing_log_file)
-#             print(f"Repository '{repository_name}' downloaded successfully to '{repository_path}'.\n")
-#         except Exception as e:
-#             end_time = datetime.datetime.now()
-#             total_time = end_time - start_time
-#             log_start_end_time(repository_name, start_time, end_time, total_time, start_end_log_file)
-#             log_processing(repository_name, f"Failed: {e}", processing_log_file)
-#             print(f"Error cloning repository: {e}")
-
-
-# if __name__ == "__main__":
-#     parser = ArgumentParser()
-
-#     parser.add_argument('-excel_file', '--excel_file', required=True, help='Excel File Name')
-#     parser.add_argument('-batch', '--batch', required=True, help='Batch Number')
-#     parser.add_argument('-token', '--token', required=True, help='GitHub Access Token')
-#     parser.add_argument('-log_dir', '--log_dir', required=True, help='Log Directory')
-
-#     args = parser.parse_args()
-
-#     # Create log directory if it doesn't exist
-#     create_directory_if_not_exists(args.log_dir)
-
-#     start_end_log_file = os.path.join(args.log_dir, "TimetoClone.txt")
-#     processing_log_file = os.path.join(args.log_dir, "ExecutionLog.txt")
-
-#     # Clear log files if they already exist
-#     open(start_end_log_file, 'w').close()
-#     open(processing_log_file, 'w').close()
-
-#     data = read_excel_data(args.excel_file)
-
-#     for repository in data:
-#         if repository[2] == int(args.batch):
-#             download_and_save_code(repository[0], repository[1], repository[3], args.token, start_end_log_file, processing_log_file)
+import os
+import base64
+import shutil
+import datetime
+import subprocess
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import Profiling
+import FailureQueue
+
+# Default number of concurrent clones
+DEFAULT_CLONE_WORKERS = 4
+
+
+def git_environment(token):
+    """
+    Environment for git commands, passing the GitHub token as an HTTP header.
+    The token is neither put in the clone URL nor written to .git/config.
+    """
+    env = dict(os.environ, GIT_TERMINAL_PROMPT='0')
+    if token:
+        credentials = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+        env.update({
+            'GIT_CONFIG_COUNT': '1',
+            'GIT_CONFIG_KEY_0': 'http.extraHeader',
+            'GIT_CONFIG_VALUE_0': f"Authorization: Basic {credentials}",
+        })
+    return env
+
+
+def run_git(args, env, cwd=None):
+    return subprocess.run(['git'] + args, cwd=cwd, env=env, check=True, capture_output=True, text=True)
+
+
+def pack_size(repository_path):
+    # Bytes of the object store, i.e. what was transferred for a shallow clone
+    total = 0
+    objects_path = os.path.join(repository_path, '.git', 'objects')
+    for root, dirs, files in os.walk(objects_path):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+    return total
+
+
+def clone_or_update(repository_name, clone_url, branch, destination_root, token):
+    """
+    Shallow clones a single branch, or fetches and resets it when the clone already exists.
+    Parameters:
+        repository_name (str): The repository name, also the folder name under destination_root.
+        clone_url (str): The repository clone URL.
+        branch (str): The branch to check out, the repository default_branch.
+        destination_root (str): The folder the repositories are cloned into (unzip_dir).
+        token (str): The GitHub access token.
+    Returns:
+        tuple: (action, transferred bytes) where action is 'Cloned' or 'Updated'.
+    """
+    env = git_environment(token)
+    repository_path = os.path.join(destination_root, repository_name)
+
+    if os.path.isdir(os.path.join(repository_path, '.git')):
+        before = pack_size(repository_path)
+        run_git(['fetch', '--depth', '1', '--no-tags', 'origin', branch], env, repository_path)
+        run_git(['reset', '--hard', 'FETCH_HEAD'], env, repository_path)
+        run_git(['clean', '-fdx'], env, repository_path)
+        return 'Updated', max(pack_size(repository_path) - before, 0)
+
+    # Anything else at that path is a partial extraction or clone
+    if os.path.exists(repository_path):
+        shutil.rmtree(repository_path)
+    run_git(['clone', '--depth', '1', '--single-branch', '--no-tags', '--branch', branch, clone_url, repository_path], env)
+    return 'Cloned', pack_size(repository_path)
+
+
+def log_line(message, log_file):
+    with open(log_file, "a") as f:
+        f.write(message + "\n")
+
+
+def clone_repositories(repositories, destination_root, token, start_end_log_file, processing_log_file, transfer_log_file=None, workers=DEFAULT_CLONE_WORKERS, queue=None):
+    """
+    Clones or updates repositories concurrently, straight into the layout option 4 expects.
+    Parameters:
+        repositories (list): RepoRecord objects (name, clone_url, default_branch).
+        destination_root (str): The folder the repositories are cloned into (unzip_dir).
+        token (str): The GitHub access token.
+        start_end_log_file (str): The path to the log file for start and end times.
+        processing_log_file (str): The path to the log file for processing status.
+        transfer_log_file (str): CSV of transferred bytes and seconds per repository, or None.
+        workers (int): The number of concurrent clones.
+        queue (FailureQueue): Retries transient failures and keeps the ones left, or None.
+    Returns:
+        tuple: (number of repositories cloned or updated, number failed).
+    """
+    os.makedirs(destination_root, exist_ok=True)
+
+    def attempt(repository):
+        # None once cloned or updated, (reason, FailureQueue kind) otherwise
+        start_time = datetime.datetime.now()
+        failure = None
+        try:
+            action, transferred = clone_or_update(repository.name, repository.clone_url, repository.default_branch or 'main', destination_root, token)
+            status = "Successful"
+            print(f"Repository '{repository.name}' {action.lower()} to '{os.path.join(destination_root, repository.name)}'.\n")
+        except (subprocess.CalledProcessError, OSError) as e:
+            action, transferred = 'Failed', 0
+            error = e.stderr.strip() if isinstance(e, subprocess.CalledProcessError) and e.stderr else str(e)
+            status = f"Failed: {error}"
+            failure = (error, FailureQueue.classify_message(error) if isinstance(e, subprocess.CalledProcessError) else FailureQueue.classify_exception(e))
+            print(f"Error cloning repository '{repository.name}': {error}")
+        end_time = datetime.datetime.now()
+        total_time = end_time - start_time
+        log_line(f"{repository.name} | {start_time} | {end_time} | {total_time} |", start_end_log_file)
+        log_line(f"{repository.name} | {status}", processing_log_file)
+        if transfer_log_file:
+            log_line(f"{repository.name},git,{transferred},{total_time.total_seconds():.3f}", transfer_log_file)
+        return failure
+
+    def clone(repository):
+        if queue:
+            return queue.attempt('download', repository.name, lambda: attempt(repository)) is None
+        return attempt(repository) is None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(Profiling.profiled('clone', clone), repositories))
+    return results.count(True), results.count(False)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Shallow clone repositories of a summary CSV batch.")
+    parser.add_argument('-csv_file', '--csv_file', required=True, help='The <org>_Repositories_Summary.csv file')
+    parser.add_argument('-batch', '--batch', required=True, help='Batch Number')
+    parser.add_argument('-token', '--token', default='', help='GitHub Access Token')
+    parser.add_argument('-dest', '--dest', required=True, help='Destination folder (unzip_dir)')
+    parser.add_argument('-log_dir', '--log_dir', required=True, help='Log Directory')
+    parser.add_argument('-workers', '--workers', type=int, default=DEFAULT_CLONE_WORKERS, help='Concurrent clones')
+    args = parser.parse_args()
+
+    import RepoCatalog
+    os.makedirs(args.log_dir, exist_ok=True)
+    current_datetime = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    repositories = RepoCatalog.load_catalog(args.csv_file).batch(args.batch)
+    cloned, failed = clone_repositories(repositories, args.dest, args.token,
+                                        os.path.join(args.log_dir, f"TimetoClone_{args.batch}_{current_datetime}.txt"),
+                                        os.path.join(args.log_dir, f"CloneLog_{args.batch}_{current_datetime}.txt"),
+                                        os.path.join(args.log_dir, f"Transfer_{args.batch}_{current_datetime}.csv"),
+                                        args.workers)
+    print(f"{cloned} repositories cloned or updated, {failed} failed.")
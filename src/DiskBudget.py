@@ -0,0 +1,143 @@
+import os
+import time
+import shutil
+import threading
+
+# Extracted source code is typically about four times its ZIP archive
+DEFAULT_COMPRESSION_RATIO = 4.0
+# Free space always left on each volume
+DEFAULT_RESERVE_MB = 2048
+
+
+def existing_ancestor(path):
+    # The volume of a folder that is not created yet is the one of its closest existing parent
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def volume_id(path):
+    return os.stat(existing_ancestor(path)).st_dev
+
+
+def free_bytes(path):
+    return shutil.disk_usage(existing_ancestor(path)).free
+
+
+def tree_size(path, unlinked_only=False):
+    # Bytes of the files under path, without following links.
+    # unlinked_only leaves out files hardlinked elsewhere (e.g. the archive cache), deleting them frees nothing
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            try:
+                stat = os.lstat(os.path.join(root, file))
+            except OSError:
+                continue
+            if not unlinked_only or stat.st_nlink == 1:
+                total += stat.st_size
+    return total
+
+
+class AdmissionController:
+    """
+    Admits downloads and extractions only when the destination volume has room for them.
+    Space admitted but not yet written is reserved, so concurrent work on the same volume
+    cannot together overrun it. Folders on the same volume share one budget.
+    Parameters:
+        reserve_bytes (int): Free space always left on each volume.
+        compression_ratio (float): Extracted bytes per archive byte, used to estimate extractions.
+        wait_seconds (float): How long admit() waits for reserved space to be released.
+    """
+    def __init__(self, reserve_bytes=DEFAULT_RESERVE_MB * 1024 * 1024, compression_ratio=DEFAULT_COMPRESSION_RATIO, wait_seconds=0):
+        self.reserve_bytes = reserve_bytes
+        self.compression_ratio = compression_ratio
+        self.wait_seconds = wait_seconds
+        self.reserved = {}
+        self.condition = threading.Condition()
+        self.stats = {'admitted': 0, 'refused': 0, 'admitted_bytes': 0}
+        self.observed = [0, 0]
+
+    def estimate_extracted(self, archive_bytes):
+        return int(archive_bytes * self.compression_ratio)
+
+    def observe(self, archive_bytes, extracted_bytes):
+        # The ratio of the archives extracted so far replaces the configured one
+        with self.condition:
+            self.observed[0] += archive_bytes
+            self.observed[1] += extracted_bytes
+            if self.observed[0]:
+                self.compression_ratio = max(self.observed[1] / self.observed[0], 1.0)
+
+    def available(self, path):
+        volume = volume_id(path)
+        return free_bytes(path) - self.reserved.get(volume, 0) - self.reserve_bytes
+
+    def admit(self, needs):
+        """
+        Reserves space on every volume of needs, or nothing when one of them is short.
+        Parameters:
+            needs (list): (path, bytes) pairs, paths on the same volume are added up.
+        Returns:
+            bool: True when the space is reserved, release() it once written.
+        """
+        per_volume = {}
+        for path, needed in needs:
+            volume = volume_id(path)
+            per_volume.setdefault(volume, [path, 0])[1] += needed
+        deadline = time.monotonic() + self.wait_seconds
+        with self.condition:
+            while True:
+                short = [volume for volume, (path, needed) in per_volume.items() if needed > self.available(path)]
+                if not short:
+                    for volume, (path, needed) in per_volume.items():
+                        self.reserved[volume] = self.reserved.get(volume, 0) + needed
+                    self.stats['admitted'] += 1
+                    self.stats['admitted_bytes'] += sum(needed for path, needed in per_volume.values())
+                    return True
+                # Waiting only helps when other work holds reservations on a short volume
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not any(self.reserved.get(volume) for volume in short):
+                    self.stats['refused'] += 1
+                    return False
+                self.condition.wait(remaining)
+
+    def release(self, needs):
+        with self.condition:
+            for path, needed in needs:
+                volume = volume_id(path)
+                self.reserved[volume] = max(self.reserved.get(volume, 0) - needed, 0)
+            self.condition.notify_all()
+
+    def shortfall_message(self, needs):
+        return ", ".join(f"{path} needs {needed / (1024 * 1024):.0f} MB, {max(self.available(path), 0) / (1024 * 1024):.0f} MB available"
+                         for path, needed in needs)
+
+    def summary(self):
+        return (f"Disk admission: {self.stats['admitted']} admitted ({self.stats['admitted_bytes'] / (1024 * 1024):.1f} MB), "
+                f"{self.stats['refused']} refused for lack of space, compression ratio {self.compression_ratio:.2f}")
+
+
+def reclaim(paths):
+    """
+    Deletes intermediate copies that are no longer needed.
+    Returns:
+        int: The bytes freed.
+    """
+    freed = 0
+    for path in paths:
+        if os.path.isdir(path):
+            size = tree_size(path, unlinked_only=True)
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.isfile(path):
+            stat = os.lstat(path)
+            size = stat.st_size if stat.st_nlink == 1 else 0
+            os.remove(path)
+        else:
+            continue
+        freed += size
+    return freed
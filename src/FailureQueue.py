@@ -0,0 +1,187 @@
+# Failures of every stage (download, unzip, place, scan, upload) in one queue, kept in the repository catalog.
+# Transient failures are retried right away a bounded number of times with exponential backoff,
+# whatever still fails stays queued: the dead-letter report of each stage lists it, and
+# CASTHL_Automation --retry-failed runs only those items again through the stages left.
+#
+#     python FailureQueue.py [--stage scan]
+import os
+import csv
+import time
+import errno
+import sqlite3
+from datetime import datetime
+from argparse import ArgumentParser
+import RepoCatalog
+import Settings
+
+TRANSIENT = 'Transient'
+PERMANENT = 'Permanent'
+# Stages in pipeline order, an item failed at one stage still has to go through the ones after it
+STAGES = ['download', 'unzip', 'place', 'scan', 'upload']
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BACKOFF_SECONDS = 10
+MAX_BACKOFF_SECONDS = 300
+# 403 is how GitHub answers an exhausted rate limit
+TRANSIENT_HTTP_STATUSES = {403, 408, 429, 500, 502, 503, 504}
+TRANSIENT_ERRNOS = {errno.EAGAIN, errno.EBUSY, errno.ETIMEDOUT, errno.ECONNRESET, errno.ECONNREFUSED, errno.EACCES}
+# Lower case parts of git and network error messages that are worth another attempt
+TRANSIENT_MARKERS = ('timed out', 'timeout', 'could not resolve', 'connection', 'early eof', 'rpc failed', 'temporarily',
+                     'rate limit', 'http 403', 'http 408', 'http 429', 'http 500', 'http 502', 'http 503', 'http 504',
+                     'compressed file ended', 'unexpected end')
+# Highlight command line return codes (HLScanAndOnboard.return_code_messages) of a failed upload
+TRANSIENT_RETURN_CODES = {5, 8}
+REPORT_HEADER = ['Stage', 'Item', 'Kind', 'Reason', 'Attempts', 'First Failed', 'Last Failed']
+
+
+def classify_http_status(status_code):
+    return TRANSIENT if status_code in TRANSIENT_HTTP_STATUSES else PERMANENT
+
+
+def classify_message(message):
+    message = (message or '').lower()
+    return TRANSIENT if any(marker in message for marker in TRANSIENT_MARKERS) else PERMANENT
+
+
+def classify_exception(e):
+    """
+    Transient for network errors, HTTP statuses of TRANSIENT_HTTP_STATUSES and busy or locked files.
+    """
+    response = getattr(e, 'response', None)
+    if response is not None and getattr(response, 'status_code', None):
+        return classify_http_status(response.status_code)
+    import requests
+    if isinstance(e, (ConnectionError, TimeoutError, requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                      requests.exceptions.ChunkedEncodingError)):
+        return TRANSIENT
+    if isinstance(e, OSError) and e.errno in TRANSIENT_ERRNOS:
+        return TRANSIENT
+    return classify_message(str(e))
+
+
+def classify_return_code(return_code):
+    return TRANSIENT if return_code in TRANSIENT_RETURN_CODES else PERMANENT
+
+
+class FailureQueue:
+    """
+    The failures table of a catalog database, shared by the threads of a stage.
+    Parameters:
+        db_path (str): The catalog database, <output_dir>/<org>_Repositories_Summary.db.
+        max_attempts (int): Attempts of a transient failure before it is left to retry-failed.
+        backoff_seconds (float): Wait before the second attempt, doubled for each further one.
+    """
+    def __init__(self, db_path, max_attempts=DEFAULT_MAX_ATTEMPTS, backoff_seconds=DEFAULT_BACKOFF_SECONDS):
+        self.db_path = db_path
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff_seconds = backoff_seconds
+
+    def attempt(self, stage, item, function):
+        """
+        Runs function until it succeeds, fails permanently or max_attempts is reached.
+        Parameters:
+            stage (str): One of STAGES.
+            item (str): Repository name, <app>;<repo> for place, <app>;<app id> for scan and upload.
+            function (callable): Returns None on success, (reason, kind) on failure.
+        Returns:
+            tuple: The last (reason, kind), None once it succeeded.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            failure = function()
+            if failure is None:
+                self.resolve(stage, item)
+                return None
+            reason, kind = failure
+            if kind != TRANSIENT or attempt == self.max_attempts:
+                break
+            delay = min(self.backoff_seconds * 2 ** (attempt - 1), MAX_BACKOFF_SECONDS)
+            print(f"{stage} of '{item}' failed ({reason}), attempt {attempt + 1} of {self.max_attempts} in {delay:.1f} s.")
+            time.sleep(delay)
+        self.record(stage, item, reason, kind, attempt)
+        return failure
+
+    def record(self, stage, item, reason, kind, attempts=1):
+        conn = RepoCatalog.connect(self.db_path)
+        try:
+            with conn:
+                conn.execute("""INSERT INTO failures VALUES (?, ?, ?, ?, ?, 'Failed', datetime('now'), datetime('now'))
+                                ON CONFLICT (stage, item) DO UPDATE SET kind = excluded.kind, reason = excluded.reason,
+                                attempts = CASE WHEN status = 'Failed' THEN attempts ELSE 0 END + excluded.attempts,
+                                first_failed_at = CASE WHEN status = 'Failed' THEN first_failed_at ELSE excluded.first_failed_at END,
+                                status = 'Failed', last_failed_at = excluded.last_failed_at""",
+                             (stage, item, kind, str(reason), attempts))
+        finally:
+            conn.close()
+
+    def resolve(self, stage, item):
+        conn = RepoCatalog.connect(self.db_path)
+        try:
+            with conn:
+                conn.execute("UPDATE failures SET status = 'Resolved' WHERE stage = ? AND item = ? AND status = 'Failed'", (stage, item))
+        finally:
+            conn.close()
+
+    def pending(self, stage=None):
+        """
+        Returns:
+            list: The failures still queued as dicts, oldest first.
+        """
+        if not os.path.exists(self.db_path):
+            return []
+        conn = RepoCatalog.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            query = "SELECT * FROM failures WHERE status = 'Failed'" + (" AND stage = ?" if stage else '') + " ORDER BY first_failed_at"
+            return [dict(row) for row in conn.execute(query, (stage,) if stage else ())]
+        finally:
+            conn.close()
+
+    def write_dead_letter_report(self, stage, logs_dir, current_datetime):
+        """
+        Writes DeadLetter_<stage>_<datetime>.csv to logs_dir with the failures of stage still queued.
+        Returns:
+            str: The report, None when nothing of the stage is queued.
+        """
+        failures = self.pending(stage)
+        if not failures:
+            return None
+        report_file = os.path.join(logs_dir, f"DeadLetter_{stage}_{current_datetime}.csv")
+        with open(report_file, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(REPORT_HEADER)
+            for failure in failures:
+                writer.writerow([failure['stage'], failure['item'], failure['kind'], failure['reason'], failure['attempts'],
+                                 failure['first_failed_at'], failure['last_failed_at']])
+        transient = sum(1 for failure in failures if failure['kind'] == TRANSIENT)
+        print(f"{len(failures)} {stage} failures queued ({transient} transient, {len(failures) - transient} permanent), "
+              f"refer {report_file}. Run CASTHL_Automation.py --retry-failed to retry them.")
+        return report_file
+
+
+def open_queue(settings):
+    """
+    Returns:
+        FailureQueue: The queue of the run's catalog, None without output_dir.
+    """
+    if not settings.output_dir or not settings.summary_name():
+        return None
+    os.makedirs(settings.output_dir, exist_ok=True)
+    return FailureQueue(RepoCatalog.org_catalog_path(settings.output_dir, settings.summary_name()),
+                        settings.retry_max_attempts or DEFAULT_MAX_ATTEMPTS,
+                        settings.retry_backoff_seconds if settings.retry_backoff_seconds is not None else DEFAULT_BACKOFF_SECONDS)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Lists the failures queued by the stages of CASTHL_Automation.")
+    parser.add_argument('--config', help='config.properties, default is CASTHL_CONFIG or Config/config.properties')
+    parser.add_argument('--stage', choices=STAGES, help='Only the failures of this stage')
+    args = parser.parse_args()
+    settings = Settings.load_settings(args.config)
+    queue = open_queue(settings)
+    failures = queue.pending(args.stage) if queue else []
+    for failure in failures:
+        print(f"{failure['stage']:<9} {failure['kind']:<10} {failure['attempts']:>3} attempts  {failure['item']} - {failure['reason']}")
+    print(f"{len(failures)} failures queued.")
+    if queue and failures:
+        current_datetime = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        for stage in ([args.stage] if args.stage else STAGES):
+            queue.write_dead_letter_report(stage, settings.logs_dir, current_datetime)
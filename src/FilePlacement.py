@@ -0,0 +1,130 @@
+import os
+import shutil
+import hashlib
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, reflinks are not attempted
+    fcntl = None
+
+# ioctl cloning a whole file on copy-on-write filesystems (Btrfs, XFS), from linux/fs.h
+FICLONE = 0x40049409
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def reflink(source_path, destination_path):
+    if fcntl is None:
+        raise OSError("Reflinks are not supported on this platform")
+    with open(source_path, 'rb') as source, open(destination_path, 'wb') as destination:
+        try:
+            fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+        except OSError:
+            destination.close()
+            os.remove(destination_path)
+            raise
+
+
+def materialize(source_path, destination_path):
+    """
+    Makes destination_path a copy of source_path sharing its bytes when the filesystem allows it.
+    Returns:
+        str: 'hardlink', 'reflink' or 'copy'.
+    """
+    try:
+        os.link(source_path, destination_path)
+        return 'hardlink'
+    except OSError:
+        pass
+    try:
+        reflink(source_path, destination_path)
+        return 'reflink'
+    except OSError:
+        pass
+    shutil.copyfile(source_path, destination_path)
+    return 'copy'
+
+
+class DedupeIndex:
+    """
+    Files seen so far by size, and by content hash once two of them have the same size.
+    Only files sharing a size are ever hashed, and each of them once.
+    """
+    def __init__(self):
+        self.unhashed = {}
+        self.hashed_sizes = set()
+        self.digests = {}
+        self.by_digest = {}
+
+    def _digest(self, path):
+        if path not in self.digests:
+            self.digests[path] = file_digest(path)
+        return self.digests[path]
+
+    def canonical(self, path, size):
+        """
+        Returns the first seen file with the same content as path, or None when path is new.
+        """
+        if size not in self.hashed_sizes:
+            first = self.unhashed.get(size)
+            if first is None:
+                self.unhashed[size] = path
+                return None
+            if first == path:
+                # The same repository placed in another application
+                return path
+            # Second file of this size, files of this size are compared by hash from now on
+            del self.unhashed[size]
+            self.hashed_sizes.add(size)
+            self.by_digest[(size, self._digest(first))] = first
+        key = (size, self._digest(path))
+        if key in self.by_digest:
+            return self.by_digest[key]
+        self.by_digest[key] = path
+        return None
+
+
+class Placement:
+    """
+    Materializes repository trees into several application folders, sharing identical files.
+    """
+    def __init__(self):
+        self.index = DedupeIndex()
+        self.stats = {'files': 0, 'mapped_bytes': 0, 'unique_bytes': 0, 'duplicates': 0, 'hardlink': 0, 'reflink': 0, 'copy': 0}
+
+    def place_tree(self, source_root, destination_root):
+        """
+        Recreates source_root under destination_root, each file linked to the first identical file seen.
+        """
+        for root, dirs, files in os.walk(source_root):
+            target_root = os.path.join(destination_root, os.path.relpath(root, source_root))
+            os.makedirs(target_root, exist_ok=True)
+            for file in files:
+                source_path = os.path.join(root, file)
+                target_path = os.path.join(target_root, file)
+                if os.path.islink(source_path):
+                    os.symlink(os.readlink(source_path), target_path)
+                    continue
+                size = os.path.getsize(source_path)
+                canonical = self.index.canonical(source_path, size)
+                if canonical is None:
+                    self.stats['unique_bytes'] += size
+                else:
+                    self.stats['duplicates'] += 1
+                method = materialize(canonical or source_path, target_path)
+                self.stats[method] += 1
+                self.stats['files'] += 1
+                self.stats['mapped_bytes'] += size
+
+    def summary(self):
+        return (f"Placed {self.stats['files']} files, {self.stats['mapped_bytes'] / (1024 * 1024):.1f} MB mapped, "
+                f"{self.stats['unique_bytes'] / (1024 * 1024):.1f} MB unique ({self.stats['duplicates']} duplicate files), "
+                f"{self.stats['hardlink']} hardlinked, {self.stats['reflink']} reflinked, {self.stats['copy']} copied")
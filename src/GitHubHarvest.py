@@ -0,0 +1,233 @@
+# Option 1 for several GitHub organizations (github_orgs): the repository metadata of every
+# organization is harvested concurrently, all requests sharing one rate limit budget, and merged
+# into one summary CSV whose repositories are named <org>/<repo>.
+import os
+import csv
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Organizations harvested at the same time
+DEFAULT_HARVEST_WORKERS = 4
+# Largest page size of the GitHub repository listing
+PAGE_SIZE = 100
+# Attempts of one page, rate limit pauses are not counted
+MAX_PAGE_ATTEMPTS = 3
+# Wait when GitHub rate limits without saying until when
+DEFAULT_RATE_LIMIT_WAIT = 60
+STATS_HEADER = ['Organization', 'Repositories', 'Pages', 'Requests', 'Bytes', 'Rate limit waits', 'Waited (s)', 'Seconds', 'Repositories/s', 'Status']
+
+
+class RateBudget:
+    """
+    Rate limit budget shared by the harvesting threads.
+    Requests are spaced to stay under requests_per_hour overall, and when GitHub reports a token as
+    exhausted every thread using that token waits for its reset instead of failing.
+    Parameters:
+        requests_per_hour (int): Requests allowed per hour over all tokens, None to rely on GitHub's headers only.
+    """
+    def __init__(self, requests_per_hour=None):
+        self.interval = 3600.0 / requests_per_hour if requests_per_hour else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+        # Token -> time.time() at which its rate limit resets
+        self.resume_at = {}
+
+    def acquire(self, token):
+        """
+        Blocks until a request may be sent with token.
+        Returns:
+            float: Seconds waited.
+        """
+        waited = 0.0
+        # The pause of an exhausted token only holds back the threads using it, the global slot
+        # is taken once that token may be used again so that other tokens keep their pace
+        while True:
+            with self.lock:
+                now = time.time()
+                resume_at = self.resume_at.get(token, 0.0)
+                if resume_at <= now:
+                    start = max(now, self.next_slot)
+                    self.next_slot = start + self.interval
+                    break
+            time.sleep(resume_at - now)
+            waited += resume_at - now
+        if start > now:
+            time.sleep(start - now)
+        return waited + start - now
+
+    def observe(self, token, response):
+        """
+        Reads the rate limit headers of a response.
+        Returns:
+            bool: True when the request was rate limited and has to be sent again.
+        """
+        headers = response.headers
+        limited = response.status_code in (403, 429) and (headers.get('X-RateLimit-Remaining') == '0' or 'Retry-After' in headers)
+        if headers.get('X-RateLimit-Remaining') != '0' and not limited:
+            return False
+        if 'Retry-After' in headers:
+            resume_at = time.time() + float(headers['Retry-After'])
+        elif headers.get('X-RateLimit-Reset'):
+            resume_at = float(headers['X-RateLimit-Reset']) + 1
+        else:
+            resume_at = time.time() + DEFAULT_RATE_LIMIT_WAIT
+        with self.lock:
+            self.resume_at[token] = max(self.resume_at.get(token, 0.0), resume_at)
+        return limited
+
+
+def harvest_organization(session, org_name, token, api_url, budget):
+    """
+    Lists every repository of an organization.
+    Parameters:
+        session (requests.Session): Session of the calling thread, its connections are reused across pages.
+        org_name (str): The organization.
+        token (str): The GitHub access token of the organization.
+        api_url (str): The GitHub REST API root.
+        budget (RateBudget): The shared rate limit budget.
+    Returns:
+        tuple: (repositories as returned by GitHub, stats dict).
+    """
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github+json",
+        "X-GitHub-Api-Version": "2022-11-28"
+    }
+    stats = {'org': org_name, 'repos': 0, 'pages': 0, 'requests': 0, 'bytes': 0, 'rate_limited': 0, 'waited': 0.0, 'seconds': 0.0, 'status': 'Successful'}
+    start_time = time.time()
+    repos = []
+    page_number = 1
+    attempts = 0
+    while True:
+        stats['waited'] += budget.acquire(token)
+        stats['requests'] += 1
+        try:
+            response = session.get(f"{api_url}/orgs/{org_name}/repos", headers=headers,
+                                   params={'per_page': PAGE_SIZE, 'page': page_number}, timeout=(10, 120))
+        except Exception as e:
+            attempts += 1
+            if attempts >= MAX_PAGE_ATTEMPTS:
+                stats['status'] = f"Failed: {e}"
+                break
+            continue
+        stats['bytes'] += len(response.content)
+        if budget.observe(token, response):
+            stats['rate_limited'] += 1
+            continue
+        if response.status_code != 200:
+            attempts += 1
+            if response.status_code in (401, 404) or attempts >= MAX_PAGE_ATTEMPTS:
+                reason = {401: 'Bad credentials', 404: 'Bad organization name'}.get(response.status_code, f"HTTP {response.status_code}")
+                stats['status'] = f"Failed: {reason}"
+                break
+            continue
+        attempts = 0
+        page = response.json()
+        stats['pages'] += 1
+        repos.extend(page)
+        if len(page) < PAGE_SIZE:
+            break
+        page_number += 1
+    stats['repos'] = len(repos)
+    stats['seconds'] = time.time() - start_time
+    return repos, stats
+
+
+def harvest_organizations(organizations, api_url, output_dir, workers=DEFAULT_HARVEST_WORKERS, requests_per_hour=None):
+    """
+    Harvests several organizations concurrently into <output_dir>/<org>_Repositories_Metadata.json.
+    Parameters:
+        organizations (list): (organization, token) pairs.
+        api_url (str): The GitHub REST API root.
+        output_dir (str): Folder of the metadata JSON files.
+        workers (int): Organizations harvested at the same time.
+        requests_per_hour (int): Shared request budget, None to rely on GitHub's rate limit headers only.
+    Returns:
+        list: Stats dict of each organization, with the 'json_file' written when it succeeded.
+    """
+    import requests
+    budget = RateBudget(requests_per_hour)
+    local = threading.local()
+
+    def harvest(organization):
+        org_name, token = organization
+        # One session per thread, pages of the organizations of a thread reuse its connections
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        repos, stats = harvest_organization(local.session, org_name, token, api_url, budget)
+        if stats['status'] == 'Successful':
+            stats['json_file'] = os.path.join(output_dir, f"{org_name}_Repositories_Metadata.json")
+            with open(stats['json_file'], "w") as json_file:
+                json.dump(repos, json_file, indent=4)
+        print(f"{org_name}: {stats['repos']} repositories in {stats['seconds']:.1f} s, {stats['status']}.")
+        return stats
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(organizations)))) as executor:
+        return list(executor.map(harvest, organizations))
+
+
+def write_unified_summary(org_summaries, unified_csv_file):
+    """
+    Merges the summary CSVs of the organizations into one, repositories named <org>/<repo>.
+    Parameters:
+        org_summaries (list): (organization, <org>_Repositories_Summary.csv) pairs.
+        unified_csv_file (str): The merged summary CSV.
+    Returns:
+        int: Repositories in the merged summary.
+    """
+    header = ['org']
+    rows = []
+    for org_name, summary_file in org_summaries:
+        with open(summary_file, newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                # The org column is first, the summary columns follow in their original order
+                header += [column for column in row if column not in header]
+                row['org'] = org_name
+                row['name'] = f"{org_name}/{row['name']}"
+                rows.append(row)
+    with open(unified_csv_file, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=header)
+        writer.writeheader()
+        writer.writerows(rows)
+    return len(rows)
+
+
+def write_stats(stats, stats_file):
+    # Per organization throughput of the harvest, also printed
+    with open(stats_file, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(STATS_HEADER)
+        for org_stats in stats:
+            rate = org_stats['repos'] / org_stats['seconds'] if org_stats['seconds'] else 0
+            writer.writerow([org_stats['org'], org_stats['repos'], org_stats['pages'], org_stats['requests'], org_stats['bytes'],
+                             org_stats['rate_limited'], f"{org_stats['waited']:.1f}", f"{org_stats['seconds']:.2f}", f"{rate:.1f}", org_stats['status']])
+            print(f"{org_stats['org']:<30} {org_stats['repos']:>7} repositories {org_stats['requests']:>5} requests "
+                  f"{org_stats['rate_limited']:>3} rate limited {org_stats['seconds']:>8.1f} s {rate:>8.1f} repositories/s  {org_stats['status']}")
+
+
+def qualify_repository_names(mapping_rows, repository_names):
+    """
+    Qualifies the plain repository names of the App-Repo mapping with their organization.
+    Parameters:
+        mapping_rows (list): (Application, Repository) pairs.
+        repository_names (list): <org>/<repo> names of the unified catalog.
+    Returns:
+        tuple: (mapping rows, plain names found in several organizations, left as they are).
+    """
+    organizations_by_repo = {}
+    for name in repository_names:
+        org_name, repo_name = name.split('/', 1)
+        organizations_by_repo.setdefault(repo_name, []).append(org_name)
+    qualified = []
+    ambiguous = set()
+    for app_name, repo_name in mapping_rows:
+        if isinstance(repo_name, str) and '/' not in repo_name:
+            organizations = organizations_by_repo.get(repo_name, [])
+            if len(organizations) == 1:
+                repo_name = f"{organizations[0]}/{repo_name}"
+            elif organizations:
+                ambiguous.add(repo_name)
+        qualified.append((app_name, repo_name))
+    return qualified, sorted(ambiguous)
@@ -0,0 +1,132 @@
+import os
+import logging
+import requests
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import HighlightAPI
+import Profiling
+from AppRepoMapping import clean_folder_name
+
+# Number of create calls in flight at the same time
+DEFAULT_PROVISION_WORKERS = 8
+
+
+def read_mapped_applications(mapping_sheet):
+    """
+    Reads the applications, and their optional domain, from the App-Repo mapping sheet.
+    Parameters:
+        mapping_sheet (str): The path to App-Repo-Mapping.xlsx.
+    Returns:
+        dict: Application name -> domain name (None when the sheet has no 'Domain' column).
+    """
+    mapping_df = pd.read_excel(mapping_sheet)
+    mapping_df = mapping_df[mapping_df['Application'].notna()]
+    applications = {}
+    for row in mapping_df.itertuples(index=False):
+        app_name = str(row.Application).strip()
+        domain = getattr(row, 'Domain', None)
+        domain = None if pd.isna(domain) else str(domain).strip()
+        # First domain seen for an application wins, one application spans several repositories
+        applications.setdefault(app_name, domain)
+    return applications
+
+
+def _create_all(items, create, workers, logger):
+    # Runs create(name, parent) for each (name, parent) with bounded parallelism, returns name -> id
+    created = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(Profiling.profiled('provision', create), name, parent): name for name, parent in items}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                created[name] = HighlightAPI.created_id(future.result(), name)
+                logger.info(f"Created '{name}' with ID {created[name]}.")
+            except (requests.RequestException, KeyError, IndexError, TypeError, AttributeError, ValueError) as e:
+                logger.error(f"Failed to create '{name}': {e}")
+    return created
+
+
+def provision_applications(mapping_sheet, base_url, token, company_id, applications_file, workers=DEFAULT_PROVISION_WORKERS, logger=logging):
+    """
+    Creates the domains and applications of the mapping sheet that are missing on the
+    Highlight server, then adds every mapped application to applications.txt.
+    Parameters:
+        mapping_sheet (str): The path to App-Repo-Mapping.xlsx.
+        base_url (str): The Highlight server URL.
+        token (str): The Highlight bearer token.
+        company_id (str): The Highlight company ID.
+        applications_file (str): The applications.txt file to update.
+        workers (int): The maximum number of concurrent create calls.
+    Returns:
+        tuple: (number of applications created, names of applications that could not be provisioned).
+    """
+    mapped = read_mapped_applications(mapping_sheet)
+
+    # One list call gives every existing application, so nothing is created twice
+    existing_apps = list_applications(base_url, token, company_id)
+    missing_apps = [name for name in mapped if name not in existing_apps]
+    logger.info(f"{len(mapped)} applications in the mapping sheet, {len(missing_apps)} missing on {base_url}.")
+
+    domain_ids = {}
+    needed_domains = {mapped[name] for name in missing_apps if mapped[name]}
+    if needed_domains:
+        try:
+            domain_path = f"/WS2/domains/{company_id}/domains"
+            domain_ids = {domain['name']: str(domain['id']) for domain in HighlightAPI.check_records(HighlightAPI.get_domains(base_url, token, company_id, refresh=True), domain_path)}
+            missing_domains = [(name, company_id) for name in sorted(needed_domains) if name not in domain_ids]
+        except (requests.RequestException, ValueError) as e:
+            # Without a usable domain listing nothing is created twice: the applications go to the company domain
+            logger.warning(f"Could not list the domains, applications are created in the company domain: {e}")
+            missing_domains = []
+        if missing_domains:
+            logger.info(f"Creating {len(missing_domains)} domains.")
+            create_domain = lambda name, parent: HighlightAPI.create_domain(base_url, token, parent, name)
+            domain_ids.update(_create_all(missing_domains, create_domain, workers, logger))
+
+    # Applications without a domain, or whose domain could not be created, go to the company domain
+    app_items = [(name, domain_ids.get(mapped[name], company_id)) for name in missing_apps]
+    if app_items:
+        logger.info(f"Creating {len(app_items)} applications.")
+    create_app = lambda name, domain_id: HighlightAPI.create_application(base_url, token, domain_id, name)
+    created_apps = _create_all(app_items, create_app, workers, logger)
+
+    if created_apps:
+        # An application counts as created once the server lists it under the ID it answered with
+        listed_apps = list_applications(base_url, token, company_id)
+        for name, app_id in list(created_apps.items()):
+            if listed_apps.get(name) != app_id:
+                logger.error(f"Created '{name}' with ID {app_id}, but the server does not list it.")
+                del created_apps[name]
+
+    app_ids = dict(existing_apps, **created_apps)
+    failed = [name for name in mapped if name not in app_ids]
+    write_applications_file(applications_file, [(name, app_ids[name]) for name in mapped if name in app_ids])
+    logger.info(f"{len(created_apps)} applications created, {len(failed)} failed, {applications_file} updated.")
+    return len(created_apps), failed
+
+
+def list_applications(base_url, token, company_id):
+    # Application name -> ID of every application of the company, as the server lists them now
+    path = f"/WS2/domains/{company_id}/applications"
+    return {app['name']: str(app['id']) for app in HighlightAPI.check_records(HighlightAPI.get_applications(base_url, token, company_id, refresh=True), path)}
+
+
+def write_applications_file(applications_file, applications):
+    # Same layout as the hand written file, names match the folders created by option 4. Lines already
+    # in the file are kept as they are, a provisioned application replaces the ID of its line or is appended
+    provisioned = {clean_folder_name(app_name): app_id for app_name, app_id in applications}
+    lines = []
+    if os.path.exists(applications_file):
+        with open(applications_file, 'r') as file:
+            lines = file.read().splitlines()[1:]
+    for index, line in enumerate(lines):
+        app_name = line.split(';')[0]
+        if app_name in provisioned:
+            lines[index] = f"{app_name};{provisioned.pop(app_name)}"
+    lines.extend(f"{app_name};{app_id}" for app_name, app_id in provisioned.items())
+    temp_file = f"{applications_file}.tmp"
+    with open(temp_file, 'w', newline='') as file:
+        file.write("Application Name;Application ID\n")
+        for line in lines:
+            file.write(f"{line}\n")
+    os.replace(temp_file, applications_file)
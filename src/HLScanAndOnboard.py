@@ -1,10 +1,21 @@
 import os
-import validators
+import sys
 import subprocess
 import threading
 import logging
 import csv
 from datetime import datetime
+from argparse import ArgumentParser
+import LogRouter
+import LogTiming
+import DiskBudget
+import Settings
+import Profiling
+import RepoCatalog
+import SourceInventory
+import Preflight
+import FailureQueue
+import ResultUpload
 
 # Mapping dictionary for return codes and their corresponding messages
 return_code_messages = {
@@ -19,65 +30,29 @@ return_code_messages = {
     8: "Error Code-8 : Command Line upload from zip file error",
     9: "Error Code-9 : Command Line unziping jars or zip error"
 }
-
-def read_properties_file(filename):
-    properties = {}
-    print(f"Reading properties from file: {filename}")
-    with open(filename, 'r') as file:
-        for line in file:
-            line = line.strip()
-            if line and not line.startswith('#') and not line.startswith('['):  # Skip empty lines and comments
-                key, value = line.split('=', 1)
-                properties[key.strip()] = value.strip()
-    return properties
-
-def validate_config(properties):
-    required_params = ['highlight_perl_dir', 'highlight_analyzer_dir', 'src_dir_analyze', 'IGNORED_DIR', 'IGNORED_PATHS', 'IGNORED_FILES',
-                       'highlight_base_url', 'highlight_executable', 'logs_dir', 'highlight_company_id', 'highlight_token', 'config_dir', 'RESULTS',
-                       'highlight_application_mapping', 'BATCH_SIZE']
-    for key, value in properties.items():
-        if key =='highlight_perl_dir' and not os.path.exists(value):
-            print(f"Program stopped bacause {key} Folder -> {value} does not exists!")
-            raise ValueError(f"Program stopped bacause {key} Folder -> {value} does not exists!")
-        
-        if key =='highlight_analyzer_dir' and not os.path.exists(value):
-            print(f"Program stopped bacause {key} Folder -> {value} does not exists.")
-            raise ValueError(f"Program stopped bacause {key} Folder -> {value} does not exists.")
-        
-        if key =='src_dir_analyze' and not os.path.exists(value):
-            print(f"Program stopped bacause {key} Folder -> {value} does not exists.")
-            raise ValueError(f"Program stopped bacause {key} Folder -> {value} does not exists.")
-        
-        if key =='highlight_executable' and not os.path.isfile(value):
-            print(f"Program stopped bacause {key} File -> {value} does not exists.")
-            raise ValueError(f"Program stopped bacause {key} File -> {value} does not exists.")
-        
-        if key =='logs_dir' and not os.path.exists(value):
-            print(f"Program stopped bacause {key} Folder -> {value} does not exists.")
-            raise ValueError(f"Program stopped bacause {key} Folder -> {value} does not exists.")
-        
-        if key =='config_dir' and not os.path.exists(value):
-            print(f"Program stopped bacause {key} Folder -> {value} does not exists.")
-            raise ValueError(f"Program stopped bacause {key} Folder -> {value} does not exists.")
-        
-        if key =='RESULTS' and not os.path.exists(value):
-            print(f"Program stopped bacause {key} Folder -> {value} does not exists.")
-            raise ValueError(f"Program stopped bacause {key} Folder -> {value} does not exists.")
-        
-        if key =='highlight_application_mapping' and not os.path.isfile(value):
-            print((f"Program stopped bacause {key} File -> {value} does not exists."))
-            raise ValueError(f"Program stopped bacause {key} File -> {value} does not exists.")
-        
-        if key =='highlight_base_url':
-            if not value.endswith(".com") or not validators.url(value):
-                print(f"Program stopped bacause The URL '{value}' is not valid.")
-                raise ValueError(f"Program stopped bacause The URL '{value}' is not valid.")
-        
-    missing_params = [param for param in required_params if param not in properties]
+# Reason of an application analyzed whose saved results could not be uploaded either
+UPLOAD_FAILED = "Application analyzed, upload of the saved results failed"
+
+def validate_config(settings):
+    # Only needed here, importing it at start-up slows down every worker and stage
+    import validators
+    required_params = ['highlight_perl_dir', 'highlight_analyzer_dir', 'src_dir_analyze', 'highlight_base_url', 'highlight_executable', 'logs_dir',
+                       'highlight_company_id', 'highlight_token', 'config_dir', 'results_dir', 'highlight_application_mapping']
+    missing_params = [Settings.FIELDS[param][0] for param in required_params if not getattr(settings, param)]
     if missing_params:
         print(f"Program stopped bacause required parameters not in the config.properties: {', '.join(missing_params)}")
         raise ValueError(f"Program stopped bacause required parameters not in the config.properties: {', '.join(missing_params)}")
 
+    # The paths are checked once per process, not again by every stage or worker thread
+    Settings.validate_paths(settings, [('highlight_perl_dir', 'dir'), ('highlight_analyzer_dir', 'dir'), ('src_dir_analyze', 'dir'),
+                                       ('highlight_executable', 'file'), ('logs_dir', 'dir'), ('config_dir', 'dir'), ('results_dir', 'dir'),
+                                       ('highlight_application_mapping', 'file')])
+
+    value = settings.highlight_base_url
+    if not value.endswith(".com") or not validators.url(value):
+        print(f"Program stopped bacause The URL '{value}' is not valid.")
+        raise ValueError(f"Program stopped bacause The URL '{value}' is not valid.")
+
 def check_duplicate_app_ids(applications):
     seen_ids = set()
     duplicates = []
@@ -109,37 +84,59 @@ def parse_timestamp(timestamp_str):
 
 def calculate_execution_time(log_file_path):
     try:
-        with open(log_file_path, 'r', encoding="utf-8") as file:
-            lines = file.readlines()
-            
-            start_time = parse_timestamp(lines[0][:23])  # Extracting timestamp from the first line
-            
-            end_time = parse_timestamp(lines[-1][:23])  # Extracting timestamp from the last line
-            
-            execution_time = end_time - start_time
-            
-            return str(start_time)[:-4], str(end_time)[:-4], round((execution_time.total_seconds() / 60) ,2)  # Convert to minutes
+        # Only the first line and the tail of the log are read, the file can be hundreds of MB
+        start_time, end_time = LogTiming.read_first_and_last_timestamps(log_file_path)
+
+        execution_time = end_time - start_time
+
+        return str(start_time)[:-4], str(end_time)[:-4], round((execution_time.total_seconds() / 60) ,2)  # Convert to minutes
     except Exception as e:
         print(f"Error reading log file {log_file_path}: {str(e)}")
         logging.error(f"Error reading log file {log_file_path}: {str(e)}")
         return None
 
-def process_application(app_name, app_id, log_file, output_txt_file, output_csv_file, SOURCES, HIGHLIGHT_EXE, ANALYZER_DIR, PERL, URL, TOKEN, COMPANY_ID, IGNORED_DIR, IGNORED_PATHS, IGNORED_FILES, RESULTS):
+def highlight_command(HIGHLIGHT_EXE):
+    # A .py executable is a stand-in for the Highlight jar (see benchmarks/stub_highlight.py)
+    if HIGHLIGHT_EXE.endswith('.py'):
+        return [sys.executable, HIGHLIGHT_EXE]
+    return ['java', '-jar', HIGHLIGHT_EXE]
+
+def archive_folders(source_path, ARCHIVES):
+    # src_dir/<repo> of each repository placed in the application, src_dir/<org>/<repo> when option 4
+    # placed <org>/<repo> repositories of several organizations
+    folders = []
+    for name in os.listdir(source_path):
+        folder = os.path.join(ARCHIVES, name)
+        if os.path.isdir(folder) and not os.path.isfile(os.path.join(folder, name + '.zip')) and os.path.isdir(os.path.join(source_path, name)):
+            folders += [os.path.join(folder, repo_name) for repo_name in os.listdir(os.path.join(source_path, name))]
+        else:
+            folders.append(folder)
+    return folders
+
+def reclaim_sources(app_name, source_path, ARCHIVES):
+    # The results are uploaded, the application folder and the archives of its repositories are not needed anymore
+    paths = [source_path]
+    if ARCHIVES and os.path.isdir(source_path):
+        paths += archive_folders(source_path, ARCHIVES)
+    freed = DiskBudget.reclaim(paths)
+    logging.info(f'Reclaimed {freed / (1024 * 1024):.1f} MB of intermediate copies of {app_name}.')
+    print(f'Reclaimed {freed / (1024 * 1024):.1f} MB of intermediate copies of {app_name}.')
+
+def process_application(app_name, app_id, log_file, output_txt_file, output_csv_file, SOURCES, HIGHLIGHT_EXE, ANALYZER_DIR, PERL, URL, TOKEN, COMPANY_ID, IGNORED_DIR, IGNORED_PATHS, IGNORED_FILES, RESULTS, RECLAIM=False, ARCHIVES=None, DEFERRED_UPLOAD=False, uploader=None):
+    # uploader (ResultUpload.Uploader): Uploads the results the command line saved right after the scan
+    # (inline mode), a failed upload is then attempted again without analyzing the application again.
+    # Without it the command line uploads the results itself.
+    source_path = os.path.join(SOURCES, f'{app_name}')
+    zip_file = ResultUpload.result_zip(RESULTS, app_name)
+    saved = DEFERRED_UPLOAD or uploader is not None
     try:
         if os.path.exists(log_file):
             os.remove(log_file)
 
-        source_path = os.path.join(SOURCES, f'{app_name}')
-        def check_files(source_path):
-            for file in os.listdir(source_path):
-                return True
-            return False
-
-        if os.path.exists(source_path) and check_files(source_path):
+        if Preflight.has_entries(source_path):
             logging.info(f'Analysing Application: {app_name} ......')
             print(f'Analysing Application: {app_name} .....')
-            completed_process = subprocess.run([
-                'java', '-jar', HIGHLIGHT_EXE,
+            command = highlight_command(HIGHLIGHT_EXE) + [
                 '--workingDir=' + os.path.join(RESULTS, f'{app_name}'),
                 '--sourceDir=' + source_path,
                 '--analyzerDir=' + ANALYZER_DIR,
@@ -151,14 +148,27 @@ def process_application(app_name, app_id, log_file, output_txt_file, output_csv_
                 '--ignoreDirectories=' + IGNORED_DIR,
                 '--ignorePaths=' + IGNORED_PATHS,
                 '--ignoreFiles=' + IGNORED_FILES
-            ], check=True, capture_output=True, text=True)
+            ]
+            if saved:
+                # Results are saved for ResultUpload instead of being uploaded by the command line
+                command += ['--skipUpload', '--zipResult=' + zip_file]
+            completed_process = subprocess.run(command, check=True, capture_output=True, text=True)
 
             if completed_process.returncode == 0:
                 status = "Passed"
-                reason = "Application processed successfully"
+                reason = "Application analyzed, results saved for upload" if DEFERRED_UPLOAD else "Application processed successfully"
                 logging.info(f'Analysed Application: {app_name}.\n')
                 print(f'Analysed Application: {app_name}.\n')
                 start_time, end_time, execution_time = calculate_execution_time(log_file)
+                if uploader and not DEFERRED_UPLOAD:
+                    # Attempted again by the uploader on failure, queued at the upload stage when it still fails
+                    result = uploader.upload(app_name, app_id)
+                    if result['status'] != 'Uploaded':
+                        status = "Failed"
+                        reason = f"{UPLOAD_FAILED}: {result['reason']}"
+                elif RECLAIM and not saved:
+                    # Uploaded by the command line. Saved results are reclaimed by the uploader once it uploaded them
+                    reclaim_sources(app_name, source_path, ARCHIVES)
             else:
                 status = "Failed"
                 reason = return_code_messages.get(completed_process.returncode, f"Unknown return code: {completed_process.returncode}")
@@ -181,19 +191,70 @@ def process_application(app_name, app_id, log_file, output_txt_file, output_csv_
         # logging.error('Application processing failed.')
         start_time, end_time, execution_time = calculate_execution_time(log_file)
 
+    row = [app_name, status, reason, log_file, start_time, end_time, execution_time]
+    write_summary_row(output_txt_file, output_csv_file, row)
+    return row
+
+def scan_failure(row):
+    # None for a passed summary row, or when only the upload of the saved results failed (queued by the
+    # Uploader at the upload stage). (reason, FailureQueue kind) otherwise, the analysis is run again.
+    if row[1] == 'Passed' or row[2].startswith(UPLOAD_FAILED):
+        return None
+    transient = row[2] in [return_code_messages[return_code] for return_code in FailureQueue.TRANSIENT_RETURN_CODES]
+    return (row[2], FailureQueue.TRANSIENT if transient else FailureQueue.PERMANENT)
+
+def write_summary_row(output_txt_file, output_csv_file, row):
     # Write output data to CSV
     with open(output_csv_file, 'a', newline='') as csvfile:
         writer = csv.writer(csvfile)
-        writer.writerow([app_name, status, reason, log_file, start_time, end_time, execution_time])
+        writer.writerow(row)
 
     # Write output data to txt
     with open(output_txt_file, 'a', newline='') as txtfile:
         writer = csv.writer(txtfile)
-        writer.writerow([app_name, status, reason, log_file, start_time, end_time, execution_time])
+        writer.writerow(row)
+
+def prescan_applications(applications, settings, output_txt_file, output_csv_file):
+    """
+    Takes the source inventory of the applications before any scan, records it in the repository
+    catalog and writes a Skipped summary row for the applications with no file left to analyze.
+    Parameters:
+        applications (list): [app_name, app_id] pairs.
+        settings (Settings): The settings of the run.
+    Returns:
+        tuple: (applications to scan, app_name -> bytes to analyze).
+    """
+    inventories = SourceInventory.take_inventory([app_name for app_name, app_id in applications], settings.src_dir_analyze, settings,
+                                                 settings.inventory_workers or SourceInventory.DEFAULT_INVENTORY_WORKERS)
+    if settings.output_dir and settings.summary_name():
+        RepoCatalog.record_inventory(RepoCatalog.org_catalog_path(settings.output_dir, settings.summary_name()), inventories.values())
+
+    scannable = []
+    for app_name, app_id in applications:
+        inventory = inventories.get(app_name)
+        if inventory:
+            logging.info(f'Inventory of {app_name}: {SourceInventory.describe(inventory)}')
+        if SourceInventory.has_nothing_to_scan(inventory):
+            logging.warning(f'Skipped Application: {app_name}, no file to analyze.')
+            print(f'Skipped Application: {app_name}, no file to analyze.')
+            write_summary_row(output_txt_file, output_csv_file, [app_name, 'Skipped', 'No file to analyze', 'N/A', 'N/A', 'N/A', 'N/A'])
+            continue
+        scannable.append([app_name, app_id])
+    costs = {app_name: inventory['bytes'] for app_name, inventory in inventories.items() if inventory}
+    return scannable, costs
+
+def balance_batches(applications, num_batches, costs):
+    # Largest applications first, each to the batch with the fewest source bytes so far
+    batches = [[] for i in range(num_batches)]
+    totals = [0] * num_batches
+    for application in sorted(applications, key=lambda application: -costs.get(application[0], 0)):
+        i = totals.index(min(totals))
+        batches[i].append(application)
+        totals[i] += costs.get(application[0], 0)
+    return batches
 
-def process_batch(batch, thread_id, output_txt_file, output_csv_file, RESULTS, SOURCES, HIGHLIGHT_EXE, ANALYZER_DIR, PERL, URL, TOKEN, COMPANY_ID, IGNORED_DIR, IGNORED_PATHS, IGNORED_FILES):
-    thread_log_file = f"thread_{thread_id}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.log"
-    logging.basicConfig(filename=thread_log_file, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+def process_batch(batch, thread_id, output_txt_file, output_csv_file, RESULTS, SOURCES, HIGHLIGHT_EXE, ANALYZER_DIR, PERL, URL, TOKEN, COMPANY_ID, IGNORED_DIR, IGNORED_PATHS, IGNORED_FILES, RECLAIM=False, ARCHIVES=None, queue=None, uploader=None, DEFERRED_UPLOAD=False):
+    # Records go through the queue handler installed by main(), tagged with the thread name and app
     logging.info(f'Thread {thread_id} started.')
     start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     logging.info(f'Thread {thread_id} start time: {start_time}')
@@ -201,45 +262,73 @@ def process_batch(batch, thread_id, output_txt_file, output_csv_file, RESULTS, S
 
     for app_name, app_id in batch:
         #log_file = os.path.join(LOG_FOLDER, f'HLAutomation_{app_name}.log')
-        log_file = os.path.join(RESULTS, rf'{app_name}\HLAutomation.log')
-        process_application(app_name, app_id, log_file, output_txt_file, output_csv_file, SOURCES, HIGHLIGHT_EXE, ANALYZER_DIR, PERL, URL, TOKEN, COMPANY_ID, IGNORED_DIR, IGNORED_PATHS, IGNORED_FILES, RESULTS)
+        log_file = os.path.join(RESULTS, app_name, 'HLAutomation.log')
+        with LogRouter.app_context(app_name):
+            # Analyzed once, a failed upload is attempted again by the uploader from the saved results
+            # (right away in inline mode, on its pool in deferred mode)
+            row = process_application(app_name, app_id, log_file, output_txt_file, output_csv_file, SOURCES, HIGHLIGHT_EXE, ANALYZER_DIR, PERL, URL, TOKEN, COMPANY_ID, IGNORED_DIR, IGNORED_PATHS, IGNORED_FILES, RESULTS, RECLAIM, ARCHIVES, DEFERRED_UPLOAD, None if DEFERRED_UPLOAD else uploader)
+            failure = scan_failure(row)
+            if queue and failure:
+                queue.record('scan', f"{app_name};{app_id}", *failure)
+            elif queue:
+                queue.resolve('scan', f"{app_name};{app_id}")
+            if DEFERRED_UPLOAD and failure is None:
+                # Uploaded while the thread goes on with the next application
+                uploader.submit(app_name, app_id)
 
     end_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     logging.info(f'Thread {thread_id} end time: {end_time}')
     logging.info(f'Thread {thread_id} finished.')
 
 
-def main():
+def main(settings=None, profile=False, only_apps=None):
+    # With profile, cProfile and tracemalloc output of the run and of each batch thread go next to the logs
+    # only_apps limits the run to those application names (CASTHL_Automation --retry-failed)
+    if profile:
+        settings = settings or Settings.load_settings()
+        with Profiling.profiling(settings.logs_dir, 'HLScanAndOnboard'):
+            return run_scans(settings, only_apps)
+    return run_scans(settings, only_apps)
 
+def run_scans(settings=None, only_apps=None):
+
+    listener = None
+    # Uploads the saved results of the scans on a pool of its own
+    uploader = None
     try:
-        # Read properties from the config file
-        properties = read_properties_file(r'../Config/config.properties')
+        # Parsed once per process, CASTHL_Automation passes the settings it already has
+        settings = settings or Settings.load_settings()
 
         # Extract properties
-        PERL = properties.get('highlight_perl_dir')
-        ANALYZER_DIR = properties.get('highlight_analyzer_dir')
-        SOURCES = properties.get('src_dir_analyze')
-        IGNORED_DIR = properties.get('IGNORED_DIR')
-        IGNORED_PATHS = properties.get('IGNORED_PATHS')
-        IGNORED_FILES = properties.get('IGNORED_FILES')
-        URL = properties.get('highlight_base_url')
-        HIGHLIGHT_EXE = properties.get('highlight_executable')
-        LOG_FOLDER = properties.get('logs_dir')
-        COMPANY_ID = properties.get('highlight_company_id')
-        TOKEN = properties.get('highlight_token')
-        CONFIG = properties.get('config_dir')
-        RESULTS = properties.get('RESULTS')
-        APPLICATIONS_FILE_PATH = properties.get('highlight_application_mapping')
-        BATCH_SIZE = int(properties.get('BATCH_SIZE', 1))  # Default batch size is 1
-        MAX_BATCHES = properties.get('MAX_BATCHES')
+        PERL = settings.highlight_perl_dir
+        ANALYZER_DIR = settings.highlight_analyzer_dir
+        SOURCES = settings.src_dir_analyze
+        IGNORED_DIR, IGNORED_PATHS, IGNORED_FILES = settings.ignore_arguments()
+        URL = settings.highlight_base_url
+        HIGHLIGHT_EXE = settings.highlight_executable
+        LOG_FOLDER = settings.logs_dir
+        COMPANY_ID = settings.highlight_company_id
+        TOKEN = settings.highlight_token
+        CONFIG = settings.config_dir
+        RESULTS = settings.results_dir
+        APPLICATIONS_FILE_PATH = settings.highlight_application_mapping
+        BATCH_SIZE = settings.batch_size or 1  # Default batch size is 1
+        MAX_BATCHES = settings.max_batches
+        PER_APP_LOGS = settings.per_app_logs
+        RECLAIM = settings.reclaim_after_upload
+        ARCHIVES = settings.src_dir
 
         datetime_now = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        # Scans that still fail after their attempts are queued for CASTHL_Automation --retry-failed
+        queue = FailureQueue.open_queue(settings)
+
         # Set up logging
         log_file = os.path.join(LOG_FOLDER, f"script_log_{datetime_now}.log")
-        logging.basicConfig(filename=log_file, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        per_app_dir = os.path.join(LOG_FOLDER, 'AppLogs') if PER_APP_LOGS else None
+        listener = LogRouter.start_queue_logging(log_file, per_app_dir)
 
         # Validate config properties
-        validate_config(properties)
+        validate_config(settings)
 
         # Check if the APPLICATIONS_FILE_PATH is specified
         if APPLICATIONS_FILE_PATH is None:
@@ -271,8 +360,23 @@ def main():
         with open(APPLICATIONS_FILE_PATH, 'r') as file:
             applications = [line.strip().split(';') for line in file]
             applications = applications[1:]
+            if only_apps is not None:
+                applications = [application for application in applications if application[0] in only_apps]
             # print(applications)
 
+            # All application folders are checked in one pass, the ones that would fail at once are not scanned
+            applications, preflight_rows, preflight_file = Preflight.run_preflight(applications, settings)
+            for app_name, app_id, status, reason in preflight_rows:
+                if status == 'Fail':
+                    logging.error(f'Pre-flight failed for Application: {app_name} - {reason}')
+                    write_summary_row(output_txt_file, output_csv_file, [app_name, 'Failed', reason, 'N/A', 'N/A', 'N/A', 'N/A'])
+                    if queue:
+                        queue.record('scan', f"{app_name};{app_id}", reason, FailureQueue.PERMANENT)
+                elif status == 'Warning':
+                    logging.warning(f'Pre-flight warning for Application: {app_name} - {reason}')
+            logging.info(f'{Preflight.summary(preflight_rows)}, report: {preflight_file}')
+            print(f'{Preflight.summary(preflight_rows)}. Report written to {preflight_file}')
+
             duplicates = check_duplicate_app_ids(applications)
             if duplicates:
                 logging.error(f'Duplicate Application IDs Found......')
@@ -283,6 +387,11 @@ def main():
                 print("Program stopped Because Duplicate Application IDs Found!")
                 raise ValueError("Program stopped Because Duplicate Application IDs Found!")
 
+        # Applications with nothing to analyze never get a scan slot, the others are balanced on their size
+        costs = None
+        if settings.prescan_inventory:
+            applications, costs = prescan_applications(applications, settings, output_txt_file, output_csv_file)
+
         # Record start time
         start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         logging.info(f'Start Time: {start_time}')
@@ -294,19 +403,23 @@ def main():
         if (MAX_BATCHES != None) and (MAX_BATCHES != '') and (num_batches > int(MAX_BATCHES)):
             num_batches = int(MAX_BATCHES)
             batches = create_fixed_batches(applications, num_batches)
-            for i, batch in enumerate(batches):
-                print(f"Batch {i+1}: {batch}\n")           
         else:
             num_threads = BATCH_SIZE
             num_batches = (len(applications) + num_threads - 1) // num_threads
             batches = [applications[i * num_threads:min((i + 1) * num_threads, len(applications))] for i in range(num_batches)]
-            for i, batch in enumerate(batches):
-                print(f"Batch {i+1}: {batch}\n") 
+        if costs:
+            batches = balance_batches(applications, num_batches, costs)
+        for i, batch in enumerate(batches):
+            print(f"Batch {i+1}: {batch}\n")
+
+        # Uploads the result zips the scans save, on its pool in deferred mode, right after each scan in inline mode
+        uploader = ResultUpload.Uploader(settings, queue)
+        DEFERRED_UPLOAD = settings.upload_mode == 'deferred'
 
         # Process batches using multi-threading
         threads = []
         for i, batch in enumerate(batches, start=1):
-            thread = threading.Thread(target=process_batch, args=(batch, i, output_txt_file, output_csv_file, RESULTS, SOURCES, HIGHLIGHT_EXE, ANALYZER_DIR, PERL, URL, TOKEN, COMPANY_ID, IGNORED_DIR, IGNORED_PATHS, IGNORED_FILES))
+            thread = threading.Thread(name=f'Batch-{i}', target=Profiling.profiled('scan-batch', process_batch), args=(batch, i, output_txt_file, output_csv_file, RESULTS, SOURCES, HIGHLIGHT_EXE, ANALYZER_DIR, PERL, URL, TOKEN, COMPANY_ID, IGNORED_DIR, IGNORED_PATHS, IGNORED_FILES, RECLAIM, ARCHIVES, queue, uploader, DEFERRED_UPLOAD))
             threads.append(thread)
             thread.start()
 
@@ -317,9 +430,24 @@ def main():
         # Record end time
         end_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         logging.info(f'End Time: {end_time}')
+        if uploader:
+            uploader.close(LOG_FOLDER, datetime_now)
+            uploader = None
+        if queue:
+            queue.write_dead_letter_report('scan', LOG_FOLDER, datetime_now)
+            queue.write_dead_letter_report('upload', LOG_FOLDER, datetime_now)
 
     except Exception as e:
         logging.error(f'{e}')
 
+    finally:
+        if uploader is not None:
+            # Uploads already started are finished, whatever stopped the scans
+            uploader.close(LOG_FOLDER, datetime_now)
+        if listener is not None:
+            LogRouter.stop_queue_logging(listener)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = ArgumentParser(description="Runs the Highlight analysis and upload of the applications of applications.txt.")
+    parser.add_argument('-profile', '--profile', action='store_true', help='Write cProfile and tracemalloc output of the run next to the logs')
+    main(profile=parser.parse_args().profile)
\ No newline at end of file
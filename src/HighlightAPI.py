@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Cached responses are reused for one hour unless a caller asks for a refresh
+DEFAULT_CACHE_TTL = 3600
+DEFAULT_POOL_SIZE = 10
+
+# One pooled session per server and token, shared by every thread of the process
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(base_url, token, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Returns the pooled session for a Highlight server, creating it on first use.
+    Parameters:
+        base_url (str): The Highlight server URL, e.g. https://app.casthighlight.com.
+        token (str): The Highlight bearer token.
+        pool_size (int): The number of keep-alive connections kept per host.
+    Returns:
+        requests.Session: A session with retry/backoff on transient errors.
+    """
+    key = (base_url.rstrip('/'), token)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            retry = Retry(total=5, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504],
+                          allowed_methods=['GET', 'HEAD', 'PUT', 'DELETE'], respect_retry_after_header=True)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json",
+                "Accept": "application/json"
+            })
+            _sessions[key] = session
+        return session
+
+
+def _cache_file(cache_dir, url, token):
+    # The token is part of the key, two accounts can see different portfolios
+    key = hashlib.sha256(f"{token}|{url}".encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def get_json(base_url, token, path, cache_dir=None, ttl=DEFAULT_CACHE_TTL, refresh=False):
+    """
+    GETs a Highlight REST resource, served from the disk cache while it is fresh.
+    Parameters:
+        base_url (str): The Highlight server URL.
+        token (str): The Highlight bearer token.
+        path (str): The resource path, e.g. /WS2/domains/1234/applications.
+        cache_dir (str): Folder for cached responses, or None to disable caching.
+        ttl (int): Maximum age of a cached response in seconds.
+        refresh (bool): Ignore the cached response and download it again.
+    Returns:
+        object: The decoded JSON response.
+    """
+    url = f"{base_url.rstrip('/')}{path}"
+    cache_file = _cache_file(cache_dir, url, token) if cache_dir else None
+
+    if cache_file and not refresh:
+        try:
+            if time.time() - os.path.getmtime(cache_file) < ttl:
+                with open(cache_file, 'r', encoding='utf-8') as file:
+                    return json.load(file)
+        except (OSError, ValueError):
+            pass
+
+    response = get_session(base_url, token).get(url, timeout=(10, 300))
+    response.raise_for_status()
+    data = response.json()
+
+    if cache_file:
+        # Write to a temporary file first so a concurrent reader never sees half a response
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(temp_file, cache_file)
+    return data
+
+
+def get_applications(base_url, token, company_id, cache_dir=None, ttl=DEFAULT_CACHE_TTL, refresh=False):
+    # All applications of the company, with their metrics
+    return get_json(base_url, token, f"/WS2/domains/{company_id}/applications", cache_dir, ttl, refresh)
+
+
+def get_app_loc_records(base_url, token, company_id, cache_dir=None, ttl=DEFAULT_CACHE_TTL, refresh=False):
+    """
+    Lists the lines of code of every application of the company.
+    Returns:
+        list: [ID, Name, Total Lines of Code] records, applications without results are skipped.
+    """
+    records = []
+    for app in get_applications(base_url, token, company_id, cache_dir, ttl, refresh):
+        try:
+            # Assuming we use the first set of metrics
+            records.append([app['id'], app['name'], app['metrics'][0]['totalLinesOfCode']])
+        except (KeyError, IndexError):
+            print(f"No results found for application {app.get('name')}.")
+    return records
+
+
+def post_json(base_url, token, path, payload):
+    # POSTs are not retried by the session, creating a resource twice is worse than failing once
+    url = f"{base_url.rstrip('/')}{path}"
+    response = get_session(base_url, token).post(url, json=payload, timeout=(10, 120))
+    response.raise_for_status()
+    return response.json() if response.content else None
+
+
+def get_domains(base_url, token, company_id, cache_dir=None, ttl=DEFAULT_CACHE_TTL, refresh=False):
+    # Sub-domains of the company domain
+    return get_json(base_url, token, f"/WS2/domains/{company_id}/domains", cache_dir, ttl, refresh)
+
+
+def create_domain(base_url, token, parent_id, name):
+    """
+    Creates a domain under parent_id.
+    Returns:
+        object: The created domain, as returned by the server.
+    """
+    return post_json(base_url, token, f"/WS2/domains/{parent_id}/domains", {"name": name})
+
+
+def create_application(base_url, token, domain_id, name):
+    """
+    Creates an application in domain_id.
+    Returns:
+        object: The created application, as returned by the server.
+    """
+    return post_json(base_url, token, f"/WS2/domains/{domain_id}/applications", {"name": name})
+
+
+def check_records(data, path):
+    # A listing is relied upon only once it looks like one: a list of objects with an id and a name
+    if not isinstance(data, list) or not all(isinstance(item, dict) and 'id' in item and 'name' in item for item in data):
+        raise ValueError(f"Unexpected response from {path}, expected a list of objects with an id and a name")
+    return data
+
+
+def created_id(response, name=None):
+    # The server answers with the created object, or a one element list of it
+    if isinstance(response, list):
+        response = response[0] if response else {}
+    if name is not None and response.get('name', name) != name:
+        raise ValueError(f"Server answered with '{response.get('name')}' for '{name}'")
+    return str(response['id'])
@@ -1,9 +1,9 @@
 import csv
 import requests
 import os
-import shutil
 import datetime
 import json
+from argparse import ArgumentParser
 
 def list_organization_repos(org_name, access_token, output_type):
     url = f"https://api.github.com/orgs/{org_name}/repos"
@@ -67,29 +67,26 @@ def write_to_csv(data, filename):
 
 import datetime
 
-def checkout_master_branch(org_name, repo_name, access_token, destination_path):
-    url = f"https://api.github.com/repos/{org_name}/{repo_name}/tarball/master"
-    headers = {
-        'Authorization': f'token {access_token}'
-    }
-    try:
-        start_time = datetime.datetime.now()
-        response = requests.get(url, headers=headers, stream=True)
-        end_time = datetime.datetime.now()
-        
-        if response.status_code == 200:
-            with open(os.path.join(destination_path, f"{repo_name}_master.tar.gz"), 'wb') as f:
-                shutil.copyfileobj(response.raw, f)
-            print(f"Master branch of {repo_name} has been checked out to {destination_path}.")
-        else:
-            print(f"Failed to checkout master branch of {repo_name}. Status code: {response.status_code}")
-        
-        # Write to log file
-        with open('download_log.txt', 'a') as log_file:
-            log_file.write(f"{repo_name} | {start_time} | {end_time}\n")
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to download {repo_name}. Error: {e}")
+def checkout_master_branch(org_name, repo_name, access_token, destination_path, branch=None):
+    """
+    Checks out a branch of a repository to destination_path/<repo_name>, the tarball is extracted
+    while it downloads. Without branch GitHub serves the repository's default_branch.
+    """
+    import TarballStream
+    url = f"https://api.github.com/repos/{org_name}/{repo_name}/tarball" + (f"/{branch}" if branch else '')
+    start_time = datetime.datetime.now()
+    result = TarballStream.stream_extract(url, os.path.join(destination_path, repo_name), access_token)
+    end_time = datetime.datetime.now()
+
+    if result['status'] == 'Failed':
+        print(f"Failed to checkout {branch or 'default branch'} of {repo_name}. {result['reason']}")
         print(f"Moving to the next repository.")
+    else:
+        print(f"{branch or 'Default branch'} of {repo_name} has been checked out to {destination_path} ({result['files']} files).")
+
+    # Write to log file
+    with open('download_log.txt', 'a') as log_file:
+        log_file.write(f"{repo_name} | {start_time} | {end_time}\n")
       
 def get_all_repo_metadata(org_name, access_token):
     start_time = datetime.datetime.now()
@@ -168,17 +165,31 @@ def get_single_repo_metadata(org_name, repo_name):
         for message in log_messages:
             log_file.write(message + "\n")
 
+def parse_organizations(value, default_token):
+    # "org-a, org-b:token-b" -> [(org-a, default_token), (org-b, token-b)]
+    organizations = []
+    for item in value.split(','):
+        org_name, separator, token = item.strip().partition(':')
+        if org_name:
+            organizations.append((org_name, token.strip() if separator and token.strip() else default_token))
+    return organizations
+
 def main():
-    
-    ORG_NAME = input("Enter the name of the GitHub organization: ")
-    ACCESS_TOKEN = input("Enter GitHub access token: ")
+    parser = ArgumentParser(description="Lists and downloads the repositories of GitHub organizations.")
+    parser.add_argument('--orgs', help='Comma separated organizations, org:token for an organization with its own token. Prompted for when omitted')
+    parser.add_argument('--token', help='GitHub access token of the organizations without their own. Prompted for when omitted')
+    args = parser.parse_args()
+
+    ORG_NAMES = args.orgs or input("Enter the name of the GitHub organization (several separated by commas): ")
+    ACCESS_TOKEN = args.token or input("Enter GitHub access token: ")
+    ORGANIZATIONS = parse_organizations(ORG_NAMES, ACCESS_TOKEN)
     GITAPI_URL = "https://api.github.com/orgs/CAST-Extend/repos"
     
     while True:
         print("Select options:")
         print("1. Get name of all GitHub repositories in an organization")
         print("2. Get name & size of all GitHub repositories in an organization")
-        print("3. Checkout master branch of each repository to a physical drive location")
+        print("3. Checkout the default branch of each repository to a physical drive location")
         print("4. Download GitHub organization metadata")
         print("5. Download GitHub organization metadata for single repository")
 
@@ -191,7 +202,14 @@ def main():
 
     output_type = int(choice)
     if output_type in [1, 2]:
-        output = list_organization_repos(ORG_NAME, ACCESS_TOKEN, output_type)
+        output = []
+        for ORG_NAME, ORG_TOKEN in ORGANIZATIONS:
+            org_output = list_organization_repos(ORG_NAME, ORG_TOKEN, output_type) or []
+            if len(ORGANIZATIONS) > 1:
+                # Repositories of several organizations are named <org>/<repo>
+                for row in org_output:
+                    row['Repo_name'] = f"{ORG_NAME}/{row['Repo_name']}"
+            output.extend(org_output)
         if output:
             if output_type == 2:
                 output_filename = "Repo-output.csv"
@@ -211,13 +229,24 @@ def main():
                 print(f"An error occurred while writing to the file: {e}")
     elif output_type == 3:
         destination_path = input("Enter the destination path to checkout the repositories: ")
-        for repo in list_organization_repos(ORG_NAME, ACCESS_TOKEN, 1):
-            checkout_master_branch(ORG_NAME, repo['Repo_name'], ACCESS_TOKEN, destination_path)
+        for ORG_NAME, ORG_TOKEN in ORGANIZATIONS:
+            # One folder per organization when there are several, their repositories may share names
+            org_destination_path = os.path.join(destination_path, ORG_NAME) if len(ORGANIZATIONS) > 1 else destination_path
+            os.makedirs(org_destination_path, exist_ok=True)
+            for repo in list_organization_repos(ORG_NAME, ORG_TOKEN, 1) or []:
+                checkout_master_branch(ORG_NAME, repo['Repo_name'], ORG_TOKEN, org_destination_path)
     elif output_type == 4:
-         get_all_repo_metadata(ORG_NAME, ACCESS_TOKEN)
+        if len(ORGANIZATIONS) == 1:
+            get_all_repo_metadata(ORGANIZATIONS[0][0], ORGANIZATIONS[0][1])
+        else:
+            # Harvested concurrently into <org>_Repositories_Metadata.json, sharing the rate limit budget
+            import GitHubHarvest
+            stats = GitHubHarvest.harvest_organizations(ORGANIZATIONS, "https://api.github.com", os.getcwd())
+            GitHubHarvest.write_stats(stats, "harvest_stats.csv")
     elif output_type == 5:
-        repo_name = input("Enter the name of the repository: ")
-        get_single_repo_metadata(ORG_NAME, repo_name)
+        repo_name = input("Enter the name of the repository (<org>/<repo> when there are several organizations): ")
+        ORG_NAME, separator, repo_name = repo_name.rpartition('/')
+        get_single_repo_metadata(ORG_NAME or ORGANIZATIONS[0][0], repo_name)
     else:
         print("Invalid choice.")
 
@@ -0,0 +1,113 @@
+import os
+import queue
+import logging
+import logging.handlers
+import contextvars
+from contextlib import contextmanager
+
+# Application currently being processed by the calling thread
+current_app = contextvars.ContextVar('current_app', default='-')
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - [%(threadName)s] [%(app)s] - %(message)s'
+APP_LOG_FORMAT = '%(asctime)s - %(levelname)s - [%(threadName)s] - %(message)s'
+
+
+class AppContextFilter(logging.Filter):
+    """
+    Tags every record with the application name set through app_context().
+    Runs in the producing thread, before the record is put on the queue.
+    """
+    def filter(self, record):
+        if not hasattr(record, 'app'):
+            record.app = current_app.get()
+        return True
+
+
+class PerAppFileHandler(logging.Handler):
+    """
+    Writes each tagged record to <log_dir>/<app>.log. Only the queue listener
+    thread calls emit(), so the per-app files are never contended.
+    """
+    def __init__(self, log_dir, suffix):
+        super().__init__()
+        self.log_dir = log_dir
+        self.suffix = suffix
+        self.handlers = {}
+
+    def emit(self, record):
+        app = getattr(record, 'app', '-')
+        if app == '-':
+            return
+        handler = self.handlers.get(app)
+        if handler is None:
+            log_file = os.path.join(self.log_dir, f"{app}_{self.suffix}.log")
+            handler = logging.FileHandler(log_file, encoding='utf-8')
+            handler.setFormatter(self.formatter)
+            self.handlers[app] = handler
+        handler.emit(record)
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        self.handlers.clear()
+        super().close()
+
+
+def start_queue_logging(log_file, per_app_dir=None, level=logging.INFO):
+    """
+    Routes the root logger through a queue to a single listener thread.
+    Parameters:
+        log_file (str): The path to the main script log file.
+        per_app_dir (str): Folder for one log file per application, or None to disable.
+        level (int): The root logger level.
+    Returns:
+        QueueListener: The started listener, to be passed to stop_queue_logging().
+    """
+    log_queue = queue.SimpleQueue()
+
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers = [file_handler]
+
+    if per_app_dir:
+        os.makedirs(per_app_dir, exist_ok=True)
+        suffix = os.path.splitext(os.path.basename(log_file))[0]
+        app_handler = PerAppFileHandler(per_app_dir, suffix)
+        app_handler.setFormatter(logging.Formatter(APP_LOG_FORMAT))
+        handlers.append(app_handler)
+
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(AppContextFilter())
+
+    # Replace whatever basicConfig or an earlier run left on the root logger
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+        handler.close()
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_queue_logging(listener):
+    # Flush everything still queued, then release the file handles
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        if isinstance(handler, logging.handlers.QueueHandler):
+            root_logger.removeHandler(handler)
+
+
+@contextmanager
+def app_context(app_name):
+    # Tag all records logged by this thread with app_name until the block exits
+    token = current_app.set(app_name)
+    try:
+        yield
+    finally:
+        current_app.reset(token)
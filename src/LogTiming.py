@@ -0,0 +1,80 @@
+import os
+import mmap
+from datetime import datetime
+
+# HLAutomation.log lines start with "YYYY-mm-dd HH:MM:SS,fff"
+TIMESTAMP_LENGTH = 23
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S,%f"
+TAIL_BLOCK_SIZE = 64 * 1024
+
+
+def parse_line_timestamp(line):
+    """
+    Parses the timestamp at the start of a log line.
+    Parameters:
+        line (bytes): A raw log line.
+    Returns:
+        datetime: The timestamp, or None if the line does not start with one.
+    """
+    try:
+        return datetime.strptime(line[:TIMESTAMP_LENGTH].decode('utf-8'), TIMESTAMP_FORMAT)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _iter_lines_backward(file):
+    # Yield lines from the end of the file, mapping it when possible
+    size = os.fstat(file.fileno()).st_size
+    if size == 0:
+        return
+    try:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            end = size
+            while end > 0:
+                start = mapped.rfind(b'\n', 0, end - 1) + 1
+                yield mapped[start:end]
+                end = start
+        return
+    except (OSError, ValueError):
+        pass
+
+    # Fall back to reading fixed size blocks from the end
+    buffer = b''
+    position = size
+    while position > 0:
+        read_size = min(TAIL_BLOCK_SIZE, position)
+        position -= read_size
+        file.seek(position)
+        buffer = file.read(read_size) + buffer
+        lines = buffer.split(b'\n')
+        buffer = lines.pop(0)
+        for line in reversed(lines):
+            yield line
+    yield buffer
+
+
+def read_first_and_last_timestamps(log_file_path):
+    """
+    Reads the first timestamped line and seeks backward from EOF for the last one.
+    Parameters:
+        log_file_path (str): The path to the HLAutomation.log file.
+    Returns:
+        tuple: (start_time, end_time) as datetime objects.
+    """
+    with open(log_file_path, 'rb') as file:
+        start_time = None
+        for line in file:
+            start_time = parse_line_timestamp(line)
+            if start_time:
+                break
+
+        end_time = None
+        for line in _iter_lines_backward(file):
+            end_time = parse_line_timestamp(line)
+            if end_time:
+                break
+
+    if start_time is None or end_time is None:
+        raise ValueError(f"No timestamped lines found in {log_file_path}")
+    return start_time, end_time
+
@@ -0,0 +1,164 @@
+# Pre-flight of option 5: every application of applications.txt is checked against one scan of
+# src_dir_analyze and against the App-Repo mapping before any Highlight JVM is started.
+# Applications that would fail at once are reported and never given a scan slot.
+#
+#     python Preflight.py
+import os
+import csv
+from datetime import datetime
+from argparse import ArgumentParser
+import RepoCatalog
+import AppRepoMapping
+import Settings
+
+REPORT_HEADER = ['Application Name', 'Application ID', 'Status', 'Reason']
+
+
+def has_entries(path):
+    # Stops at the first entry instead of listing the whole folder
+    try:
+        with os.scandir(path) as entries:
+            return next(entries, None) is not None
+    except OSError:
+        return False
+
+
+def list_application_folders(sources_dir):
+    """
+    Scans src_dir_analyze once.
+    Returns:
+        dict: Folder name -> names of its top level entries (the repositories placed by option 4).
+    """
+    folders = {}
+    with os.scandir(sources_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                try:
+                    with os.scandir(entry.path) as children:
+                        folders[entry.name] = {child.name for child in children}
+                except OSError:
+                    folders[entry.name] = set()
+    return folders
+
+
+def is_case_sensitive(sources_dir, folders):
+    # Looks a folder up under its name in the other case, as the scan will on this file system
+    for name in folders:
+        if name.swapcase() != name and name.swapcase() not in folders:
+            return not os.path.isdir(os.path.join(sources_dir, name.swapcase()))
+    return os.path.normcase('A') != os.path.normcase('a')
+
+
+def read_mapped_repositories(settings):
+    """
+    Returns:
+        dict: Application folder name -> repository names of the App-Repo mapping, None without a mapping.
+    """
+    mapping_sheet = settings.app_repo_mapping
+    if not mapping_sheet or not os.path.isfile(mapping_sheet):
+        return None
+    summary_csv = os.path.join(settings.output_dir or '', f"{settings.summary_name()}_Repositories_Summary.csv")
+    if settings.output_dir and settings.summary_name() and os.path.isfile(summary_csv):
+        # Read from the catalog, the spreadsheet is only parsed again when it changes
+        rows = [(app, repo) for app, repo, domain in RepoCatalog.load_catalog(summary_csv, mapping_sheet).app_repos]
+    else:
+        rows = AppRepoMapping.read_mapping_rows(mapping_sheet)
+    mapped = {}
+    for app_name, repo_name in rows:
+        if AppRepoMapping.is_missing(app_name) or AppRepoMapping.is_missing(repo_name):
+            continue
+        mapped.setdefault(AppRepoMapping.clean_folder_name(str(app_name)), set()).add(str(repo_name))
+    return mapped
+
+
+def check_applications(applications, folders, mapped=None, case_sensitive=True):
+    """
+    Parameters:
+        applications (list): The lines of applications.txt split on ';', without the header.
+        folders (dict): list_application_folders of src_dir_analyze.
+        mapped (dict): read_mapped_repositories, or None.
+        case_sensitive (bool): is_case_sensitive of src_dir_analyze, a folder that only differs in case fails only then.
+    Returns:
+        list: [app_name, app_id, status, reason] rows, status is 'Pass', 'Warning' or 'Fail'.
+    """
+    rows = []
+    listed = set()
+    folders_by_lower_name = {name.lower(): name for name in folders}
+    for application in applications:
+        if application == ['']:
+            continue
+        if len(application) != 2 or not application[0].strip() or not application[1].strip():
+            rows.append([';'.join(application), '', 'Fail', 'Line is not <Application Name>;<Application ID>'])
+            continue
+        app_name, app_id = application
+        listed.add(app_name)
+        if app_name not in folders:
+            other_case = folders_by_lower_name.get(app_name.lower())
+            if other_case and not case_sensitive:
+                # The scan finds it under either name
+                listed.add(other_case)
+                rows.append([app_name, app_id, 'Warning', f"Source folder is named '{other_case}', only differs in case"])
+                continue
+            reason = f"Source folder missing, '{other_case}' only differs in case" if other_case else 'Source folder missing'
+            rows.append([app_name, app_id, 'Fail', reason])
+            continue
+        if not folders[app_name]:
+            rows.append([app_name, app_id, 'Fail', 'Source folder empty'])
+            continue
+        if mapped is not None:
+            if app_name not in mapped:
+                rows.append([app_name, app_id, 'Warning', 'Not in the App-Repo mapping'])
+                continue
+            # <org>/<repo> repositories are placed in <app>/<org>/<repo>
+            missing_repos = sorted(repo for repo in mapped[app_name] if repo.split('/')[0] not in folders[app_name])
+            if missing_repos:
+                rows.append([app_name, app_id, 'Warning', f"Mapped repositories missing: {', '.join(missing_repos)}"])
+                continue
+        rows.append([app_name, app_id, 'Pass', ''])
+
+    # Sources that will not be scanned
+    for app_name in sorted(set(mapped or ()) - listed):
+        rows.append([app_name, '', 'Warning', 'In the App-Repo mapping but not in applications.txt'])
+    for app_name in sorted(set(folders) - listed - set(mapped or ())):
+        rows.append([app_name, '', 'Warning', 'Source folder not in applications.txt'])
+    return rows
+
+
+def run_preflight(applications, settings):
+    """
+    Checks the applications and writes preflight_<datetime>.csv to logs_dir.
+    Parameters:
+        applications (list): The lines of applications.txt split on ';', without the header.
+        settings (Settings): The settings of the run.
+    Returns:
+        tuple: (applications that passed, with or without warnings, report rows, report file).
+    """
+    folders = list_application_folders(settings.src_dir_analyze)
+    rows = check_applications(applications, folders, read_mapped_repositories(settings), is_case_sensitive(settings.src_dir_analyze, folders))
+    report_file = os.path.join(settings.logs_dir, f"preflight_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv")
+    with open(report_file, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(REPORT_HEADER)
+        writer.writerows(rows)
+    failed = {row[0] for row in rows if row[2] == 'Fail'}
+    passed = [application for application in applications if len(application) == 2 and application[0] not in failed]
+    return passed, rows, report_file
+
+
+def summary(rows):
+    counts = {status: sum(1 for row in rows if row[2] == status) for status in ('Pass', 'Warning', 'Fail')}
+    return f"Pre-flight: {counts['Pass']} passed, {counts['Warning']} warnings, {counts['Fail']} failed"
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Checks applications.txt against src_dir_analyze and the App-Repo mapping.")
+    parser.add_argument('--config', help='config.properties, default is CASTHL_CONFIG or Config/config.properties')
+    args = parser.parse_args()
+    settings = Settings.load_settings(args.config)
+    with open(settings.highlight_application_mapping, 'r') as file:
+        applications = [line.strip().split(';') for line in file][1:]
+    passed, rows, report_file = run_preflight(applications, settings)
+    for row in rows:
+        if row[2] != 'Pass':
+            print(f"{row[2]}: {row[0]} - {row[3]}")
+    print(f"{summary(rows)}. Report written to {report_file}")
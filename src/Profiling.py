@@ -0,0 +1,218 @@
+import os
+import sys
+import glob
+import functools
+import threading
+import contextlib
+from datetime import datetime
+# cProfile, pstats and tracemalloc are only imported once a run is profiled, the entry points import this module
+
+# Set while a run is profiled, worker threads and processes profile themselves into this folder
+PROFILE_DIR_ENV = 'CASTHL_PROFILE_DIR'
+# Frames kept for each allocation
+TRACE_FRAMES = 10
+# Lines of the merged report, of each stage or worker section, and allocation sites
+TOP_FUNCTIONS = 40
+TOP_STAGE_FUNCTIONS = 15
+TOP_ALLOCATIONS = 25
+# A new allocation snapshot is taken whenever traced memory grew by this factor since the last one
+PEAK_GROWTH = 1.1
+PEAK_POLL_SECONDS = 0.5
+
+# Python 3.11 and earlier hook cProfile per thread, every thread profiles its own stages. From 3.12
+# cProfile is a sys.monitoring tool, one Profile enabled at a time in a process, recording every thread:
+# a stage starting while another profile is enabled runs in that one, so only the run, or each worker
+# process, has a .prof file of its own.
+ONE_PROFILER_PER_PROCESS = sys.version_info >= (3, 12)
+
+# (stage, pid, thread id) -> cProfile.Profile, a pool thread running a stage many times keeps one profile
+_profilers = {}
+# Profiles enabled in this process
+_enabled = 0
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def active_dir():
+    return os.environ.get(PROFILE_DIR_ENV)
+
+
+def _file_name(name, suffix):
+    label = f"{name}_{os.getpid()}_{threading.current_thread().name}"
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in label) + suffix
+
+
+class PeakTracker:
+    """
+    Traces allocations with tracemalloc and keeps the snapshot taken closest to the peak.
+    """
+    def __init__(self):
+        self.snapshot = None
+        self.snapshot_size = 0
+        self.stopped = threading.Event()
+        import tracemalloc
+        tracemalloc.start(TRACE_FRAMES)
+        self.thread = threading.Thread(name='ProfilePeak', target=self._poll, daemon=True)
+        self.thread.start()
+
+    def check(self):
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        if self.snapshot is None or current > self.snapshot_size * PEAK_GROWTH:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.snapshot_size = current
+
+    def _poll(self):
+        while not self.stopped.wait(PEAK_POLL_SECONDS):
+            self.check()
+
+    def stop(self, memory_file):
+        self.stopped.set()
+        self.thread.join()
+        self.check()
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        import cProfile
+        import pstats
+        # The profiler's own allocations are left out
+        snapshot = self.snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, pstats.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ])
+        with open(memory_file, 'w') as file:
+            file.write(f"Peak traced memory {peak / (1024 * 1024):.1f} MB, "
+                       f"top allocation sites of the snapshot taken at {self.snapshot_size / (1024 * 1024):.1f} MB:\n")
+            for statistic in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                frame = statistic.traceback[0]
+                file.write(f"{statistic.size / 1024:>12.1f} KB {statistic.count:>9} blocks  {frame.filename}:{frame.lineno}\n")
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    cProfiles the calling thread while the block runs, when the run is profiled.
+    A stage inside another stage of the same thread is part of the outer one.
+    """
+    profile_dir = active_dir()
+    if not profile_dir or getattr(_local, 'active', False):
+        yield
+        return
+    import cProfile
+    global _enabled
+    with _lock:
+        if ONE_PROFILER_PER_PROCESS and _enabled:
+            profiler = None
+        else:
+            profiler = _profilers.setdefault((name, os.getpid(), threading.get_ident()), cProfile.Profile())
+            _enabled += 1
+    if profiler is None:
+        # Recorded by the profile already enabled
+        yield
+        return
+    _local.active = True
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _local.active = False
+        with _lock:
+            _enabled -= 1
+        profiler.dump_stats(os.path.join(profile_dir, _file_name(name, '.prof')))
+
+
+def profiled(name, function):
+    """
+    Returns function running as a stage, for worker threads. function itself when the run is not profiled.
+    """
+    if not active_dir():
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def start_worker(name):
+    """
+    ProcessPoolExecutor initializer, the worker process profiles itself until it exits.
+    """
+    profile_dir = active_dir()
+    if not profile_dir:
+        return
+    import cProfile
+    from multiprocessing import util
+    global _enabled
+    tracker = PeakTracker()
+    profiler = cProfile.Profile()
+    with _lock:
+        _enabled += 1
+    profiler.enable()
+
+    def finish():
+        profiler.disable()
+        global _enabled
+        with _lock:
+            _enabled -= 1
+        profiler.dump_stats(os.path.join(profile_dir, _file_name(name, '.prof')))
+        tracker.stop(os.path.join(profile_dir, _file_name(name, '.memory.txt')))
+    util.Finalize(None, finish, exitpriority=10)
+
+
+def write_report(profile_dir):
+    """
+    Merges the profiles of every stage and worker of a run into profile_report.txt and merged.prof.
+    Returns:
+        str: The path of the report.
+    """
+    import pstats
+    report_file = os.path.join(profile_dir, 'profile_report.txt')
+    profile_files = sorted(glob.glob(os.path.join(profile_dir, '*.prof')))
+    profile_files = [path for path in profile_files if os.path.basename(path) != 'merged.prof']
+    with open(report_file, 'w') as report:
+        if not profile_files:
+            report.write("No profile was recorded.\n")
+            return report_file
+        merged = pstats.Stats(*profile_files, stream=report)
+        merged.dump_stats(os.path.join(profile_dir, 'merged.prof'))
+        report.write(f"Merged profile of {len(profile_files)} stages and workers, top {TOP_FUNCTIONS} functions by cumulative time\n")
+        merged.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        for path in profile_files:
+            stats = pstats.Stats(path, stream=report)
+            report.write(f"\n=== {os.path.basename(path)}: {stats.total_tt:.3f} s\n")
+            stats.sort_stats('cumulative').print_stats(TOP_STAGE_FUNCTIONS)
+        for path in sorted(glob.glob(os.path.join(profile_dir, '*.memory.txt'))):
+            with open(path) as memory_file:
+                report.write(f"\n=== {os.path.basename(path)}\n{memory_file.read()}")
+    return report_file
+
+
+@contextlib.contextmanager
+def profiling(logs_dir, run_name):
+    """
+    Profiles a run into <logs_dir>/profile_<run_name>_<datetime>: a cProfile file per stage and
+    per worker, the allocation sites at peak memory, and a merged report.
+    Nothing is added when the caller already profiles the run (e.g. option 5 of CASTHL_Automation).
+    """
+    if active_dir():
+        with stage(run_name):
+            yield
+        return
+    profile_dir = os.path.join(logs_dir, f"profile_{run_name}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}")
+    os.makedirs(profile_dir, exist_ok=True)
+    os.environ[PROFILE_DIR_ENV] = profile_dir
+    tracker = PeakTracker()
+    try:
+        with stage(run_name):
+            yield
+    finally:
+        tracker.stop(os.path.join(profile_dir, _file_name(run_name, '.memory.txt')))
+        del os.environ[PROFILE_DIR_ENV]
+        print(f"Profile of the run written to {write_report(profile_dir)}")
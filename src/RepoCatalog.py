@@ -0,0 +1,387 @@
+import os
+import csv
+import json
+import sqlite3
+
+# Summary CSV column -> RepoRecord attribute
+CSV_COLUMNS = {
+    'id': 'id',
+    'name': 'name',
+    'default_branch': 'default_branch',
+    'size': 'size',
+    'updated_at': 'updated_at',
+    'clone_url': 'clone_url',
+    'archive_url': 'archive_url',
+    'repo_archive_download_api': 'download_url',
+    'batch_number': 'batch_number',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS repos (
+    name TEXT PRIMARY KEY,
+    id TEXT,
+    default_branch TEXT,
+    size INTEGER,
+    updated_at TEXT,
+    clone_url TEXT,
+    archive_url TEXT,
+    download_url TEXT,
+    batch_number TEXT
+);
+CREATE INDEX IF NOT EXISTS repos_batch ON repos (batch_number);
+CREATE TABLE IF NOT EXISTS app_repos (app TEXT, repo TEXT, domain TEXT);
+CREATE INDEX IF NOT EXISTS app_repos_repo ON app_repos (repo);
+CREATE TABLE IF NOT EXISTS archive_integrity (
+    repo TEXT PRIMARY KEY,
+    path TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    sha256 TEXT,
+    commit_sha TEXT,
+    entries INTEGER,
+    status TEXT,
+    reason TEXT,
+    checked_at TEXT
+);
+CREATE TABLE IF NOT EXISTS failures (
+    stage TEXT,
+    item TEXT,
+    kind TEXT,
+    reason TEXT,
+    attempts INTEGER,
+    status TEXT,
+    first_failed_at TEXT,
+    last_failed_at TEXT,
+    PRIMARY KEY (stage, item)
+);
+CREATE TABLE IF NOT EXISTS app_inventory (
+    app TEXT PRIMARY KEY,
+    files INTEGER,
+    bytes INTEGER,
+    scannable_files INTEGER,
+    scannable_bytes INTEGER,
+    ignored_files INTEGER,
+    extensions TEXT,
+    technologies TEXT,
+    taken_at TEXT
+);
+CREATE TABLE IF NOT EXISTS result_uploads (
+    app TEXT PRIMARY KEY,
+    app_id TEXT,
+    path TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    bytes_sent INTEGER,
+    seconds REAL,
+    uploaded_at TEXT
+);
+"""
+
+
+class RepoRecord:
+    """
+    One repository of the summary CSV.
+    """
+    __slots__ = ('name', 'id', 'default_branch', 'size', 'updated_at', 'clone_url', 'archive_url', 'download_url', 'batch_number')
+
+    def __init__(self, name, id=None, default_branch=None, size=0, updated_at=None, clone_url=None, archive_url=None, download_url=None, batch_number=None):
+        self.name = name
+        self.id = id
+        self.default_branch = default_branch
+        self.size = size
+        self.updated_at = updated_at
+        self.clone_url = clone_url
+        self.archive_url = archive_url
+        self.download_url = download_url
+        self.batch_number = batch_number
+
+    def astuple(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __repr__(self):
+        return f"RepoRecord(name={self.name!r}, size={self.size!r}, batch_number={self.batch_number!r})"
+
+
+def batch_key(value):
+    # "1", "1.0" and 1 are the same batch, pandas writes integer columns with gaps as floats
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value or value.lower() == 'nan':
+        return None
+    try:
+        number = float(value)
+        if number.is_integer():
+            return str(int(number))
+    except ValueError:
+        pass
+    return value
+
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _source_stamp(path):
+    # Size and mtime of a source file, the catalog is rebuilt when either changes
+    if not path or not os.path.exists(path):
+        return ''
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class RepoCatalog:
+    """
+    Repositories of the summary CSV, loaded once and indexed by batch, name and application.
+    Persisted in SQLite next to the CSV, so later runs and stages do not re-parse the CSV.
+    """
+    def __init__(self, db_path, records, columns, app_repos):
+        self.db_path = db_path
+        self.records = records
+        self.columns = columns
+        self.by_name = {record.name: record for record in records}
+        self.by_batch = {}
+        for record in records:
+            self.by_batch.setdefault(record.batch_number, []).append(record)
+        self.app_repos = app_repos
+        self.by_app = {}
+        self.apps_by_repo = {}
+        for app, repo, domain in app_repos:
+            if app is None or repo is None:
+                continue
+            self.by_app.setdefault(app, []).append(repo)
+            self.apps_by_repo.setdefault(repo, []).append(app)
+
+    def __len__(self):
+        return len(self.records)
+
+    def has_column(self, column):
+        return column in self.columns
+
+    def get(self, name):
+        return self.by_name.get(name)
+
+    def batch(self, batch):
+        return self.by_batch.get(batch_key(batch), [])
+
+    def repos_for_app(self, app):
+        return [self.by_name[repo] for repo in self.by_app.get(app, []) if repo in self.by_name]
+
+    def apps_for_repo(self, repo):
+        return self.apps_by_repo.get(repo, [])
+
+    def connect(self):
+        # Extra per stage tables live in the same database
+        return connect(self.db_path)
+
+
+def catalog_path(csv_file_path):
+    return os.path.splitext(csv_file_path)[0] + '.db'
+
+
+def org_catalog_path(output_dir, org_name):
+    # Catalog of the <org>_Repositories_Summary.csv written by option 1
+    return catalog_path(os.path.join(output_dir, f"{org_name}_Repositories_Summary.csv"))
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def get_meta(db_path, key, default=None):
+    if not os.path.exists(db_path):
+        return default
+    conn = connect(db_path)
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else default
+
+
+def set_meta(db_path, key, value):
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+    finally:
+        conn.close()
+
+
+def record_archive_verdict(db_path, repo, archive_path, verdict, commit_sha=None):
+    """
+    Stores the integrity verdict of a downloaded archive, with the size and mtime it was checked at.
+    Parameters:
+        db_path (str): The catalog database.
+        repo (str): The repository name.
+        archive_path (str): The downloaded archive.
+        verdict (dict): The ArchiveIntegrity verdict.
+        commit_sha (str): The commit the archive was downloaded at, or None.
+    """
+    stat = os.stat(archive_path) if os.path.exists(archive_path) else None
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO archive_integrity VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))",
+                         (repo, archive_path, stat.st_size if stat else verdict['size'], stat.st_mtime_ns if stat else None,
+                          verdict['sha256'], commit_sha, verdict['entries'], verdict['status'], verdict['reason']))
+    finally:
+        conn.close()
+
+
+def load_archive_verdicts(db_path):
+    """
+    Returns:
+        dict: Repository name -> archive_integrity row as a dict, empty when there is no catalog.
+    """
+    if not os.path.exists(db_path):
+        return {}
+    conn = connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return {row['repo']: dict(row) for row in conn.execute("SELECT * FROM archive_integrity")}
+    finally:
+        conn.close()
+
+
+def record_inventory(db_path, inventories):
+    """
+    Stores the SourceInventory counts of applications, replacing their previous inventory.
+    Parameters:
+        db_path (str): The catalog database.
+        inventories (iterable): SourceInventory inventories, None entries are skipped.
+    """
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO app_inventory VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))",
+                             [(inventory['app'], inventory['files'], inventory['bytes'], inventory['scannable_files'], inventory['scannable_bytes'],
+                               inventory['ignored_files'], json.dumps(inventory['extensions']), json.dumps(inventory['technologies']))
+                              for inventory in inventories if inventory])
+    finally:
+        conn.close()
+
+
+def load_inventory(db_path):
+    """
+    Returns:
+        dict: Application name -> inventory as recorded by record_inventory, empty when there is no catalog.
+    """
+    if not os.path.exists(db_path):
+        return {}
+    conn = connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        inventories = {}
+        for row in conn.execute("SELECT * FROM app_inventory"):
+            inventory = dict(row)
+            inventory['extensions'] = json.loads(inventory['extensions'])
+            inventory['technologies'] = json.loads(inventory['technologies'])
+            inventories[inventory['app']] = inventory
+        return inventories
+    finally:
+        conn.close()
+
+
+def record_upload(db_path, app, app_id, zip_path, bytes_sent, seconds):
+    # A result zip uploaded as it is now, ResultUpload does not send it again until it changes
+    stat = os.stat(zip_path)
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO result_uploads VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))",
+                         (app, app_id, zip_path, stat.st_size, stat.st_mtime_ns, bytes_sent, seconds))
+    finally:
+        conn.close()
+
+
+def load_uploads(db_path):
+    """
+    Returns:
+        dict: Application name -> result_uploads row as a dict, empty when there is no catalog.
+    """
+    if not os.path.exists(db_path):
+        return {}
+    conn = connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return {row['app']: dict(row) for row in conn.execute("SELECT * FROM result_uploads")}
+    finally:
+        conn.close()
+
+
+def _read_csv(csv_file_path):
+    records = []
+    with open(csv_file_path, mode='r', newline='', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        columns = reader.fieldnames or []
+        for row in reader:
+            values = {attribute: row.get(column) for column, attribute in CSV_COLUMNS.items()}
+            values['size'] = _to_int(values['size'])
+            values['batch_number'] = batch_key(values['batch_number'])
+            records.append(RepoRecord(**values))
+    return records, columns
+
+
+def _read_mapping(mapping_sheet):
+    import pandas as pd
+    mapping_df = pd.read_excel(mapping_sheet)
+    app_repos = []
+    for row in mapping_df.itertuples(index=False):
+        app = getattr(row, 'Application', None)
+        repo = getattr(row, 'Repository', None)
+        domain = getattr(row, 'Domain', None)
+        app_repos.append((None if pd.isna(app) else str(app),
+                          None if pd.isna(repo) else str(repo),
+                          None if pd.isna(domain) else str(domain)))
+    return app_repos
+
+
+def load_catalog(csv_file_path, mapping_sheet=None):
+    """
+    Loads the repository catalog, from SQLite when it is newer than its sources.
+    Parameters:
+        csv_file_path (str): The <org>_Repositories_Summary.csv file.
+        mapping_sheet (str): The App-Repo-Mapping.xlsx file, or None.
+    Returns:
+        RepoCatalog: The loaded catalog.
+    """
+    db_path = catalog_path(csv_file_path)
+    conn = connect(db_path)
+    try:
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        csv_stamp = _source_stamp(csv_file_path)
+        mapping_stamp = _source_stamp(mapping_sheet)
+
+        if meta.get('csv_stamp') != csv_stamp:
+            records, columns = _read_csv(csv_file_path)
+            with conn:
+                conn.execute("DELETE FROM repos")
+                conn.executemany("INSERT OR REPLACE INTO repos (name, id, default_branch, size, updated_at, clone_url, archive_url, download_url, batch_number) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (record.astuple() for record in records))
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('csv_stamp', ?)", (csv_stamp,))
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('columns', ?)", (','.join(columns),))
+        else:
+            columns = meta.get('columns', '').split(',')
+            records = [RepoRecord(*row) for row in conn.execute(
+                "SELECT name, id, default_branch, size, updated_at, clone_url, archive_url, download_url, batch_number FROM repos ORDER BY rowid")]
+
+        if mapping_sheet and meta.get('mapping_stamp') != mapping_stamp:
+            app_repos = _read_mapping(mapping_sheet) if mapping_stamp else []
+            with conn:
+                conn.execute("DELETE FROM app_repos")
+                conn.executemany("INSERT INTO app_repos VALUES (?, ?, ?)", app_repos)
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('mapping_stamp', ?)", (mapping_stamp,))
+        else:
+            app_repos = list(conn.execute("SELECT app, repo, domain FROM app_repos ORDER BY rowid"))
+    finally:
+        conn.close()
+
+    return RepoCatalog(db_path, records, columns, app_repos)
@@ -0,0 +1,197 @@
+# Upload stage of the scans. They save their results to a zip in RESULTS/<app> (HighlightAutomation
+# --skipUpload --zipResult), and the zips are uploaded here by the command line's upload-from-zip mode,
+# several at once on a pool of threads: while the next applications are analyzed in deferred mode,
+# right after each scan in inline mode. Every upload is recorded in the repository catalog: a run that
+# stopped half way resumes with the zips not uploaded yet, and an unchanged zip is not sent again.
+#
+#     python ResultUpload.py [--apps App1,App2] [--force]
+import os
+import csv
+import time
+import subprocess
+import threading
+from datetime import datetime
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import RepoCatalog
+import Settings
+import FailureQueue
+
+RESULT_ZIP_NAME = 'HighlightResults.zip'
+DEFAULT_UPLOAD_WORKERS = 4
+# Upload-from-zip mode of the command line, it fails with return code 8 (upload from zip file error)
+UPLOAD_ZIP_OPTION = '--uploadZipFile='
+REPORT_HEADER = ['Application Name', 'Application ID', 'Result Zip', 'Status', 'Bytes', 'Bytes Sent', 'Seconds', 'Reason']
+
+
+def result_zip(results_dir, app_name):
+    # Where the scan of an application saves its results
+    return os.path.join(results_dir, app_name, RESULT_ZIP_NAME)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)]
+
+
+class Uploader:
+    """
+    Uploads result zips with the command line on a pool of threads, submitted as the scans pass so that
+    uploads overlap with the analysis of the next applications.
+    Parameters:
+        settings (Settings): highlight_executable, highlight_base_url, highlight_token, highlight_company_id, RESULTS,
+            UPLOAD_WORKERS, and RECLAIM_AFTER_UPLOAD to delete the sources of an application once its results are uploaded.
+        queue (FailureQueue): Retries transient failures and keeps the ones left, or None.
+        force (bool): Upload the zips already uploaded as they are too.
+    """
+    def __init__(self, settings, queue=None, force=False):
+        self.settings = settings
+        self.queue = queue
+        self.force = force
+        self.workers = settings.upload_workers or DEFAULT_UPLOAD_WORKERS
+        self.catalog_db = (RepoCatalog.org_catalog_path(settings.output_dir, settings.summary_name())
+                           if settings.output_dir and settings.summary_name() else None)
+        self.uploaded = RepoCatalog.load_uploads(self.catalog_db) if self.catalog_db else {}
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='Upload')
+        self.futures = []
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+
+    def submit(self, app_name, app_id):
+        with self.lock:
+            self.futures.append(self.executor.submit(self.upload, app_name, app_id))
+
+    def unchanged(self, app_name, app_id, zip_file):
+        # Uploaded before, and the zip was not written again since
+        record = self.uploaded.get(app_name)
+        if self.force or not record or record['app_id'] != app_id:
+            return False
+        stat = os.stat(zip_file)
+        return record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns
+
+    def send(self, app_name, app_id, zip_file, result):
+        # One attempt, None once uploaded or (reason, FailureQueue kind)
+        import HLScanAndOnboard
+        settings = self.settings
+        command = HLScanAndOnboard.highlight_command(settings.highlight_executable) + [
+            UPLOAD_ZIP_OPTION + zip_file,
+            '--serverUrl=' + settings.highlight_base_url,
+            '--tokenAuth=' + settings.highlight_token,
+            '--applicationId=' + app_id,
+            '--companyId=' + settings.highlight_company_id
+        ]
+        start = time.perf_counter()
+        try:
+            completed_process = subprocess.run(command, capture_output=True, text=True)
+        except OSError as e:
+            result.update(seconds=time.perf_counter() - start, reason=str(e))
+            return (str(e), FailureQueue.classify_exception(e))
+        result['seconds'] = time.perf_counter() - start
+        if completed_process.returncode != 0:
+            reason = HLScanAndOnboard.return_code_messages.get(completed_process.returncode, f"Unknown return code: {completed_process.returncode}")
+            result['reason'] = reason
+            return (reason, FailureQueue.classify_return_code(completed_process.returncode))
+        result.update(status='Uploaded', sent=result['bytes'], reason='')
+        return None
+
+    def upload(self, app_name, app_id):
+        """
+        Returns:
+            dict: app, app_id, zip, status (Uploaded, Unchanged, Missing or Failed), bytes, sent, seconds and reason.
+        """
+        zip_file = result_zip(self.settings.results_dir, app_name)
+        result = {'app': app_name, 'app_id': app_id, 'zip': zip_file, 'status': 'Failed', 'bytes': 0, 'sent': 0, 'seconds': 0.0, 'reason': ''}
+        if not os.path.isfile(zip_file):
+            result.update(status='Missing', reason='No result zip, scan the application again')
+            if self.queue:
+                self.queue.record('upload', f"{app_name};{app_id}", result['reason'], FailureQueue.PERMANENT)
+            return result
+        result['bytes'] = os.path.getsize(zip_file)
+        if self.unchanged(app_name, app_id, zip_file):
+            result.update(status='Unchanged', reason='Uploaded before')
+            return result
+        attempt = lambda: self.send(app_name, app_id, zip_file, result)
+        failure = self.queue.attempt('upload', f"{app_name};{app_id}", attempt) if self.queue else attempt()
+        if failure is None:
+            if self.catalog_db:
+                RepoCatalog.record_upload(self.catalog_db, app_name, app_id, zip_file, result['sent'], result['seconds'])
+            print(f"Uploaded results of {app_name}: {result['sent'] / 1024:.1f} KB in {result['seconds']:.2f} s.")
+            if self.settings.upload_mode != 'deferred':
+                # Only deferred mode keeps its zips, to resume from them
+                os.remove(zip_file)
+            if self.settings.reclaim_after_upload and self.settings.src_dir_analyze:
+                import HLScanAndOnboard
+                HLScanAndOnboard.reclaim_sources(app_name, os.path.join(self.settings.src_dir_analyze, app_name), self.settings.src_dir)
+        else:
+            print(f"Upload of the results of {app_name} failed: {result['reason']}")
+        return result
+
+    def close(self, logs_dir, current_datetime):
+        """
+        Waits for the uploads submitted, writes Upload_<datetime>.csv to logs_dir and prints the totals.
+        Returns:
+            list: The result of each upload.
+        """
+        self.executor.shutdown(wait=True)
+        results = [future.result() for future in self.futures]
+        if not results:
+            return results
+        report_file = os.path.join(logs_dir, f"Upload_{current_datetime}.csv")
+        with open(report_file, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(REPORT_HEADER)
+            for result in results:
+                writer.writerow([result['app'], result['app_id'], result['zip'], result['status'], result['bytes'], result['sent'],
+                                 f"{result['seconds']:.3f}", result['reason']])
+        uploaded = [result for result in results if result['status'] == 'Uploaded']
+        latencies = [result['seconds'] for result in uploaded]
+        sent = sum(result['sent'] for result in uploaded)
+        elapsed = time.time() - self.start_time
+        print(f"{len(uploaded)} result zips uploaded, {sum(1 for result in results if result['status'] == 'Unchanged')} unchanged, "
+              f"{sum(1 for result in results if result['status'] in ('Failed', 'Missing'))} failed. "
+              f"{sent / (1024 * 1024):.1f} MB sent, {self.workers} at a time, "
+              f"latency p50 {percentile(latencies, 50):.2f} s p90 {percentile(latencies, 90):.2f} s max {max(latencies, default=0):.2f} s "
+              f"over {elapsed:.1f} s. Refer {report_file}.")
+        return results
+
+
+def upload_applications(settings, applications, force=False, current_datetime=None):
+    """
+    Uploads the saved results of applications, without scanning them.
+    Parameters:
+        settings (Settings): The settings of the run.
+        applications (list): [app_name, app_id] pairs.
+        force (bool): Upload the zips already uploaded as they are too.
+    Returns:
+        list: The result of each upload.
+    """
+    current_datetime = current_datetime or datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    queue = FailureQueue.open_queue(settings)
+    uploader = Uploader(settings, queue, force)
+    for app_name, app_id in applications:
+        uploader.submit(app_name, app_id)
+    results = uploader.close(settings.logs_dir, current_datetime)
+    if queue:
+        queue.write_dead_letter_report('upload', settings.logs_dir, current_datetime)
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Uploads the Highlight results saved by the scans of upload_mode=deferred.")
+    parser.add_argument('--config', help='config.properties, default is CASTHL_CONFIG or Config/config.properties')
+    parser.add_argument('--apps', help='Comma separated applications, default is every application of applications.txt with a result zip')
+    parser.add_argument('--force', action='store_true', help='Upload the zips already uploaded as they are too')
+    args = parser.parse_args()
+    settings = Settings.load_settings(args.config)
+    with open(settings.highlight_application_mapping, 'r') as file:
+        applications = [line.strip().split(';') for line in file][1:]
+    applications = [application for application in applications if len(application) == 2]
+    if args.apps:
+        names = {name.strip() for name in args.apps.split(',')}
+        applications = [application for application in applications if application[0] in names]
+    else:
+        applications = [application for application in applications if os.path.isfile(result_zip(settings.results_dir, application[0]))]
+    print(f"Uploading the results of {len(applications)} applications.")
+    upload_applications(settings, applications, args.force)
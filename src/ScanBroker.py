@@ -0,0 +1,476 @@
+# Coordinator/worker mode of HLScanAndOnboard, to spread the scans over several hosts.
+# The coordinator publishes applications.txt to a SQLite work queue on its own local disk and serves
+# it over HTTP at SCAN_BROKER, it is the only process opening the queue: SQLite over a network share
+# locks unreliably. Worker threads lease one application at a time from it, run process_application and
+# report the result back. A heartbeat renews the lease while the scan runs, the lease of a crashed
+# worker expires and the application is leased again, up to SCAN_MAX_ATTEMPTS times. Leases are timed
+# by the coordinator's clock only, the clocks of the scan hosts do not matter.
+#
+#     python ScanBroker.py coordinator
+#     python ScanBroker.py worker --threads 4
+import os
+import csv
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from datetime import datetime
+from argparse import ArgumentParser
+import LogRouter
+import HLScanAndOnboard
+import Settings
+import RepoCatalog
+import SourceInventory
+import Preflight
+import FailureQueue
+
+# A worker that has not renewed its lease for this long is considered dead
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 3
+POLL_SECONDS = 5
+DEFAULT_BROKER_PORT = 8470
+# Workers started before the coordinator, or cut off from it, keep trying this long
+BROKER_RETRY_SECONDS = 120
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    app_name TEXT PRIMARY KEY,
+    app_id TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status TEXT,
+    reason TEXT,
+    log_file TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    execution_time TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+SUMMARY_HEADER = ['Application Name', 'Status', 'Reason', 'Log File Path', 'Start Time', 'End Time', 'Total Time in Minutes', 'Worker', 'Attempts']
+
+
+def connect(queue_file):
+    # Only the coordinator opens the queue, on a local disk
+    conn = sqlite3.connect(queue_file, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def publish(queue_file, applications, requeue=False):
+    """
+    Adds applications to the queue. Applications already queued or done are kept as they are,
+    unless requeue is set.
+    Parameters:
+        queue_file (str): The SQLite queue file, on the local disk of the coordinator.
+        applications (list): [app_name, app_id] pairs, as read from applications.txt.
+        requeue (bool): Queue every application again, including the ones already done.
+    Returns:
+        int: The number of applications queued.
+    """
+    conn = connect(queue_file)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        if requeue:
+            conn.executemany("INSERT OR REPLACE INTO jobs (app_name, app_id, updated_at) VALUES (?, ?, ?)",
+                             [(app_name, app_id, time.time()) for app_name, app_id in applications])
+        else:
+            conn.executemany("INSERT OR IGNORE INTO jobs (app_name, app_id, updated_at) VALUES (?, ?, ?)",
+                             [(app_name, app_id, time.time()) for app_name, app_id in applications])
+        queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'queued'").fetchone()[0]
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return queued
+
+
+def give_up_expired(conn, max_attempts, now):
+    # Expired leases that used up their attempts are not leased again
+    conn.execute("UPDATE jobs SET state = 'failed', status = 'Failed', reason = 'Lease expired ' || attempts || ' times', updated_at = ? "
+                 "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?", (now, now, max_attempts))
+
+
+def lease(conn, worker, lease_seconds, max_attempts):
+    """
+    Takes the next queued application, or one whose lease has expired.
+    Returns:
+        tuple: (app_name, app_id), or None when nothing can be leased now.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        give_up_expired(conn, max_attempts, now)
+        row = conn.execute("SELECT app_name, app_id FROM jobs WHERE state = 'queued' OR (state = 'leased' AND lease_expires < ?) "
+                           "ORDER BY rowid LIMIT 1", (now,)).fetchone()
+        if row:
+            conn.execute("UPDATE jobs SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? WHERE app_name = ?",
+                         (worker, now + lease_seconds, now, row[0]))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return row
+
+
+def renew(conn, app_name, worker, lease_seconds):
+    # False when the lease was lost, i.e. it expired and another worker took the application
+    cursor = conn.execute("UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE app_name = ? AND worker = ? AND state = 'leased'",
+                          (time.time() + lease_seconds, time.time(), app_name, worker))
+    return cursor.rowcount == 1
+
+
+def complete(conn, worker, result):
+    """
+    Records the result row of process_application, if the worker still holds the lease.
+    """
+    app_name, status, reason, log_file, start_time, end_time, execution_time = result
+    cursor = conn.execute("UPDATE jobs SET state = 'done', status = ?, reason = ?, log_file = ?, start_time = ?, end_time = ?, execution_time = ?, updated_at = ? "
+                          "WHERE app_name = ? AND worker = ? AND state = 'leased'",
+                          (status, reason, log_file, str(start_time), str(end_time), str(execution_time), time.time(), app_name, worker))
+    return cursor.rowcount == 1
+
+
+def progress(conn):
+    counts = dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+    return {state: counts.get(state, 0) for state in ('queued', 'leased', 'done', 'failed')}
+
+
+def pending(conn):
+    # Applications that may still be leased: queued, or leased and possibly expiring later
+    return conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'leased')").fetchone()[0]
+
+
+def write_summary(queue_file, summary_file):
+    conn = connect(queue_file)
+    try:
+        rows = conn.execute("SELECT app_name, COALESCE(status, state), reason, log_file, start_time, end_time, execution_time, worker, attempts FROM jobs ORDER BY rowid").fetchall()
+    finally:
+        conn.close()
+    with open(summary_file, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(SUMMARY_HEADER)
+        writer.writerows(rows)
+    return len(rows)
+
+
+def record_failures(queue_file, failure_queue):
+    # Scans of all workers into the failure queue of the catalog, for CASTHL_Automation --retry-failed
+    conn = connect(queue_file)
+    try:
+        rows = conn.execute("SELECT app_name, app_id, COALESCE(status, state), COALESCE(reason, 'Lease expired'), attempts FROM jobs "
+                            "WHERE state IN ('done', 'failed')").fetchall()
+    finally:
+        conn.close()
+    for app_name, app_id, status, reason, attempts in rows:
+        failure = HLScanAndOnboard.scan_failure([app_name, status, reason])
+        if failure:
+            # The broker already leased it up to SCAN_MAX_ATTEMPTS times
+            failure_queue.record('scan', f"{app_name};{app_id}", failure[0], failure[1], attempts)
+        else:
+            failure_queue.resolve('scan', f"{app_name};{app_id}")
+
+
+def broker_address(address):
+    """
+    Parameters:
+        address (str): SCAN_BROKER, host:port or http://host:port.
+    Returns:
+        tuple: (URL the workers call, port the coordinator listens on).
+    """
+    address = (address or f"localhost:{DEFAULT_BROKER_PORT}").rstrip('/')
+    if not address.startswith(('http://', 'https://')):
+        address = 'http://' + address
+    host_port = address.split('://', 1)[1].split('/', 1)[0]
+    port = int(host_port.rsplit(':', 1)[1]) if ':' in host_port else DEFAULT_BROKER_PORT
+    return address, port
+
+
+class BrokerHandler(BaseHTTPRequestHandler):
+    # Set on the subclass made by start_broker
+    queue_file = None
+    lease_seconds = DEFAULT_LEASE_SECONDS
+    max_attempts = DEFAULT_MAX_ATTEMPTS
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, answer):
+        body = json.dumps(answer).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            conn = connect(self.queue_file)
+            try:
+                if self.path == '/lease':
+                    job = lease(conn, request['worker'], self.lease_seconds, self.max_attempts)
+                    answer = {'job': job, 'pending': pending(conn), 'lease_seconds': self.lease_seconds}
+                elif self.path == '/renew':
+                    answer = {'ok': renew(conn, request['app_name'], request['worker'], self.lease_seconds)}
+                elif self.path == '/complete':
+                    answer = {'ok': complete(conn, request['worker'], request['result'])}
+                else:
+                    self.send_json(404, {'message': 'Not Found'})
+                    return
+            finally:
+                conn.close()
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {'message': str(e)})
+            return
+        except sqlite3.Error as e:
+            logging.error(f'Scan queue error: {e}')
+            self.send_json(500, {'message': str(e)})
+            return
+        self.send_json(200, answer)
+
+
+def start_broker(queue_file, port, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Serves the queue to the workers on a thread of the coordinator.
+    Returns:
+        ThreadingHTTPServer: The server, stopped with shutdown().
+    """
+    handler = type('Handler', (BrokerHandler,), {'queue_file': queue_file, 'lease_seconds': lease_seconds, 'max_attempts': max_attempts})
+    server = ThreadingHTTPServer(('', port), handler)
+    server.daemon_threads = True
+    threading.Thread(name='ScanBroker', target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def call_broker(broker_url, action, payload):
+    """
+    Posts one request to the coordinator, connection errors are retried for BROKER_RETRY_SECONDS.
+    Returns:
+        dict: The answer of the coordinator.
+    """
+    import requests
+    deadline = time.time() + BROKER_RETRY_SECONDS
+    while True:
+        try:
+            response = requests.post(f"{broker_url}/{action}", json=payload, timeout=(10, 60))
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if time.time() > deadline:
+                raise
+            time.sleep(POLL_SECONDS)
+
+
+def read_applications(applications_file):
+    # Same format as HLScanAndOnboard: a header line, then name;id per line
+    with open(applications_file, 'r') as file:
+        applications = [line.strip().split(';') for line in file]
+    return [application for application in applications[1:] if len(application) == 2]
+
+
+def order_by_size(applications, settings):
+    """
+    Sorts applications by source bytes, largest first. The inventory is taken here when the sources are
+    reachable from this host, otherwise the one recorded in the catalog is used. Unknown sizes come first.
+    """
+    inventories = {}
+    if settings.output_dir and settings.summary_name():
+        catalog_db = RepoCatalog.org_catalog_path(settings.output_dir, settings.summary_name())
+        if settings.prescan_inventory and settings.src_dir_analyze and os.path.isdir(settings.src_dir_analyze):
+            inventories = SourceInventory.take_inventory([app_name for app_name, app_id in applications], settings.src_dir_analyze, settings,
+                                                         settings.inventory_workers or SourceInventory.DEFAULT_INVENTORY_WORKERS)
+            RepoCatalog.record_inventory(catalog_db, inventories.values())
+        else:
+            inventories = RepoCatalog.load_inventory(catalog_db)
+    sizes = {app_name: inventory['bytes'] for app_name, inventory in inventories.items() if inventory}
+    return sorted(applications, key=lambda application: -sizes.get(application[0], float('inf')))
+
+
+def run_coordinator(settings, queue_file, requeue=False, broker=None, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Queues applications.txt and serves the queue to the workers until it is drained, then writes the
+    summary of all workers.
+    Parameters:
+        settings (Settings): Settings of the coordinator.
+        queue_file (str): The SQLite queue file, on the local disk of the coordinator.
+        requeue (bool): Queue the applications already done again.
+        broker (str): SCAN_BROKER, the address the workers call.
+        lease_seconds (int): Lease duration, renewed every third of it while a scan runs.
+        max_attempts (int): Leases of an application before it is given up.
+    """
+    applications = read_applications(settings.highlight_application_mapping)
+    duplicates = HLScanAndOnboard.check_duplicate_app_ids(applications)
+    if duplicates:
+        print(f"Program stopped Because Duplicate Application IDs Found: {', '.join(duplicates)}")
+        raise ValueError("Program stopped Because Duplicate Application IDs Found!")
+
+    # Applications that would fail at once are not queued, when this host sees the sources
+    if settings.src_dir_analyze and os.path.isdir(settings.src_dir_analyze):
+        applications, preflight_rows, preflight_file = Preflight.run_preflight(applications, settings)
+        print(f"{Preflight.summary(preflight_rows)}. Report written to {preflight_file}")
+
+    # Largest applications are leased first, so that the last leases are short ones
+    applications = order_by_size(applications, settings)
+    queued = publish(queue_file, applications, requeue)
+    broker_url, port = broker_address(broker)
+    server = start_broker(queue_file, port, lease_seconds, max_attempts)
+    print(f"{queued} applications queued in {queue_file}, served on port {port}. Start workers with: python ScanBroker.py worker --broker {broker_url}")
+
+    conn = connect(queue_file)
+    try:
+        while True:
+            # Also done here, in case every worker is gone
+            give_up_expired(conn, max_attempts, time.time())
+            counts = progress(conn)
+            print(f"Queued: {counts['queued']}, running: {counts['leased']}, done: {counts['done']}, failed: {counts['failed']}")
+            if not pending(conn):
+                break
+            time.sleep(POLL_SECONDS)
+        # Idle workers polling for a lease learn that the queue is drained
+        time.sleep(POLL_SECONDS * 2)
+    finally:
+        conn.close()
+        server.shutdown()
+        server.server_close()
+
+    summary_file = os.path.join(settings.logs_dir, f"summary_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv")
+    count = write_summary(queue_file, summary_file)
+    print(f"Summary of {count} applications written to {summary_file}")
+    failure_queue = FailureQueue.open_queue(settings)
+    if failure_queue:
+        record_failures(queue_file, failure_queue)
+        failure_queue.write_dead_letter_report('scan', settings.logs_dir, datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
+
+
+def worker_loop(broker_url, worker_name, scan_arguments, output_txt_file, output_csv_file, idle_exit, prescan=None):
+    # Each thread leases in its own name, so that it only renews and completes its own leases
+    worker = f"{worker_name}-{threading.current_thread().name}"
+    while True:
+        answer = call_broker(broker_url, 'lease', {'worker': worker})
+        lease_seconds = answer['lease_seconds']
+        if answer['job'] is None:
+            # Leases held by other workers may still expire and come back
+            if idle_exit and not answer['pending']:
+                return
+            time.sleep(min(POLL_SECONDS, lease_seconds / 3))
+            continue
+
+        app_name, app_id = answer['job']
+        logging.info(f'{worker} leased {app_name}')
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(lease_seconds / 3):
+                try:
+                    renewed = call_broker(broker_url, 'renew', {'app_name': app_name, 'worker': worker})['ok']
+                except Exception as e:
+                    logging.warning(f'{worker} could not renew the lease of {app_name}: {e}')
+                    continue
+                if not renewed:
+                    logging.warning(f'{worker} lost the lease of {app_name}')
+                    return
+
+        beat = threading.Thread(name=f'{threading.current_thread().name}-heartbeat', target=heartbeat, daemon=True)
+        beat.start()
+        try:
+            log_file = os.path.join(scan_arguments['RESULTS'], app_name, 'HLAutomation.log')
+            # The sources of this host are checked before a JVM is started for them
+            inventory = SourceInventory.inventory_application(os.path.join(scan_arguments['SOURCES'], app_name), prescan) if prescan else None
+            if SourceInventory.has_nothing_to_scan(inventory):
+                logging.warning(f'Skipped Application: {app_name}, no file to analyze.')
+                result = [app_name, 'Skipped', 'No file to analyze', 'N/A', 'N/A', 'N/A', 'N/A']
+                HLScanAndOnboard.write_summary_row(output_txt_file, output_csv_file, result)
+            else:
+                with LogRouter.app_context(app_name):
+                    result = HLScanAndOnboard.process_application(app_name, app_id, log_file, output_txt_file, output_csv_file, **scan_arguments)
+        except Exception as e:
+            result = [app_name, 'Failed', f'Worker error: {e}', '', 'N/A', 'N/A', 'N/A']
+        finally:
+            stop.set()
+            beat.join()
+        if not call_broker(broker_url, 'complete', {'worker': worker, 'result': [str(value) for value in result]})['ok']:
+            logging.warning(f'{worker} finished {app_name} after losing its lease, the result was not recorded')
+
+
+def run_worker(settings, broker=None, threads=1, idle_exit=True):
+    """
+    Leases and scans applications until the queue is drained.
+    Parameters:
+        settings (Settings): Settings of this host, the paths are the ones of this host.
+        broker (str): SCAN_BROKER, the address of the coordinator.
+        threads (int): Applications scanned concurrently by this worker.
+        idle_exit (bool): Exit once nothing is queued or leased, otherwise keep polling.
+    """
+    broker_url, port = broker_address(broker)
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    datetime_now = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    LOG_FOLDER = settings.logs_dir
+    listener = LogRouter.start_queue_logging(os.path.join(LOG_FOLDER, f"worker_{worker}_{datetime_now}.log"))
+    try:
+        # Local summary of this worker, the coordinator writes the one of all workers
+        output_csv_file = os.path.join(LOG_FOLDER, f'summary_{worker}_{datetime_now}.csv')
+        output_txt_file = os.path.join(LOG_FOLDER, f'summary_{worker}_{datetime_now}.txt')
+        for summary_file in (output_csv_file, output_txt_file):
+            with open(summary_file, 'w', newline='') as file:
+                csv.writer(file).writerow(SUMMARY_HEADER[:7])
+
+        ignored_dir, ignored_paths, ignored_files = settings.ignore_arguments()
+        scan_arguments = {
+            'SOURCES': settings.src_dir_analyze,
+            'HIGHLIGHT_EXE': settings.highlight_executable,
+            'ANALYZER_DIR': settings.highlight_analyzer_dir,
+            'PERL': settings.highlight_perl_dir,
+            'URL': settings.highlight_base_url,
+            'TOKEN': settings.highlight_token,
+            'COMPANY_ID': settings.highlight_company_id,
+            'IGNORED_DIR': ignored_dir,
+            'IGNORED_PATHS': ignored_paths,
+            'IGNORED_FILES': ignored_files,
+            'RESULTS': settings.results_dir,
+            'RECLAIM': settings.reclaim_after_upload,
+            'ARCHIVES': settings.src_dir,
+            # Each host keeps the results of its scans, uploaded by python ResultUpload.py on that host
+            'DEFERRED_UPLOAD': settings.upload_mode == 'deferred',
+        }
+        logging.info(f'Worker {worker} started with {threads} threads on {broker_url}')
+        workers = [threading.Thread(name=f'Worker-{i}', target=worker_loop,
+                                    args=(broker_url, worker, scan_arguments, output_txt_file, output_csv_file, idle_exit,
+                                          settings if settings.prescan_inventory else None))
+                   for i in range(1, threads + 1)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        logging.info(f'Worker {worker} finished.')
+    finally:
+        LogRouter.stop_queue_logging(listener)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Distributed CAST Highlight scans through a work queue served by the coordinator.")
+    parser.add_argument('role', choices=['coordinator', 'worker'])
+    parser.add_argument('--config', help='config.properties of this host, default is CASTHL_CONFIG or Config/config.properties')
+    parser.add_argument('--queue', help='Coordinator: queue file on a local disk, default is SCAN_QUEUE of config.properties')
+    parser.add_argument('--broker', help='host:port of the coordinator, default is SCAN_BROKER of config.properties')
+    parser.add_argument('--threads', type=int, help='Worker: applications scanned concurrently, default is BATCH_SIZE')
+    parser.add_argument('--requeue', action='store_true', help='Coordinator: queue applications already done again')
+    parser.add_argument('--keep-polling', action='store_true', help='Worker: keep polling once the queue is drained')
+    args = parser.parse_args()
+
+    settings = Settings.load_settings(args.config)
+    broker = args.broker or settings.scan_broker
+    if args.role == 'coordinator':
+        queue_file = args.queue or settings.scan_queue or os.path.join(settings.results_dir, 'ScanQueue.db')
+        run_coordinator(settings, queue_file, args.requeue, broker,
+                        settings.scan_lease_seconds or DEFAULT_LEASE_SECONDS,
+                        settings.scan_max_attempts or DEFAULT_MAX_ATTEMPTS)
+    else:
+        run_worker(settings, broker, args.threads or settings.batch_size, not args.keep_polling)
@@ -0,0 +1,228 @@
+import os
+import re
+import configparser
+from collections import namedtuple
+
+# Summary CSV and catalog name of a run over several organizations, <name>_Repositories_Summary.csv
+UNIFIED_CATALOG_NAME = 'Organizations'
+# Config/config.properties, or the file named by CASTHL_CONFIG (e.g. one per scan host)
+DEFAULT_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Config', 'config.properties')
+
+
+def _text(value):
+    return value.strip() if value is not None else None
+
+
+def _int(value):
+    value = _text(value)
+    return int(value) if value else None
+
+
+def _float(value):
+    value = _text(value)
+    return float(value) if value else None
+
+
+def _bool(value):
+    return (_text(value) or '').lower() == 'true'
+
+
+def _lower(value):
+    value = _text(value)
+    return value.lower() if value else value
+
+
+def _list(value):
+    # Comma separated, stripped and without duplicates, in their original order
+    items = [item.strip() for item in (value or '').split(',')]
+    return tuple(dict.fromkeys(item for item in items if item))
+
+
+def _pairs(value):
+    # Comma separated key:value items, e.g. org-a:token-a, org-b:token-b
+    pairs = []
+    for item in _list(value):
+        key, separator, item_value = item.partition(':')
+        if not separator or not key.strip() or not item_value.strip():
+            raise ValueError(f"Program stopped bacause '{item}' is not a <name>:<value> pair.")
+        pairs.append((key.strip(), item_value.strip()))
+    return tuple(pairs)
+
+
+def _regex(value):
+    value = _text(value)
+    if not value:
+        return None
+    try:
+        return re.compile(value)
+    except re.error as e:
+        raise ValueError(f"Program stopped bacause IGNORED_PATHS is not a valid regular expression: {e}")
+
+
+# Settings attribute -> (config.properties key, converter, default). Keys are looked up in every
+# section, as HLScanAndOnboard always did; HLLogParser/config.properties keys are in the same table.
+# A None default leaves the default to the stage using the value.
+FIELDS = {
+    # [GitHub]
+    'github_org_name': ('github_org_name', _text, None),
+    'github_token': ('github_token', _text, None),
+    'github_api_url': ('github_api_url', _text, None),
+    'github_orgs': ('github_orgs', _list, ()),
+    'github_org_tokens': ('github_org_tokens', _pairs, ()),
+    'harvest_workers': ('harvest_workers', _int, None),
+    'github_requests_per_hour': ('github_requests_per_hour', _int, None),
+    'transport': ('transport', _lower, 'zipball'),
+    'clone_workers': ('clone_workers', _int, None),
+    'batch_target_mb': ('batch_target_mb', _float, None),
+    'batch_target_minutes': ('batch_target_minutes', _float, None),
+    # [Directories]
+    'config_dir': ('config_dir', _text, None),
+    'src_dir': ('src_dir', _text, None),
+    'unzip_dir': ('unzip_dir', _text, None),
+    'archive_cache_dir': ('archive_cache_dir', _text, ''),
+    'archive_cache_budget_mb': ('archive_cache_budget_mb', _int, 20480),
+    'disk_reserve_mb': ('disk_reserve_mb', _int, None),
+    'compression_ratio': ('compression_ratio', _float, None),
+    'logs_dir': ('logs_dir', _text, None),
+    'output_dir': ('output_dir', _text, None),
+    'src_dir_analyze': ('src_dir_analyze', _text, None),
+    'placement_mode': ('placement_mode', _lower, 'move'),
+    'highlight_perl_dir': ('highlight_perl_dir', _text, None),
+    'highlight_analyzer_dir': ('highlight_analyzer_dir', _text, None),
+    'results_dir': ('results', _text, None),
+    # [Input-File]
+    'app_repo_mapping': ('app_repo_mapping', _text, None),
+    # [HIGHLIGHT-ONBOARDING]
+    'highlight_application_mapping': ('highlight_application_mapping', _text, None),
+    'highlight_base_url': ('highlight_base_url', _text, None),
+    'highlight_executable': ('highlight_executable', _text, None),
+    'highlight_company_id': ('highlight_company_id', _text, None),
+    'highlight_token': ('highlight_token', _text, None),
+    'batch_size': ('batch_size', _int, 1),
+    'max_batches': ('max_batches', _int, None),
+    'per_app_logs': ('per_app_logs', _bool, False),
+    'provision_workers': ('provision_workers', _int, None),
+    'reclaim_after_upload': ('reclaim_after_upload', _bool, False),
+    'scan_queue': ('scan_queue', _text, None),
+    'scan_broker': ('scan_broker', _text, None),
+    'scan_lease_seconds': ('scan_lease_seconds', _int, None),
+    'scan_max_attempts': ('scan_max_attempts', _int, None),
+    'retry_max_attempts': ('retry_max_attempts', _int, None),
+    'retry_backoff_seconds': ('retry_backoff_seconds', _float, None),
+    'upload_mode': ('upload_mode', _lower, 'inline'),
+    'upload_workers': ('upload_workers', _int, None),
+    'prescan_inventory': ('prescan_inventory', _bool, True),
+    'inventory_workers': ('inventory_workers', _int, None),
+    'ignored_dirs': ('ignored_dir', _list, ()),
+    'ignored_paths_pattern': ('ignored_paths', _text, ''),
+    'ignored_paths': ('ignored_paths', _regex, None),
+    'ignored_files': ('ignored_files', _list, ()),
+    # HLLogParser/config.properties [parameters]
+    'root_directory': ('root_directory', _text, None),
+    'output_directory': ('output_directory', _text, None),
+    'bearer_token': ('bearer_token', _text, None),
+    'api_url': ('api_url', _text, None),
+    'company_id': ('companyid', _text, None),
+    'cache_dir': ('cache_dir', _text, None),
+    'cache_ttl': ('cache_ttl', _int, None),
+    'report_formats': ('report_formats', _list, ('xlsx',)),
+    'workers': ('workers', _int, None),
+    'index_file': ('index_file', _text, None),
+}
+
+
+class Settings(namedtuple('Settings', ['config_file', 'stamp'] + list(FIELDS))):
+    """
+    config.properties parsed once into typed, immutable values. Being a tuple it is also
+    passed as is to worker threads and processes.
+    """
+    __slots__ = ()
+
+    def organizations(self):
+        # (organization, token) pairs: github_orgs with their github_org_tokens, or github_org_name alone
+        if not self.github_orgs:
+            return [(self.github_org_name, self.github_token)]
+        tokens = dict(self.github_org_tokens)
+        return [(org, tokens.get(org, self.github_token)) for org in self.github_orgs]
+
+    def is_multi_org(self):
+        return len(self.github_orgs) > 1
+
+    def summary_name(self):
+        # <name>_Repositories_Summary.csv, repositories are named <org>/<repo> in the unified one
+        if self.is_multi_org():
+            return UNIFIED_CATALOG_NAME
+        return self.github_orgs[0] if self.github_orgs else self.github_org_name
+
+    def token_for(self, repository_name):
+        # Token of the organization of an <org>/<repo> name, github_token for an unqualified one
+        org, separator, repo = repository_name.rpartition('/')
+        return dict(self.organizations()).get(org, self.github_token) if separator else self.github_token
+
+    def ignore_arguments(self):
+        # The ignore lists as the Highlight command line expects them
+        return ','.join(self.ignored_dirs), self.ignored_paths_pattern, ','.join(self.ignored_files)
+
+    def is_ignored_path(self, relative_path):
+        # Same rule as --ignorePaths, on a path relative to the application folder written as /repo/dir/file
+        path = '/' + relative_path.replace(os.sep, '/').lstrip('/')
+        return bool(self.ignored_paths and self.ignored_paths.match(path))
+
+
+# Absolute config path -> Settings, the file is parsed again only when it changes
+_cache = {}
+_validated = set()
+
+
+def _stamp(config_file):
+    stat = os.stat(config_file)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def parse_settings(config_file):
+    parser = configparser.ConfigParser(interpolation=None, strict=False)
+    parser.read(config_file)
+    values = {}
+    for section in parser.sections():
+        values.update(parser.items(section))
+    settings = {attribute: (converter(values[key]) if key in values else default)
+                for attribute, (key, converter, default) in FIELDS.items()}
+    return Settings(config_file=config_file, stamp=_stamp(config_file), **settings)
+
+
+def load_settings(config_file=None):
+    """
+    Returns the settings of config_file, parsed once per process.
+    Parameters:
+        config_file (str): The config.properties file, default is CASTHL_CONFIG or Config/config.properties.
+    Returns:
+        Settings: The parsed settings.
+    """
+    config_file = os.path.abspath(config_file or os.environ.get('CASTHL_CONFIG') or DEFAULT_CONFIG_FILE)
+    if not os.path.isfile(config_file):
+        raise ValueError(f"Program stopped bacause config file {config_file} does not exists.")
+    stamp = _stamp(config_file)
+    cached = _cache.get(config_file)
+    if cached is None or cached.stamp != stamp:
+        cached = _cache[config_file] = parse_settings(config_file)
+    return cached
+
+
+def validate_paths(settings, checks):
+    """
+    Checks that the folders and files of settings exist, once per process for the same config file.
+    Parameters:
+        settings (Settings): The settings to check.
+        checks (list): (attribute, 'dir' or 'file') pairs.
+    """
+    for attribute, kind in checks:
+        if (settings.config_file, settings.stamp, attribute) in _validated:
+            continue
+        value = getattr(settings, attribute)
+        if kind == 'file' and not (value and os.path.isfile(value)):
+            print(f"Program stopped bacause {FIELDS[attribute][0]} File -> {value} does not exists.")
+            raise ValueError(f"Program stopped bacause {FIELDS[attribute][0]} File -> {value} does not exists.")
+        if kind == 'dir' and not (value and os.path.exists(value)):
+            print(f"Program stopped bacause {FIELDS[attribute][0]} Folder -> {value} does not exists.")
+            raise ValueError(f"Program stopped bacause {FIELDS[attribute][0]} Folder -> {value} does not exists.")
+        _validated.add((settings.config_file, settings.stamp, attribute))
@@ -0,0 +1,95 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Application folders walked at the same time
+DEFAULT_INVENTORY_WORKERS = 8
+
+# Extension -> technology, for the technology mix reported of each application. Highlight analyzes
+# more than these, so files of other extensions still make an application worth a scan.
+SOURCE_EXTENSIONS = {
+    '.java': 'Java', '.jsp': 'Java', '.kt': 'Kotlin', '.kts': 'Kotlin', '.scala': 'Scala', '.groovy': 'Groovy',
+    '.js': 'JavaScript', '.jsx': 'JavaScript', '.mjs': 'JavaScript', '.ts': 'TypeScript', '.tsx': 'TypeScript', '.vue': 'JavaScript',
+    '.html': 'HTML', '.htm': 'HTML',
+    '.cs': 'C#', '.vb': 'VB.NET', '.aspx': 'ASP.NET', '.cshtml': 'ASP.NET', '.fs': 'F#',
+    '.c': 'C/C++', '.h': 'C/C++', '.cpp': 'C/C++', '.cc': 'C/C++', '.cxx': 'C/C++', '.hpp': 'C/C++', '.hh': 'C/C++',
+    '.m': 'Objective-C', '.mm': 'Objective-C', '.swift': 'Swift', '.dart': 'Dart',
+    '.py': 'Python', '.rb': 'Ruby', '.php': 'PHP', '.pl': 'Perl', '.pm': 'Perl', '.go': 'Go', '.rs': 'Rust', '.r': 'R',
+    '.sh': 'Shell', '.ps1': 'PowerShell', '.lua': 'Lua', '.ex': 'Elixir', '.exs': 'Elixir', '.erl': 'Erlang', '.clj': 'Clojure',
+    '.sql': 'SQL', '.pls': 'PL/SQL', '.pks': 'PL/SQL', '.pkb': 'PL/SQL', '.plsql': 'PL/SQL',
+    '.cbl': 'COBOL', '.cob': 'COBOL', '.cpy': 'COBOL', '.abap': 'ABAP', '.f90': 'Fortran', '.f': 'Fortran',
+    '.cls': 'Apex', '.trigger': 'Apex', '.bas': 'VB6', '.frm': 'VB6', '.asp': 'ASP', '.pli': 'PL/I', '.rpgle': 'RPG',
+}
+
+
+def inventory_application(app_dir, settings):
+    """
+    Walks an application folder once, skipping what the Highlight command line is told to ignore.
+    Parameters:
+        app_dir (str): src_dir_analyze/<app>.
+        settings (Settings): IGNORED_DIR, IGNORED_PATHS and IGNORED_FILES are applied.
+    Returns:
+        dict: Counts of the application, None when the folder does not exist.
+    """
+    if not os.path.isdir(app_dir):
+        return None
+    inventory = {'app': os.path.basename(app_dir), 'files': 0, 'bytes': 0, 'scannable_files': 0, 'scannable_bytes': 0,
+                 'ignored_files': 0, 'extensions': {}, 'technologies': {}}
+    ignored_dirs = set(settings.ignored_dirs)
+    ignored_files = settings.ignored_files
+    stack = ['']
+    while stack:
+        relative_dir = stack.pop()
+        try:
+            entries = os.scandir(os.path.join(app_dir, relative_dir))
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                relative_path = os.path.join(relative_dir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    # IGNORED_PATHS is matched from the start of the path, so an ignored folder ignores all below it
+                    if entry.name not in ignored_dirs and not settings.is_ignored_path(relative_path):
+                        stack.append(relative_path)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                # IGNORED_FILES holds both names (Makefile) and extensions (.yaml)
+                if entry.name.endswith(ignored_files) or settings.is_ignored_path(relative_path):
+                    inventory['ignored_files'] += 1
+                    continue
+                size = entry.stat(follow_symlinks=False).st_size
+                extension = os.path.splitext(entry.name)[1].lower()
+                inventory['files'] += 1
+                inventory['bytes'] += size
+                counts = inventory['extensions'].setdefault(extension, [0, 0])
+                counts[0] += 1
+                counts[1] += size
+                technology = SOURCE_EXTENSIONS.get(extension)
+                if technology:
+                    inventory['scannable_files'] += 1
+                    inventory['scannable_bytes'] += size
+                    inventory['technologies'][technology] = inventory['technologies'].get(technology, 0) + size
+    return inventory
+
+
+def take_inventory(app_names, sources_dir, settings, workers=DEFAULT_INVENTORY_WORKERS):
+    """
+    Inventories the application folders of sources_dir in parallel.
+    Returns:
+        dict: Application name -> inventory, None for the applications without a folder.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        inventories = executor.map(lambda app_name: inventory_application(os.path.join(sources_dir, app_name), settings), app_names)
+        return dict(zip(app_names, inventories))
+
+
+def has_nothing_to_scan(inventory):
+    # Only a folder left empty by the ignore rules, a folder that is missing is reported by the scan itself
+    return inventory is not None and inventory['files'] == 0
+
+
+def describe(inventory):
+    technologies = sorted(inventory['technologies'].items(), key=lambda item: -item[1])
+    mix = ', '.join(f"{technology} {size / (1024 * 1024):.1f} MB" for technology, size in technologies[:5]) or 'none'
+    return (f"{inventory['files']} files, {inventory['bytes'] / (1024 * 1024):.1f} MB, "
+            f"{inventory['scannable_files']} files of a known technology ({mix}), {inventory['ignored_files']} ignored")
@@ -0,0 +1,230 @@
+import os
+import shutil
+import tarfile
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+import Profiling
+import FailureQueue
+
+# Default number of concurrent tarball streams
+DEFAULT_STREAM_WORKERS = 4
+# Bytes copied at a time from the tar stream to a file
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class CountingReader:
+    """
+    File object over the response body, counting the bytes that came over the network.
+    """
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.count += len(data)
+        return data
+
+
+def tarball_url(repository):
+    """
+    Tarball of the default branch of a summary CSV repository.
+    Parameters:
+        repository (RepoRecord): archive_url is the GitHub template, download_url the zipball of option 1.
+    Returns:
+        str: The tarball download URL.
+    """
+    if repository.archive_url and '{archive_format}' in repository.archive_url:
+        ref = f"/{repository.default_branch}" if repository.default_branch else ''
+        return repository.archive_url.replace('{archive_format}', 'tarball').replace('{/ref}', ref)
+    return repository.download_url.replace('/zipball/', '/tarball/')
+
+
+class IgnoreRules:
+    """
+    IGNORED_DIR, IGNORED_PATHS and IGNORED_FILES of settings applied to the members of a tar stream,
+    which arrive in no particular order, so every ancestor folder is checked (and remembered).
+    Parameters:
+        settings (Settings): The settings of the run, None to extract everything.
+        repository_name (str): The repository folder, IGNORED_PATHS is matched on /<repository>/dir/file.
+    """
+    def __init__(self, settings, repository_name):
+        self.settings = settings
+        self.repository_name = repository_name
+        self.ignored_dirs = set(settings.ignored_dirs) if settings else set()
+        self.ignored_files = settings.ignored_files if settings else ()
+        self.folders = {}
+
+    def folder_ignored(self, parts):
+        key = '/'.join(parts)
+        if key not in self.folders:
+            self.folders[key] = (parts[-1] in self.ignored_dirs
+                                 or bool(self.settings and self.settings.is_ignored_path('/'.join([self.repository_name] + parts)))
+                                 or (len(parts) > 1 and self.folder_ignored(parts[:-1])))
+        return self.folders[key]
+
+    def ignored(self, parts, is_file):
+        if len(parts) > 1 and self.folder_ignored(parts[:-1]):
+            return True
+        if not is_file:
+            return self.folder_ignored(parts)
+        if not self.settings:
+            return False
+        return parts[-1].endswith(self.ignored_files) or self.settings.is_ignored_path('/'.join([self.repository_name] + parts))
+
+
+def member_parts(member):
+    # Path below the <org>-<repo>-<sha> folder GitHub puts everything in, None when it is not safe to write
+    parts = member.name.replace('\\', '/').split('/')[1:]
+    parts = [part for part in parts if part not in ('', '.')]
+    if not parts or '..' in parts or os.path.isabs(member.name):
+        return None
+    return parts
+
+
+def stream_extract(url, destination, token, settings=None, repository_name=None):
+    """
+    Downloads a tarball and extracts it in the same pass, the tar stream is read as it arrives and no
+    archive is written. The tree is built next to destination and only replaces it once complete.
+    Parameters:
+        url (str): The tarball URL.
+        destination (str): The repository folder to create, e.g. unzip_dir/<repo>.
+        token (str): The GitHub access token.
+        settings (Settings): Ignore rules applied while extracting, or None.
+        repository_name (str): The name IGNORED_PATHS are matched on, default is the destination folder name.
+    Returns:
+        dict: status ('Successful', 'Empty' or 'Failed'), reason and FailureQueue kind of a failure, transferred, files, bytes,
+        ignored and skipped (links and devices).
+    """
+    import requests
+    result = {'status': 'Successful', 'reason': None, 'kind': None, 'transferred': 0, 'files': 0, 'bytes': 0, 'ignored': 0, 'skipped': 0}
+    rules = IgnoreRules(settings, repository_name or os.path.basename(destination))
+    partial = destination + '.partial'
+    shutil.rmtree(partial, ignore_errors=True)
+    headers = {'Authorization': f'token {token}'} if token else {}
+    reader = None
+    try:
+        with requests.get(url, headers=headers, stream=True, timeout=(10, 300)) as response:
+            if response.status_code != 200:
+                result.update(status='Failed', reason=f"HTTP {response.status_code}", kind=FailureQueue.classify_http_status(response.status_code))
+                return result
+            # r|* detects the compression, whether or not the body also came with a Content-Encoding
+            response.raw.decode_content = True
+            reader = CountingReader(response.raw)
+            os.makedirs(partial)
+            with tarfile.open(fileobj=reader, mode='r|*') as archive:
+                for member in archive:
+                    parts = member_parts(member)
+                    if parts is None:
+                        continue
+                    if not (member.isfile() or member.isdir()):
+                        # Links are not followed into the tree, as they could point outside it
+                        result['skipped'] += 1
+                        continue
+                    if rules.ignored(parts, member.isfile()):
+                        result['ignored'] += 1 if member.isfile() else 0
+                        continue
+                    target = os.path.join(partial, *parts)
+                    if member.isdir():
+                        os.makedirs(target, exist_ok=True)
+                        continue
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    with archive.extractfile(member) as source, open(target, 'wb') as file:
+                        shutil.copyfileobj(source, file, COPY_CHUNK_SIZE)
+                    result['files'] += 1
+                    result['bytes'] += member.size
+    except (requests.exceptions.RequestException, tarfile.TarError, EOFError, OSError) as e:
+        # A truncated or corrupt stream leaves nothing behind
+        shutil.rmtree(partial, ignore_errors=True)
+        # A stream cut short fails in the tar or gzip reader, downloading again helps
+        kind = FailureQueue.TRANSIENT if isinstance(e, (tarfile.ReadError, EOFError)) else FailureQueue.classify_exception(e)
+        result.update(status='Failed', reason=str(e) or type(e).__name__, kind=kind)
+        return result
+    finally:
+        if reader:
+            result['transferred'] = reader.count
+
+    try:
+        if os.path.exists(destination):
+            shutil.rmtree(destination)
+        os.replace(partial, destination)
+    except OSError as e:
+        # E.g. a file of the previous tree still open, the extracted tree is not kept half swapped in
+        shutil.rmtree(partial, ignore_errors=True)
+        result.update(status='Failed', reason=f"Could not replace {destination}: {e}", kind=FailureQueue.classify_exception(e))
+        return result
+    if not result['files'] and not result['ignored']:
+        result['status'] = 'Empty'
+    return result
+
+
+def log_line(message, log_file):
+    with open(log_file, "a") as f:
+        f.write(message + "\n")
+
+
+def extract_repositories(repositories, destination_root, token, settings, start_end_log_file, processing_log_file, transfer_log_file=None, workers=DEFAULT_STREAM_WORKERS, admission=None, queue=None):
+    """
+    Downloads and extracts the tarballs of repositories concurrently, straight into the layout option 4 expects.
+    Parameters:
+        repositories (list): RepoRecord objects (name, archive_url, default_branch, size).
+        destination_root (str): The folder the repositories are extracted into (unzip_dir).
+        token (str): The GitHub access token.
+        settings (Settings): Ignore rules applied while extracting, or None.
+        start_end_log_file (str): The path to the log file for start and end times.
+        processing_log_file (str): The path to the log file for processing status.
+        transfer_log_file (str): CSV of transferred bytes and seconds per repository, or None.
+        workers (int): The number of concurrent streams.
+        admission (DiskBudget.AdmissionController): Reserves the estimated extracted size, or None.
+        queue (FailureQueue): Retries transient failures and keeps the ones left, or None.
+    Returns:
+        tuple: (number of repositories extracted, number failed or skipped).
+    """
+    os.makedirs(destination_root, exist_ok=True)
+
+    def attempt(repository):
+        # None once extracted, (reason, FailureQueue kind) otherwise
+        destination = os.path.join(destination_root, repository.name)
+        start_time = datetime.datetime.now()
+        result = stream_extract(tarball_url(repository), destination, token, settings, repository.name)
+        end_time = datetime.datetime.now()
+        total_time = end_time - start_time
+        failure = None
+        if result['status'] == 'Failed':
+            status = f"Failed: {result['reason']}"
+            failure = (result['reason'], result['kind'])
+            print(f"Failed to download repository '{repository.name}': {result['reason']}\n")
+        elif result['status'] == 'Empty':
+            status = "Repo is empty"
+            print(f"Repository '{repository.name}' is empty.\n")
+        else:
+            status = "Successful"
+            if admission and result['transferred']:
+                admission.observe(result['transferred'], result['bytes'])
+            print(f"Repository '{repository.name}' extracted to '{destination}', {result['files']} files, {result['ignored']} ignored.\n")
+        log_line(f"{repository.name} | {start_time} | {end_time} | {total_time} |", start_end_log_file)
+        log_line(f"{repository.name} | {status}", processing_log_file)
+        if transfer_log_file:
+            log_line(f"{repository.name},tarball,{result['transferred']},{total_time.total_seconds():.3f}", transfer_log_file)
+        return failure
+
+    def extract(repository):
+        needs = [(destination_root, admission.estimate_extracted(repository.size * 1024))] if admission else []
+        if admission and not admission.admit(needs):
+            log_line(f"{repository.name} | Skipped: not enough disk space, {admission.shortfall_message(needs)}", processing_log_file)
+            print(f"Skipping repository '{repository.name}', not enough disk space: {admission.shortfall_message(needs)}\n")
+            if queue:
+                # Waiting a few seconds does not free disk space, it is left to retry-failed
+                queue.record('download', repository.name, f"Not enough disk space, {admission.shortfall_message(needs)}", FailureQueue.TRANSIENT)
+            return False
+        try:
+            if queue:
+                return queue.attempt('download', repository.name, lambda: attempt(repository)) is None
+            return attempt(repository) is None
+        finally:
+            if admission:
+                admission.release(needs)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(Profiling.profiled('tarball', extract), repositories))
+    return results.count(True), results.count(False)
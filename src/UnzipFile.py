@@ -4,6 +4,7 @@ import datetime
 import configparser
 from multiprocessing import Pool, Lock
 import shutil
+import FailureQueue
 
 # Define a lock for synchronizing access to the log file
 log_lock = Lock()
@@ -26,9 +27,29 @@ def extract_and_move_contents(zip_ref, extract_path):
     # Remove the temporary directory
     os.rmdir(temp_extract_path)
 
-def unzip_code(root_folder, extract_path, execution_log_path, time_to_unzip_log_path):
+def verified_status(repo_path, verdict):
+    # The download verdict applies while the archive is the file that was verified
+    if not verdict:
+        return None
+    stat = os.stat(repo_path)
+    if verdict['size'] != stat.st_size or verdict['mtime_ns'] != stat.st_mtime_ns:
+        return None
+    return verdict['status']
+
+def unzip_code(root_folder, extract_path, execution_log_path, time_to_unzip_log_path, verdicts=None, admission=None, queue=None, repo_names=None, name_prefix=''):
+    # With a failure queue, an archive that cannot be extracted is queued and the others still are,
+    # without one the first failure stops the extraction. repo_names limits it to those repositories,
+    # named name_prefix + archive name (<org>/ in a multi organization run)
+    verdicts = verdicts or {}
     success_count = 0
     failure_count = 0
+
+    def fail(repo_name, reason, kind):
+        if not queue:
+            raise ValueError(reason)
+        queue.record('unzip', name_prefix + repo_name, reason, kind)
+        print(f"Extraction failed: {reason}")
+        execution_log.write(f"{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S.%f')} | {repo_name} | Failed: {reason}\n")
     
     try:
         with open(execution_log_path, "a") as execution_log, \
@@ -41,33 +62,57 @@ def unzip_code(root_folder, extract_path, execution_log_path, time_to_unzip_log_
                         if file.endswith(".zip"):
                             repo_path = os.path.join(root, file)
                             repo_name = os.path.splitext(file)[0]
+                            if repo_names is not None and name_prefix + repo_name not in repo_names:
+                                continue
                             timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S.%f")
                             execution_message = f"{timestamp} | {repo_name} | "
 
+                            status = verified_status(repo_path, verdicts.get(repo_name))
+                            if status == 'Empty':
+                                execution_log.write(f"{execution_message}Skipped: Repo is empty\n")
+                                print(f"Skipping {repo_path}, the repository is empty\n")
+                                continue
+
                             print(f"Extracting {repo_path} to {extract_path}")
-                            if not zipfile.is_zipfile(repo_path):
+                            if status != 'Valid' and not zipfile.is_zipfile(repo_path):
                                 failure_count += 1
-                                raise ValueError(f"Not a valid zip file: {repo_path}")
+                                # Downloading it again is the only cure, which retry-failed does for the download stage
+                                fail(repo_name, f"Not a valid zip file: {repo_path}", FailureQueue.PERMANENT)
+                                continue
 
                             # Create a directory with the name of the zip file
                             repo_extract_path = os.path.join(extract_path, repo_name)
                             if os.path.exists(repo_extract_path) and os.listdir(repo_extract_path):
-                                dir_to_delete = repo_extract_path
-                                command = f'rmdir /s /q "{dir_to_delete}"'
-                                os.system(command)
+                                # Replaced by this extraction, and its space counts for the admission below
+                                shutil.rmtree(repo_extract_path, ignore_errors=True)
                                 # print(f"Warning: {repo_extract_path} already exists with contents. Skipping extraction for {repo_path}")
                                 # continue  # Skip extraction if directory exists with contents
-                            os.makedirs(repo_extract_path, exist_ok=True)
 
                             start_time = datetime.datetime.now()
                             try:
                                 with zipfile.ZipFile(repo_path, 'r') as zip_ref:
-                                    # Extract and move contents
-                                    extract_and_move_contents(zip_ref, repo_extract_path)
+                                    # The central directory gives the exact extracted size
+                                    needs = [(repo_extract_path, sum(info.file_size for info in zip_ref.infolist()))]
+                                    if admission and not admission.admit(needs):
+                                        execution_log.write(f"{execution_message}Skipped: not enough disk space, {admission.shortfall_message(needs)}\n")
+                                        print(f"Skipping {repo_path}, not enough disk space: {admission.shortfall_message(needs)}\n")
+                                        failure_count += 1
+                                        if queue:
+                                            queue.record('unzip', name_prefix + repo_name, f"Not enough disk space, {admission.shortfall_message(needs)}", FailureQueue.TRANSIENT)
+                                        continue
+                                    try:
+                                        os.makedirs(repo_extract_path, exist_ok=True)
+                                        # Extract and move contents
+                                        extract_and_move_contents(zip_ref, repo_extract_path)
+                                    finally:
+                                        if admission:
+                                            admission.release(needs)
+                                            admission.observe(os.path.getsize(repo_path), needs[0][1])
 
                             except Exception as e:
                                 failure_count += 1
-                                raise ValueError(f"Extraction failed for {repo_path}: {e}\n")
+                                fail(repo_name, f"Extraction failed for {repo_path}: {e}", FailureQueue.classify_exception(e))
+                                continue
 
                             end_time = datetime.datetime.now()
                             total_time = end_time - start_time
@@ -76,6 +121,8 @@ def unzip_code(root_folder, extract_path, execution_log_path, time_to_unzip_log_
                             time_to_unzip_log.write(f"{repo_name} | {start_time} | {end_time} | {total_time}\n")
                             print(f"Extraction completed for {repo_path}\n")
                             success_count += 1
+                            if queue:
+                                queue.resolve('unzip', name_prefix + repo_name)
 
     except Exception as e:
         print(f"Extraction failed: {e}")